@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import random
+
+import aiohttp
+
+# ==== HTTP CONFIG ====
+MAX_IN_FLIGHT = 4          # concurrent requests against the API
+CONNECT_TIMEOUT = 5        # seconds to establish a connection
+READ_TIMEOUT = 30          # seconds to wait between bytes of a response
+MAX_RETRIES = 4            # retries after the first attempt
+BACKOFF_BASE = 0.5         # seconds; doubled on every retry
+BACKOFF_MAX = 15           # cap for a single backoff sleep
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+MAX_PAGES = 10_000         # pages walked without a short one before giving up
+
+
+class RetryableStatus(Exception):
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+def _backoff(attempt, retry_after=None):
+    # Full jitter: uniform in [0, min(cap, base * 2^attempt)]
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+async def fetch_json(session, url, params=None, semaphore=None, retries=MAX_RETRIES, cache=None):
+    # cache: an http_cache.ResponseCache; fresh entries skip the request and
+    # stale ones are revalidated with a conditional GET
+    entry = cache.lookup(url, params) if cache else None
+    if entry is not None and cache.is_fresh(entry):
+        return cache.served_fresh(entry)
+    headers = cache.validators(entry) if entry is not None else None
+    semaphore = semaphore or asyncio.Semaphore(MAX_IN_FLIGHT)
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            async with semaphore:
+                async with session.get(url, params=params, headers=headers) as response:
+                    if response.status == 304 and entry is not None:
+                        return cache.not_modified(entry)
+                    if response.status in RETRY_STATUSES:
+                        header = response.headers.get("Retry-After", "")
+                        raise RetryableStatus(response.status,
+                                              float(header) if header.isdigit() else None)
+                    response.raise_for_status()
+                    body = await response.json()
+                    return cache.store(url, params, response.headers, body) if cache else body
+        except RetryableStatus as e:
+            error, retry_after = e, e.retry_after
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+            error = e
+        if attempt == retries:
+            raise error
+        delay = _backoff(attempt, retry_after)
+        logging.warning(f"GET {url} {params or ''} failed ({error!r}); "
+                        f"retry {attempt + 1}/{retries} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+
+def _session(max_in_flight):
+    # One keep-alive session per extraction; the connector caps open sockets
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+    connector = aiohttp.TCPConnector(limit=max_in_flight, keepalive_timeout=30)
+    return aiohttp.ClientSession(timeout=timeout, connector=connector)
+
+
+async def fetch_shards(urls, max_in_flight=MAX_IN_FLIGHT, cache=None):
+    # Fetch independent endpoints concurrently; results keep the order of urls
+    semaphore = asyncio.Semaphore(max_in_flight)
+    async with _session(max_in_flight) as session:
+        return await asyncio.gather(*(fetch_json(session, url, semaphore=semaphore, cache=cache)
+                                      for url in urls))
+
+
+async def fetch_pages(url, page_size, page_param="_page", limit_param="_limit",
+                      first_page=1, max_in_flight=MAX_IN_FLIGHT, cache=None, max_pages=MAX_PAGES):
+    # Fetch pages concurrently until one comes back short; the total page count
+    # is not known up front, so at most max_in_flight pages are speculative.
+    # A page equal to the one before it also ends the walk: the endpoint
+    # ignores the paging parameters and would never return a short page.
+    semaphore = asyncio.Semaphore(max_in_flight)
+    pages = {}
+    last_page = None
+    next_page = first_page
+
+    def repeated(page):
+        return bool(pages.get(page)) and pages.get(page) == pages.get(page - 1)
+
+    async with _session(max_in_flight) as session:
+        async def fetch_page(page):
+            params = {page_param: page, limit_param: page_size}
+            return page, await fetch_json(session, url, params=params, semaphore=semaphore, cache=cache)
+
+        pending = set()
+        try:
+            while pending or last_page is None:
+                while last_page is None and len(pending) < max_in_flight and next_page - first_page < max_pages:
+                    pending.add(asyncio.ensure_future(fetch_page(next_page)))
+                    next_page += 1
+                if not pending:
+                    raise RuntimeError(f"GET {url}: no short page within {max_pages} pages of {page_size}; "
+                                       f"check {page_param}/{limit_param} or raise MAX_PAGES")
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    page, items = task.result()
+                    pages[page] = items
+                    end = None
+                    if len(items) < page_size:
+                        end = page
+                    for later in (page, page + 1):
+                        if repeated(later):
+                            end = later - 1 if end is None else min(end, later - 1)
+                            logging.warning(f"GET {url}: page {later} repeats page {later - 1}; "
+                                            f"the endpoint ignores {page_param}, stopping at page {later - 1}")
+                    if end is not None and (last_page is None or end < last_page):
+                        last_page = end
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+    end = last_page if last_page is not None else next_page - 1
+    return [item for page in range(first_page, end + 1) for item in pages.get(page, [])]
+
+
+def extract_json(url, page_size=None, shard_urls=None, max_in_flight=MAX_IN_FLIGHT, cache=None):
+    # Synchronous entry point: a paginated endpoint when page_size is set,
+    # a list of shard URLs when given, otherwise a single GET with retries.
+    if shard_urls:
+        shards = asyncio.run(fetch_shards(shard_urls, max_in_flight, cache))
+        return [item for shard in shards for item in shard]
+    if page_size:
+        return asyncio.run(fetch_pages(url, page_size, max_in_flight=max_in_flight, cache=cache))
+    return asyncio.run(fetch_shards([url], max_in_flight, cache))[0]
@@ -0,0 +1,528 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import synthetic_data
+
+# ==== BENCHMARK CONFIG ====
+# libpq DSN of a scratch database, e.g. "host=localhost dbname=bench user=postgres".
+# Everything is created in its own schema and dropped afterwards.
+BENCH_DSN = os.environ.get("ETL_BENCH_DSN")
+BENCH_SCHEMA = "etl_bench"
+BENCH_YEAR = "2023"
+REPEAT = 3
+RESULTS_DIR = "bench_results"
+# Relative change in throughput, p95 latency or peak RSS flagged as a regression
+REGRESSION_THRESHOLD = 0.10
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+# ==== CASES ====
+# A case sets up once per process and returns (run, teardown); run() does one
+# timed pass and returns the number of rows it produced.
+def _close_sources():
+    from source_connections import close_source_connections
+    from source_fanout import shutdown_source_fanout
+    shutdown_source_fanout()
+    close_source_connections()
+
+
+def _pricing_case(matrix_mode, combined=False):
+    def setup(db_config, year):
+        import combainedcode
+        from report_writer import prepare_report_tables
+        combainedcode.REPORTING_POOL.db_config = dict(db_config)
+        prepare_report_tables(combainedcode.REPORTING_POOL)
+        combainedcode.MATRIX_PRICING_MODE = matrix_mode
+
+        def run():
+            # Every pass re-reads the metadata tables like a fresh run would
+            combainedcode.METADATA.loaded_at = None
+            if combined:
+                combainedcode.process_combined_model(year)
+            else:
+                combainedcode.process_pricing_model(year)
+                combainedcode.process_sla_model(year)
+            # Closing ends the pass, so the next one starts its running totals over
+            combainedcode.REPORT_WRITER.close()
+            # In sql mode matrix rows never pass the writer, so count the tables
+            with combainedcode.REPORTING_POOL.connection() as conn:
+                cur = conn.cursor()
+                cur.execute("SELECT (SELECT count(*) FROM daily_table) + (SELECT count(*) FROM monthly_table)")
+                rows = cur.fetchone()[0]
+                cur.close()
+            return rows
+        return run, _close_sources
+    return setup
+
+
+def _sla_case(db_config, year):
+    import reporting_db
+    import sla_reporting
+    from report_writer import prepare_report_tables
+    reporting_db.REPORTING_POOL.db_config = dict(db_config)
+    prepare_report_tables(reporting_db.REPORTING_POOL)
+
+    def run():
+        reporting_db.METADATA.loaded_at = None
+        before = reporting_db.REPORT_WRITER.stats["rows"]
+        sla_reporting.process_sla_model(year)
+        reporting_db.REPORT_WRITER.close()
+        return reporting_db.REPORT_WRITER.stats["rows"] - before
+    return run, _close_sources
+
+
+def _task_pipeline(db_config):
+    import testwithdatabase
+    testwithdatabase.DB_CONFIG.clear()
+    testwithdatabase.DB_CONFIG.update(db_config)
+    return testwithdatabase
+
+
+def _extract_case(db_config, year):
+    pipeline = _task_pipeline(db_config)
+
+    def run():
+        tasks, _ = pipeline.extract_tasks_from_db(pushdown=True)
+        return len(pipeline.transform_tasks(tasks, filters_pushed_down=True))
+    return run, None
+
+
+def _load_case(method):
+    def setup(db_config, year):
+        pipeline = _task_pipeline(db_config)
+        tasks, _ = pipeline.extract_tasks_from_db(pushdown=True)
+        data = pipeline.transform_tasks(tasks, filters_pushed_down=True)
+
+        def run():
+            if not pipeline.load_to_postgres(data, method):
+                raise RuntimeError(f"load_to_postgres({method!r}) failed, see the case log")
+            return len(data)
+        return run, None
+    return setup
+
+
+CASES = {
+    "pricing": _pricing_case("vectorized"),
+    "pricing_sql": _pricing_case("sql"),
+    "combined": _pricing_case("vectorized", combined=True),
+    "sla": _sla_case,
+    "extract_tasks": _extract_case,
+    "load_copy": _load_case("copy"),
+    "load_row": _load_case("row"),
+}
+# load_row is opt-in: the per-row upsert takes minutes at 1M rows
+DEFAULT_CASES = ("pricing", "pricing_sql", "combined", "sla", "extract_tasks", "load_copy")
+
+
+# ==== MEASUREMENT ====
+def percentile(values, pct):
+    # Nearest-rank percentile
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def _latency_summary(values):
+    return {
+        "p50": round(percentile(values, 50), 6),
+        "p95": round(percentile(values, 95), 6),
+        "p99": round(percentile(values, 99), 6),
+        "min": round(min(values), 6),
+        "max": round(max(values), 6),
+        "mean": round(sum(values) / len(values), 6),
+    }
+
+
+def _measure(case, db_config, schema, year, repeat, workdir):
+    import psycopg2
+    import run_metrics
+
+    # The pipelines write output/ and logs/ relative to the working directory
+    # and print per row; keep both out of the repo and off the terminal
+    os.chdir(workdir)
+    log = open(os.path.join(workdir, f"{case}.log"), "a", buffering=1)
+    sys.stdout = sys.stderr = log
+    sys.path.insert(0, REPO_DIR)
+
+    config = dict(db_config, options=f"-c search_path={schema}")
+    run, teardown = CASES[case](config, year)
+    conn = psycopg2.connect(**config)
+    latencies, stage_latencies, rows = [], {}, []
+    try:
+        for i in range(repeat):
+            synthetic_data.reset_outputs(conn, schema)
+            run_metrics.start_run(f"bench_{case}", f"{case}_{i}",
+                                  os.path.join(workdir, f"{case}_{i}.manifest.json"),
+                                  prometheus_dir=None)
+            started = time.perf_counter()
+            try:
+                rows.append(run())
+            finally:
+                latencies.append(time.perf_counter() - started)
+                manifest = run_metrics.finish_run()
+            for record in manifest["stages"]:
+                stage_latencies.setdefault(record["stage"], []).append(record["wall_seconds"])
+    finally:
+        conn.close()
+        if teardown:
+            teardown()
+
+    return {
+        "rows_per_run": rows[-1],
+        "repeat": repeat,
+        "latency_seconds": _latency_summary(latencies),
+        "rows_per_sec": round(sum(rows) / sum(latencies), 2) if sum(latencies) else None,
+        # ru_maxrss is in KiB on Linux; the case runs in its own process so
+        # this is the peak of that case alone
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": {name: dict(calls=len(values), **_latency_summary(values))
+                   for name, values in stage_latencies.items()},
+    }
+
+
+# ==== IMPORT TIMES ====
+# Entry-point modules, each imported in a fresh interpreter. Heavy client
+# libraries an import pulled in are listed, so lazy loading can be checked.
+IMPORT_MODULES = ("combainedcode", "sla_reporting", "testwithdatabase", "testwithapi")
+HEAVY_MODULES = ("psycopg2", "oracledb", "numpy", "pyarrow", "aiohttp", "sqlite3")
+
+_IMPORT_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds,
+                  "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "loaded": [name for name in {heavy!r} if name in sys.modules]}}))
+"""
+
+
+def measure_imports(modules=IMPORT_MODULES, repeat=REPEAT):
+    # The scripts create logs/ and output/ relative to the working directory
+    workdir = tempfile.mkdtemp(prefix="etl_bench_imports_")
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get("PYTHONPATH")])))
+    results = {}
+    try:
+        for module in modules:
+            probe = _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)
+            runs = []
+            for _ in range(repeat):
+                done = subprocess.run([sys.executable, "-c", probe], cwd=workdir, env=env,
+                                      capture_output=True, text=True)
+                if done.returncode:
+                    results[module] = {"error": (done.stderr.strip().splitlines() or ["failed"])[-1]}
+                    break
+                runs.append(json.loads(done.stdout.strip().splitlines()[-1]))
+            else:
+                results[module] = {
+                    "import_seconds": _latency_summary([run["seconds"] for run in runs]),
+                    "peak_rss_mb": round(max(run["rss_mb"] for run in runs), 1),
+                    "heavy_modules": runs[-1]["loaded"],
+                }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def _print_imports(imports):
+    for module, result in imports.items():
+        if "error" in result:
+            print(f"[ERROR] import {module:<17} | {result['error']}")
+            continue
+        print(f"[RESULT] import {module:<17} | p50 {result['import_seconds']['p50'] * 1000:7.1f} ms "
+              f"| peak RSS {result['peak_rss_mb']:6.1f} MB "
+              f"| loaded: {', '.join(result['heavy_modules']) or '-'}")
+
+
+# ==== LOGGING COST ====
+# The same records through the old synchronous handlers and through the
+# queue listener, and per-row prints against a Progress counter. "caller"
+# is the time the pipeline thread spends logging; "total" includes writing
+# everything out.
+LOG_RECORDS = 100_000
+
+
+def _logging_cost(records, workdir):
+    import contextlib
+    import logging
+
+    import etl_logging
+
+    files = [os.path.join(workdir, "run.log"), os.path.join(workdir, "general.log")]
+    # Line buffered like a terminal: one write per line
+    devnull = open(os.devnull, "w", buffering=1)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    results = {}
+
+    def timed(name, emit_all, finish=None):
+        started = time.perf_counter()
+        emit_all()
+        caller = time.perf_counter() - started
+        if finish:
+            finish()
+        total = time.perf_counter() - started
+        results[name] = {"records": records, "caller_seconds": round(caller, 4),
+                         "total_seconds": round(total, 4),
+                         "caller_us_per_record": round(caller / records * 1e6, 3)}
+
+    def log_all():
+        for i in range(records):
+            logging.info(f"Queued daily pricing for group_{i}")
+
+    # Before: FileHandler x2 + console StreamHandler on the root logger
+    handlers = [logging.FileHandler(path) for path in files] + [logging.StreamHandler(devnull)]
+    for handler in handlers:
+        handler.setFormatter(logging.Formatter(etl_logging.TEXT_FORMAT))
+        root.addHandler(handler)
+    timed("sync_handlers", log_all)
+    for handler in handlers:
+        root.removeHandler(handler)
+        handler.close()
+
+    for log_format in etl_logging.LOG_FORMATS:
+        etl_logging.setup_logging(files, log_format, console_stream=devnull)
+        timed(f"queue_listener_{log_format}", log_all, etl_logging.stop_logging)
+
+    with contextlib.redirect_stdout(devnull):
+        timed("per_row_print", lambda: [print(f"[SUCCESS] Queued daily pricing for group_{i}")
+                                         for i in range(records)])
+        progress = etl_logging.Progress("Queued pricing rows")
+        timed("progress", lambda: [progress.add() for _ in range(records)], progress.close)
+    devnull.close()
+    return results
+
+
+def measure_logging(records=LOG_RECORDS):
+    workdir = tempfile.mkdtemp(prefix="etl_bench_logging_")
+    try:
+        return _logging_cost(records, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _print_logging(results):
+    for name, result in results.items():
+        print(f"[RESULT] logging {name:<21} | {result['records']} records | caller "
+              f"{result['caller_seconds']:.3f}s ({result['caller_us_per_record']:.2f} us/record) "
+              f"| total {result['total_seconds']:.3f}s")
+
+
+def _case_process(case, db_config, schema, year, repeat, workdir, results):
+    try:
+        results.put(_measure(case, db_config, schema, year, repeat, workdir))
+    except BaseException as e:
+        results.put({"error": repr(e)})
+
+
+def run_case(case, db_config, schema, year, repeat, workdir):
+    # Fresh interpreter per case: no warm caches, pools or RSS carried over
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_case_process,
+                              args=(case, db_config, schema, year, repeat, workdir, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+# ==== THROWAWAY POSTGRES ====
+@contextmanager
+def throwaway_postgres():
+    # A private cluster in a temp directory, removed on exit
+    initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+    if not initdb or not pg_ctl:
+        raise RuntimeError("initdb/pg_ctl not found on PATH; pass --dsn or set ETL_BENCH_DSN instead")
+    datadir = tempfile.mkdtemp(prefix="etl_bench_pg_")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    subprocess.run([initdb, "-D", datadir, "-U", "postgres", "-A", "trust"],
+                   check=True, stdout=subprocess.DEVNULL)
+    subprocess.run([pg_ctl, "-D", datadir, "-w", "-l", os.path.join(datadir, "server.log"),
+                    "-o", f"-p {port} -k {datadir} -c listen_addresses=127.0.0.1", "start"],
+                   check=True, stdout=subprocess.DEVNULL)
+    try:
+        yield {"host": "127.0.0.1", "port": port, "dbname": "postgres",
+               "user": "postgres", "password": ""}
+    finally:
+        subprocess.run([pg_ctl, "-D", datadir, "-m", "fast", "stop"],
+                       check=False, stdout=subprocess.DEVNULL)
+        shutil.rmtree(datadir, ignore_errors=True)
+
+
+# ==== REGRESSIONS ====
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    regressions = []
+    previous = {(r["case"], r["scale"]): r for r in baseline["results"] if "error" not in r}
+    for result in current["results"]:
+        base = previous.get((result["case"], result["scale"]))
+        if base is None or "error" in result:
+            continue
+        label = f"{result['case']} @ {result['scale']}"
+        if base["rows_per_sec"] and result["rows_per_sec"] is not None \
+                and result["rows_per_sec"] < base["rows_per_sec"] * (1 - threshold):
+            regressions.append(f"{label}: throughput {base['rows_per_sec']:.0f} -> "
+                               f"{result['rows_per_sec']:.0f} rows/sec")
+        if result["latency_seconds"]["p95"] > base["latency_seconds"]["p95"] * (1 + threshold):
+            regressions.append(f"{label}: p95 latency {base['latency_seconds']['p95']:.3f}s -> "
+                               f"{result['latency_seconds']['p95']:.3f}s")
+        if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + threshold):
+            regressions.append(f"{label}: peak RSS {base['peak_rss_mb']:.1f} MB -> "
+                               f"{result['peak_rss_mb']:.1f} MB")
+    for module, result in current.get("imports", {}).items():
+        base = baseline.get("imports", {}).get(module)
+        if base is None or "error" in base or "error" in result:
+            continue
+        if result["import_seconds"]["p50"] > base["import_seconds"]["p50"] * (1 + threshold):
+            regressions.append(f"import {module}: p50 {base['import_seconds']['p50'] * 1000:.1f} -> "
+                               f"{result['import_seconds']['p50'] * 1000:.1f} ms")
+    return regressions
+
+
+# ==== RUNNER ====
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _print_result(result):
+    if "error" in result:
+        print(f"[ERROR] {result['case']:<14} {result['scale']:>5} | {result['error']}")
+        return
+    latency = result["latency_seconds"]
+    print(f"[RESULT] {result['case']:<14} {result['scale']:>5} | rows: {result['rows_per_run']:>9} "
+          f"| {result['rows_per_sec'] or 0:>11.0f} rows/sec | p50 {latency['p50']:.3f}s "
+          f"p95 {latency['p95']:.3f}s p99 {latency['p99']:.3f}s | peak RSS {result['peak_rss_mb']:.1f} MB")
+
+
+def run_benchmarks(db_config, scales, cases, repeat=REPEAT, year=BENCH_YEAR, seed=42, keep_data=False):
+    import psycopg2
+
+    admin = psycopg2.connect(**db_config)
+    cur = admin.cursor()
+    cur.execute("SHOW server_version")
+    server_version = cur.fetchone()[0]
+    cur.close()
+    source_path = f"{db_config.get('host', 'localhost')}:{db_config.get('port', 5432)}:{db_config['dbname']}"
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "host": socket.gethostname(),
+        "python": platform.python_version(),
+        "postgres": server_version,
+        "config": {"repeat": repeat, "year": year, "seed": seed},
+        "datasets": {},
+        "results": [],
+    }
+    try:
+        for scale in scales:
+            schema = f"{BENCH_SCHEMA}_{scale.lower()}"
+            print(f"[INFO] Generating {scale} synthetic dataset in schema {schema}...")
+            started = time.perf_counter()
+            counts = synthetic_data.generate(admin, schema, synthetic_data.SCALES[scale], source_path,
+                                             db_config.get("user"), db_config.get("password"), seed)
+            report["datasets"][scale] = dict(counts, generate_seconds=round(time.perf_counter() - started, 3))
+            workdir = tempfile.mkdtemp(prefix=f"etl_bench_{scale}_")
+            try:
+                for case in cases:
+                    result = {"case": case, "scale": scale,
+                              **run_case(case, db_config, schema, year, repeat, workdir)}
+                    _print_result(result)
+                    report["results"].append(result)
+            finally:
+                if keep_data:
+                    print(f"[INFO] Kept {schema} and case logs in {workdir}")
+                else:
+                    synthetic_data.drop(admin, schema)
+                    shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        admin.close()
+    return report
+
+
+def _db_config(dsn):
+    from psycopg2.extensions import parse_dsn
+    return parse_dsn(dsn)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pricing and task pipelines on synthetic data.")
+    parser.add_argument("--dsn", default=BENCH_DSN,
+                        help="libpq DSN of a scratch database (default: $ETL_BENCH_DSN)")
+    parser.add_argument("--throwaway", action="store_true",
+                        help="start a temporary local PostgreSQL with initdb/pg_ctl instead of --dsn")
+    parser.add_argument("--scales", nargs="+", choices=list(synthetic_data.SCALES), default=["1k", "100k"])
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(DEFAULT_CASES))
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--year", default=BENCH_YEAR)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="results JSON (default: bench_results/bench_<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier results JSON to check for regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--keep-data", action="store_true", help="leave the synthetic schemas and case logs")
+    parser.add_argument("--imports", action="store_true",
+                        help="only time importing the entry-point modules; needs no database")
+    parser.add_argument("--logging", action="store_true",
+                        help="only measure the cost of logging and per-row progress; needs no database")
+    parser.add_argument("--log-records", type=int, default=LOG_RECORDS)
+    args = parser.parse_args()
+
+    if not (args.imports or args.logging) and not args.throwaway and not args.dsn:
+        parser.error("pass --dsn, set ETL_BENCH_DSN or use --throwaway")
+
+    if args.imports or args.logging:
+        report = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "host": socket.gethostname(),
+            "python": platform.python_version(),
+            "config": {"repeat": args.repeat, "log_records": args.log_records},
+            "results": [],
+        }
+        if args.imports:
+            report["imports"] = measure_imports(repeat=args.repeat)
+            _print_imports(report["imports"])
+        if args.logging:
+            report["logging"] = measure_logging(args.log_records)
+            _print_logging(report["logging"])
+    elif args.throwaway:
+        with throwaway_postgres() as config:
+            report = run_benchmarks(config, args.scales, args.cases, args.repeat, args.year,
+                                    args.seed, args.keep_data)
+    else:
+        report = run_benchmarks(_db_config(args.dsn), args.scales, args.cases, args.repeat,
+                                args.year, args.seed, args.keep_data)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"[INFO] Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(json.load(file), report, args.threshold)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"[SUCCESS] No regressions beyond {args.threshold:.0%} against {args.baseline}")
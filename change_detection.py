@@ -0,0 +1,89 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from task_loader import TASK_COLUMNS
+
+# ==== CHANGE DETECTION ====
+# A source without timestamps can still be loaded incrementally: the index
+# maps each loaded row's key to a 64-bit hash of its content as of the last
+# successful load, so only inserted and changed rows are sent on the next run.
+CHANGE_COLUMN = "change"  # "insert", "update" or "delete" in the delta output
+DELTA_COLUMNS = TASK_COLUMNS + [CHANGE_COLUMN]
+
+
+def row_hash(row, columns=TASK_COLUMNS):
+    content = "\x1f".join(repr(row[column]) for column in columns)
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def deletion_rows(keys, key="task_id"):
+    return [{key: value, CHANGE_COLUMN: "delete"} for value in keys]
+
+
+class ChangeIndex:
+    def __init__(self, path, key="task_id", columns=TASK_COLUMNS):
+        self.path = path
+        self.key = key
+        self.columns = list(columns)
+        self.previous = {}
+        self.seen = {}
+        self._lock = threading.Lock()
+        self.stats = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+
+    def load(self):
+        # A missing index, or one built for other columns, makes every row new
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                index = json.load(file)
+        except FileNotFoundError:
+            index = None
+        if index and index.get("key") == self.key and index.get("columns") == self.columns:
+            self.previous = {key: digest for key, digest in index["rows"]}
+        logging.info(f"Loaded change index with {len(self.previous)} rows from {self.path}.")
+        return self
+
+    def changes(self, rows):
+        # The inserted and updated rows, tagged with CHANGE_COLUMN; safe to
+        # call chunk by chunk
+        changed = []
+        with self._lock:
+            for row in rows:
+                key, digest = row[self.key], row_hash(row, self.columns)
+                self.seen[key] = digest
+                previous = self.previous.get(key)
+                if previous == digest:
+                    self.stats["unchanged"] += 1
+                    continue
+                self.stats["inserted" if previous is None else "updated"] += 1
+                changed.append(dict(row, **{CHANGE_COLUMN: "insert" if previous is None else "update"}))
+        return changed
+
+    def deleted(self):
+        # Keys loaded before that the source no longer returns; call once
+        # every row has been passed through changes()
+        with self._lock:
+            deleted = [key for key in self.previous if key not in self.seen]
+            self.stats["deleted"] = len(deleted)
+        return deleted
+
+    def log_stats(self):
+        stats = dict(self.stats)
+        logging.info(f"Change detection: {stats['inserted']} inserted, {stats['updated']} updated, "
+                     f"{stats['deleted']} deleted, {stats['unchanged']} unchanged rows skipped.")
+        return stats
+
+    def save(self, deletions_applied=False):
+        # Only after the load committed. Rows that were not deleted are still
+        # in the target table and stay in the index.
+        with self._lock:
+            rows = dict(self.seen) if deletions_applied else {**self.previous, **self.seen}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"key": self.key, "columns": self.columns, "rows": list(rows.items())},
+                      file, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+        logging.info(f"Saved change index with {len(rows)} rows to {self.path}.")
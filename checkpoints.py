@@ -0,0 +1,89 @@
+import threading
+
+# ==== RUN CHECKPOINTS ====
+# One row per application group and phase that finished in a run. Rows are
+# written by the report writer in the same transaction as the group's report
+# rows, so a checkpoint never gets ahead of the data it vouches for.
+CHECKPOINT_DDL = """
+    CREATE TABLE IF NOT EXISTS etl_run_checkpoints (
+        run_id TEXT NOT NULL,
+        phase TEXT NOT NULL,
+        application_group_name TEXT NOT NULL,
+        completed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (run_id, phase, application_group_name)
+    )
+"""
+
+
+class RunCheckpoints:
+    def __init__(self, pool, writer, run_id, resume=False):
+        self.pool = pool
+        self.writer = writer
+        self.run_id = run_id
+        self.resume = resume
+        self._done = set()
+        self._lock = threading.Lock()
+        self.stats = {"resumed": 0, "skipped": 0, "completed": 0}
+
+    def load(self):
+        with self.pool.connection() as conn:
+            # The table is created by report_writer.prepare_report_tables
+            cur = conn.cursor()
+            if self.resume:
+                cur.execute("""
+                    SELECT phase, application_group_name FROM etl_run_checkpoints
+                    WHERE run_id = %s
+                """, (self.run_id,))
+                self._done = set(cur.fetchall())
+            conn.commit()
+            cur.close()
+        self.stats["resumed"] = len(self._done)
+        if self.resume:
+            print(f"[INFO] Resuming run {self.run_id}: {len(self._done)} group checkpoints already done")
+        return self
+
+    def pending(self, phase, rows):
+        # rows whose application group (first column) has not finished phase
+        with self._lock:
+            kept = [row for row in rows if (phase, row[0]) not in self._done]
+            self.stats["skipped"] += len(rows) - len(kept)
+        if len(kept) < len(rows):
+            print(f"[INFO] Skipping {len(rows) - len(kept)} groups already done in phase {phase}")
+        return kept
+
+    def mark_done(self, phase, application_group):
+        with self._lock:
+            if (phase, application_group) in self._done:
+                return
+            self._done.add((phase, application_group))
+            self.stats["completed"] += 1
+        self.writer.add_checkpoint(self.run_id, phase, application_group)
+
+
+class _NoCheckpoints:
+    # Used when no checkpointed run was started, e.g. library callers
+    def pending(self, phase, rows):
+        return list(rows)
+
+    def mark_done(self, phase, application_group):
+        pass
+
+
+# ==== CURRENT RUN ====
+_current = _NoCheckpoints()
+
+
+def start_checkpoints(pool, writer, run_id, resume=False):
+    global _current
+    _current = RunCheckpoints(pool, writer, run_id, resume).load()
+    return _current
+
+
+def current_checkpoints():
+    return _current
+
+
+def finish_checkpoints():
+    global _current
+    checkpoints, _current = _current, _NoCheckpoints()
+    return dict(checkpoints.stats) if isinstance(checkpoints, RunCheckpoints) else None
@@ -0,0 +1,112 @@
+import logging
+import os
+from datetime import date
+
+from change_detection import CHANGE_COLUMN
+from task_loader import TASK_COLUMNS
+
+# pyarrow is only needed for Parquet output and is imported on first use, so
+# CSV runs work without it and do not pay its import time
+pa = pq = None
+
+# ==== PARQUET CONFIG ====
+# Rows per row group: large enough for good compression and column pruning,
+# small enough that a streaming writer only buffers one group at a time
+PARQUET_ROW_GROUP_SIZE = int(os.environ.get("ETL_PARQUET_ROW_GROUP_SIZE", 128_000))
+PARQUET_COMPRESSION = os.environ.get("ETL_PARQUET_COMPRESSION", "zstd")
+
+# Arrow types of the todo_metrics columns, plus the change column of delta files
+TASK_TYPES = {"task_id": "int64", "title": "string", "user_id": "int64", "completed": "bool",
+              CHANGE_COLUMN: "string"}
+
+
+def _require_pyarrow():
+    global pa, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow")
+        pa, pq = pyarrow, pyarrow.parquet
+
+
+def task_schema(columns=TASK_COLUMNS):
+    _require_pyarrow()
+    return pa.schema([(column, TASK_TYPES[column]) for column in columns])
+
+
+def partition_path(base_dir, file_name, run_date=None):
+    # Hive-style run_date=YYYY-MM-DD directories, so readers can prune by date
+    run_date = run_date or date.today()
+    return os.path.join(base_dir, f"run_date={run_date.isoformat()}", file_name)
+
+
+# ==== PARQUET SINK ====
+# Same open/write/close(ok) interface as the streaming sinks. Rows are written
+# one full row group at a time to a temporary file that is renamed into place
+# on success, so readers never see a partial file.
+class ParquetSink:
+    name = "parquet"
+    stage = "load_to_parquet"
+
+    def __init__(self, path, columns=TASK_COLUMNS, deletions=None,
+                 row_group_size=PARQUET_ROW_GROUP_SIZE, compression=PARQUET_COMPRESSION):
+        # deletions() returns the rows to append once every chunk was written,
+        # as for the CSV sink
+        self.path = path
+        self.columns = columns
+        self.deletions = deletions
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.rows = 0
+        self.row_groups = 0
+
+    def open(self):
+        logging.info(f"Saving filtered tasks to Parquet at {self.path}...")
+        self.schema = task_schema(self.columns)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression=self.compression)
+        self.pending = []
+
+    def _write_group(self, rows):
+        table = pa.Table.from_pylist(rows, schema=self.schema)
+        self.writer.write_table(table, row_group_size=self.row_group_size)
+        self.row_groups += 1
+
+    def write(self, chunk):
+        self.pending.extend(chunk)
+        self.rows += len(chunk)
+        while len(self.pending) >= self.row_group_size:
+            group, self.pending = self.pending[:self.row_group_size], self.pending[self.row_group_size:]
+            self._write_group(group)
+
+    def close(self, ok=True):
+        try:
+            if ok and self.deletions:
+                self.write(self.deletions())
+            if ok and self.pending:
+                self._write_group(self.pending)
+            self.pending = []
+        finally:
+            self.writer.close()
+        if ok:
+            os.replace(self.tmp_path, self.path)
+            logging.info(f"Parquet write completed ({self.rows} rows, {self.row_groups} row groups, "
+                         f"{os.path.getsize(self.path) / 1024:.1f} KiB).")
+        else:
+            os.remove(self.tmp_path)
+            logging.warning("Parquet output discarded because the pipeline failed.")
+
+
+def write_parquet(data, path, **sink_options):
+    sink = ParquetSink(path, **sink_options)
+    sink.open()
+    try:
+        sink.write(data)
+    except BaseException:
+        sink.close(ok=False)
+        raise
+    sink.close()
+    return sink.rows
@@ -1,217 +1,429 @@
-import psycopg2
-import oracledb
+import argparse
+import os
 import sys
-from datetime import datetime
-from sla_reporting import sla_reporting
-
-# === PostgreSQL Reporting DB Configuration ===
-DB_CONFIG = {
-    "host": "localhost",
-    "dbname": "reporting",
-    "user": "postgres",
-    "password": "admin"
-}
+from datetime import date, datetime
+from checkpoints import current_checkpoints, finish_checkpoints, start_checkpoints
+from dag import Dag, load_timings
+from etl_logging import Progress
+from pricing_engine import get_price_matrix, insert_matrix_prices, price_groups
+from report_writer import ReportKeyError, prepare_report_tables
+from reporting_db import METADATA, REPORT_WRITER, REPORTING_POOL
+from result_cache import (RESULT_CACHE_MODE, RESULT_CACHE_MODES, configure_result_cache,
+                          get_result_cache, normalize_query)
+from run_metrics import finish_run, stage, start_run, timed_stage
+from sharding import in_shard, merge_manifest_files, parse_shard, run_local_shards, shard_label
+from source_connections import close_source_connections, query_source_rows
+from source_fanout import get_source_fanout, shutdown_source_fanout
+from sla_reporting import SLA_PROGRESS, sla_db_sources, sla_reporting, process_sla_model
+
+# === Pricing Configuration ===
+# Matrix (non-PXQ) pricing: "vectorized" prices in Python with NumPy, "sql" runs
+# INSERT ... SELECT inside the reporting database so no rows move through Python
+MATRIX_PRICING_MODE = os.environ.get("ETL_MATRIX_PRICING_MODE", "vectorized")
+PRICING_PROGRESS = Progress("Queued pricing rows")
+
 # === PXQ Pricing Logic ===
 def RU_basepricing(application_group):
     print(f"[INFO] PXQ Pricing for: {application_group}")
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
+        row = METADATA.pricing_model(application_group)
 
-        cur.execute("""
-            SELECT * FROM pricingmodel_table
-            WHERE application_group_name = %s
-        """, (application_group,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
-
-        Databasemapping(application_group)
+        return Databasemapping(application_group)
 
     except Exception as e:
         print(f"[ERROR] Failed in RU_basepricing for {application_group}: {e}")
+        return False
 
 # === Matrix Pricing Logic ===
 def matrix_pricing(application_group, year_input):
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT price_year1, price_year2 FROM pricingmatrix_table
-        WHERE application_group_name = %s
-    """, (application_group,))
-    row = cur.fetchone()
-    if not row:
-        print(f"[WARNING] No matrix data for: {application_group}")
-        return
-    price_year1, price_year2 = row
-    if int(year_input) == 2023:
-        yearly_price = price_year1
-    elif int(year_input) == 2022:
-        yearly_price = price_year2
-    else:
-        print(f"[WARNING] Year {year_input} doesn't match 2022 or 2023")
-        return
-
-    print(f"[INFO] Year matched: {year_input} | Price: {yearly_price}")
-    reporting(application_group, yearly_price)
-
-    cur.close()
-    conn.close()
+    matrix_pricing_batch([application_group], year_input)
+
+def matrix_pricing_batch(application_groups, year_input):
+    # Prices every group in one vectorized pass over the whole matrix; the
+    # year picks its column through the configured year -> column index.
+    # Returns False when the year cannot be priced.
+    application_groups = list(dict.fromkeys(application_groups))
+    matrix = get_price_matrix(METADATA)
+    if int(year_input) not in matrix.year_index:
+        print(f"[WARNING] Year {year_input} has no matrix price column (configured: {matrix.years})")
+        return False
+    with stage("matrix_pricing", year=str(year_input)) as record:
+        record.rows_in = len(application_groups)
+        groups, daily, monthly = price_groups(matrix, year_input, application_groups)
+        priced = set(groups.tolist())
+        for application_group in (group for group in application_groups if group not in priced):
+            print(f"[WARNING] No matrix data for: {application_group}")
+        REPORT_WRITER.add_daily_many(groups, daily)
+        if datetime.now().day == 1:
+            REPORT_WRITER.add_monthly_many(groups, monthly)
+        record.rows_out = len(groups)
+    print(f"[SUCCESS] Queued daily{' and monthly' if datetime.now().day == 1 else ''} "
+          f"pricing for {len(groups)} matrix groups | year {year_input}")
+    return True
+
+def matrix_pricing_in_db(year_input, application_groups=None):
+    # Set-based run over every non-PXQ group in pricingmodel_table, or only
+    # application_groups when given
+    column = METADATA.year_columns.get(int(year_input))
+    if column is None:
+        print(f"[WARNING] Year {year_input} has no matrix price column (configured: {METADATA.matrix_years()})")
+        return False
+    monthly = datetime.now().day == 1
+    with stage("matrix_pricing", year=str(year_input), mode="sql") as record, \
+            REPORTING_POOL.connection() as conn:
+        cur = conn.cursor()
+        daily_rows, monthly_rows, unpriced = insert_matrix_prices(cur, column, date.today(), monthly,
+                                                                application_groups)
+        conn.commit()
+        cur.close()
+        record.rows_out = daily_rows + monthly_rows
+    if unpriced:
+        print(f"[WARNING] {unpriced} matrix groups have no {column} price for {year_input}")
+    print(f"[SUCCESS] Inserted {daily_rows} daily and {monthly_rows} monthly matrix prices "
+          f"in-database | year {year_input}")
+    return True
 
 # === Insert Daily and Monthly Prices ===
 def RU_reporting(application_group, platform, Ru_measured):
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-    daily_price = Ru_measured / 365
-    cur.execute("""
-        INSERT INTO daily_table (application_group_name, date, price)
-        VALUES (%s, CURRENT_DATE, %s)
-    """, (application_group, daily_price))
-
-    if datetime.now().day == 1:
-        monthly_price = Ru_measured / 12
-        cur.execute("""
-            INSERT INTO monthly_table (application_group_name, month, price)
-            VALUES (%s, TO_CHAR(CURRENT_DATE, 'YYYY-MM'), %s)
-        """, (application_group, monthly_price))
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-    print(f"[SUCCESS] Inserted daily{' and monthly' if datetime.now().day == 1 else ''} pricing for {application_group}")
-
-def reporting(application_group, year_input):
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-    daily_price = year_input / 365
-    cur.execute("""
-        INSERT INTO daily_table (application_group_name, date, price)
-        VALUES (%s, CURRENT_DATE, %s)
-    """, (application_group, daily_price))
+    # Rows are buffered and written in bulk by REPORT_WRITER
+    REPORT_WRITER.add_daily(application_group, Ru_measured / 365)
 
     if datetime.now().day == 1:
-        monthly_price = year_input / 12
-        cur.execute("""
-            INSERT INTO monthly_table (application_group_name, month, price)
-            VALUES (%s, TO_CHAR(CURRENT_DATE, 'YYYY-MM'), %s)
-        """, (application_group, monthly_price))
-
-    conn.commit()
-    cur.close()
-    conn.close()
+        REPORT_WRITER.add_monthly(application_group, Ru_measured / 12)
 
-    print(f"[SUCCESS] Inserted daily{' and monthly' if datetime.now().day == 1 else ''} pricing for {application_group}")
+    # One progress line every few seconds rather than one line per row
+    PRICING_PROGRESS.add()
 
 # === Fetch driver info ===
-def fetch_driver_details(cursor, ref_number):
-    cursor.execute("""
-        SELECT db_engine, DB_driverpath, db_driverclass, db_username, db_pass
-        FROM database_driver_table
-        WHERE DBdriverreferncenumber = %s
-    """, (ref_number,))
-    return cursor.fetchone()
+def fetch_driver_details(ref_number):
+    return METADATA.driver(ref_number)
 
 # === Execute External SQL Query ===
-def execute_query(engine, driver_path, username, password, query, purpose):
-    try:
-        if engine.lower() == "postgresql":
-            host, port, dbname = driver_path.split(":")
-            conn = psycopg2.connect(
-                host=host,
-                port=port,
-                dbname=dbname,
-                user=username,
-                password=password
-            )
-        elif engine.lower() == "oracle":
-            host, port, service = driver_path.split(":")
-            dsn = oracledb.makedsn(host, port, service_name=service)
-            conn = oracledb.connect(user=username, password=password, dsn=dsn)
+def iter_source_rows(engine, driver_path, username, password, query, fetch_size=None):
+    # Chunks of the query result, served from the on-disk result cache when
+    # it is enabled and holds today's answer
+    return get_result_cache().rows(
+        engine, driver_path, username, query,
+        lambda: query_source_rows(engine, driver_path, username, password, query, fetch_size),
+    )
+
+def report_source_rows(rows, purpose):
+    for row in rows:
+        app_group, platform, RU_measured = row
+        if purpose == 'pricing':
+            RU_reporting(app_group, platform, RU_measured)
         else:
-            print(f"[ERROR] Unsupported database engine: {engine}")
-            return
-
-        cur = conn.cursor()
-        print(f"[INFO] Executing query:\n{query}")
-        cur.execute(query)
-        rows = cur.fetchall()
-        print(f"[SUCCESS] Retrieved {len(rows)} records.")
-
-        for row in rows:
-            app_group, platform, RU_measured = row
-            if purpose == 'pricing':
-                RU_reporting(app_group, platform, RU_measured)
-            else:
-                sla_reporting(app_group, platform, RU_measured)
-
-        cur.close()
-        conn.close()
+            sla_reporting(app_group, platform, RU_measured)
 
+def execute_query(engine, driver_path, username, password, query, purpose, fetch_size=None):
+    try:
+        for rows in iter_source_rows(engine, driver_path, username, password, query, fetch_size):
+            report_source_rows(rows, purpose)
     except Exception as e:
         print(f"[ERROR] Failed to execute query on {engine}: {e}")
 
 # === Mapping driver logic ===
 def Databasemapping(application_group):
+    # Returns True once every mapping of the group was queried and reported
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT APP_grp, app_name, DB_name, Environment, DB_driver_refernce_number, SQLquery
-            FROM database_table
-            WHERE application_group_name = %s
-        """, (application_group,))
-        rows = cur.fetchall()
-
+        rows = METADATA.mappings(application_group)
         if not rows:
             print(f"[WARN] No mappings found for application group: {application_group}")
-            return
+            return True
 
+        # Source queries run concurrently; results are reported in mapping order
+        jobs = []
+        ok = True
         for row in rows:
             APP_grp, app_name, DB_name, Environment, ref_num, SQLquery = row
-            print(f"\n[INFO] Processing app: {app_name} ({Environment})")
-
-            driver_details = fetch_driver_details(cur, ref_num)
+            driver_details = fetch_driver_details(ref_num)
             if not driver_details:
                 print(f"[ERROR] No DB driver found for reference: {ref_num}")
+                ok = False
                 continue
+            engine, path, driver_class, user, pwd, fetch_size = driver_details
+            jobs.append(((app_name, Environment, engine), path, iter_source_rows,
+                         (engine, path, user, pwd, SQLquery, fetch_size)))
 
-            engine, path, user, pwd,SQLquery = driver_details
-            execute_query(engine, path, user, pwd, SQLquery,)
-
-        cur.close()
-        conn.close()
+        for (app_name, Environment, engine), chunks in get_source_fanout().stream_ordered(jobs):
+            print(f"\n[INFO] Processing app: {app_name} ({Environment})")
+            try:
+                for rows in chunks:
+                    report_source_rows(rows, 'pricing')
+            except Exception as e:
+                chunks.close()
+                print(f"[ERROR] Failed to execute query on {engine}: {e}")
+                ok = False
+        return ok
 
     except Exception as e:
+        # The group is left without a checkpoint so --resume retries it
         print(f"[ERROR] {e}")
-        sys.exit(1)
+        return False
 
 # === Main Controller ===
-def process_pricing_model(year_input):
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-
-    cur.execute("SELECT application_group_name, pricing_model FROM pricingmodel_table")
-    rows = cur.fetchall()
-
-    for application_group, pricing_model, purpose in rows:
+@timed_stage("process_pricing_model", count_rows=False)
+def process_pricing_model(year_input, shard=None):
+    # shard=(i, N) keeps only the application groups hashed to shard i.
+    # Groups already checkpointed in the current run are skipped; returns
+    # the groups that failed.
+    return process_pxq_model(year_input, shard) + process_matrix_model(year_input, shard)
+
+@timed_stage("process_pxq_model", count_rows=False)
+def process_pxq_model(year_input, shard=None):
+    checkpoints = current_checkpoints()
+    rows = [row for row in METADATA.pricing_models() if in_shard(row[0], shard) and row[1] == 'PXQ']
+
+    failed = []
+    for application_group, pricing_model, purpose in checkpoints.pending("pricing", rows):
         print(f"[PROCESSING] {application_group} | Model: {pricing_model} ")
-        if pricing_model == 'PXQ':
-            RU_basepricing(application_group)
+        if RU_basepricing(application_group):
+            checkpoints.mark_done("pricing", application_group)
         else:
-            matrix_pricing(application_group, year_input)
-
-    cur.close()
-    conn.close()
+            failed.append(application_group)
+    return failed
+
+@timed_stage("process_matrix_model", count_rows=False)
+def process_matrix_model(year_input, shard=None):
+    rows = [row for row in METADATA.pricing_models() if in_shard(row[0], shard) and row[1] != 'PXQ']
+    matrix_groups = [row[0] for row in current_checkpoints().pending("matrix", rows)]
+    return price_matrix_groups(matrix_groups, year_input, shard)
+
+def price_matrix_groups(matrix_groups, year_input, shard=None):
+    # Matrix groups are priced together rather than one lookup per group;
+    # returns the groups that failed
+    if not matrix_groups:
+        ok = True
+    elif MATRIX_PRICING_MODE == "sql":
+        print(f"[PROCESSING] matrix groups in-database | year {year_input}")
+        ok = matrix_pricing_in_db(year_input, None if shard is None else matrix_groups)
+    else:
+        print(f"[PROCESSING] {len(matrix_groups)} matrix groups | year {year_input}")
+        ok = matrix_pricing_batch(matrix_groups, year_input)
+    if not ok:
+        return list(matrix_groups)
+    checkpoints = current_checkpoints()
+    for application_group in matrix_groups:
+        checkpoints.mark_done("matrix", application_group)
+    return []
+
+# === Combined Pricing + SLA Controller ===
+def report_routes(application_group, pricing_model, purpose):
+    # Reporters a group's source rows go to: PXQ groups are priced from their
+    # source rows, groups with purpose 'sla' and a DB source in sla_table also
+    # report them as SLA, as the two-pass sla_pricing does
+    routes = []
+    if pricing_model == 'PXQ':
+        routes.append('pricing')
+    if purpose == 'sla' and sla_db_sources(application_group):
+        routes.append('sla')
+    return routes
+
+@timed_stage("process_combined_model", count_rows=False)
+def process_combined_model(year_input, shard=None):
+    # One scan of pricingmodel_table and one execution per distinct source
+    # query for both reports; each result row goes to every reporter any of
+    # the query's groups needs. Returns the groups that failed.
+    checkpoints = current_checkpoints()
+    rows = [row for row in METADATA.pricing_models() if in_shard(row[0], shard)]
+
+    failed = set()
+    outstanding = {}  # group -> source queries not yet reported
+    queries = {}  # (engine, driver path, user, normalized query) -> [job, routes, groups]
+    mapping_count = 0
+    for application_group, pricing_model, purpose in checkpoints.pending("combined", rows):
+        routes = report_routes(application_group, pricing_model, purpose)
+        if not routes:
+            continue
+        print(f"[PROCESSING] {application_group} | Model: {pricing_model} | Purpose: {purpose}")
+        mappings = METADATA.mappings(application_group)
+        if not mappings:
+            print(f"[WARN] No mappings found for application group: {application_group}")
+        outstanding.setdefault(application_group, 0)
+        for APP_grp, app_name, DB_name, Environment, ref_num, SQLquery in mappings:
+            driver_details = fetch_driver_details(ref_num)
+            if not driver_details:
+                print(f"[ERROR] No DB driver found for reference: {ref_num}")
+                failed.add(application_group)
+                continue
+            engine, path, driver_class, user, pwd, fetch_size = driver_details
+            mapping_count += 1
+            key = (engine.lower(), path, user, normalize_query(SQLquery))
+            if key not in queries:
+                job = ((app_name, Environment, engine), path, iter_source_rows,
+                       (engine, path, user, pwd, SQLquery, fetch_size))
+                queries[key] = [job, [], set()]
+            job, query_routes, groups = queries[key]
+            query_routes += [route for route in routes if route not in query_routes]
+            if application_group not in groups:
+                groups.add(application_group)
+                outstanding[application_group] += 1
+
+    # Groups with nothing left to query are done straight away
+    for application_group, count in outstanding.items():
+        if count == 0 and application_group not in failed:
+            checkpoints.mark_done("combined", application_group)
+
+    print(f"[INFO] {len(queries)} distinct source queries for {mapping_count} mappings")
+    jobs = [job for job, _, _ in queries.values()]
+    with stage("combined_source_queries") as record:
+        record.rows_in = mapping_count
+        record.rows_out = len(jobs)
+        results = get_source_fanout().stream_ordered(jobs)
+        for ((app_name, Environment, engine), chunks), (_, query_routes, groups) in zip(results, queries.values()):
+            print(f"\n[INFO] Processing app: {app_name} ({Environment}) -> {', '.join(query_routes)}")
+            try:
+                for chunk in chunks:
+                    for route in query_routes:
+                        report_source_rows(chunk, route)
+            except Exception as e:
+                chunks.close()
+                print(f"[ERROR] Failed to execute query on {engine}: {e}")
+                failed.update(groups)
+            # A group is done once the last of its queries has been reported
+            for application_group in groups:
+                outstanding[application_group] -= 1
+                if outstanding[application_group] == 0 and application_group not in failed:
+                    checkpoints.mark_done("combined", application_group)
+
+    matrix_groups = [row[0] for row in checkpoints.pending("matrix", [row for row in rows if row[1] != 'PXQ'])]
+    return sorted(failed) + price_matrix_groups(matrix_groups, year_input, shard)
+
+# === Pipeline DAG ===
+def pricing_dag(combined=False):
+    # PXQ, matrix and SLA pricing run side by side; PXQ and SLA share the
+    # source fan-out, which bounds their combined source queries
+    dag = Dag("pricing", log=lambda message: print(f"[INFO] {message}"),
+              log_error=lambda message: print(f"[ERROR] {message}"))
+    if combined:
+        dag.add("combined", process_combined_model, inputs=("year_input", "shard"),
+                outputs=("failed_combined",), stage="process_combined_model")
+    else:
+        dag.add("pxq_pricing", process_pxq_model, inputs=("year_input", "shard"),
+                outputs=("failed_pxq",), stage="process_pxq_model")
+        dag.add("matrix_pricing", process_matrix_model, inputs=("year_input", "shard"),
+                outputs=("failed_matrix",), stage="process_matrix_model")
+        dag.add("sla_pricing", process_sla_model, inputs=("year_input", "shard"),
+                outputs=("failed_sla",), stage="process_sla_model")
+    return dag
 
 # === Entry Point ===
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python pricing_script.py <year>")
-        sys.exit(1)
+def run_pricing(input_year, run_id, shard=None, combined=False, resume=False):
+    # Returns True when every application group finished
+    pipeline = "pricing" if shard is None else f"pricing_{shard_label(shard)}"
+    suffix = "" if shard is None else f".{shard_label(shard)}"
+    manifest_file = os.path.join("logs", f"pricing_run_{run_id}{suffix}.manifest.json")
+    run = start_run(pipeline, run_id, manifest_file)
+    if shard is not None:
+        run.extra["shard"] = f"{shard[0]}/{shard[1]}"
+    failed = []
+    try:
+        start_checkpoints(REPORTING_POOL, REPORT_WRITER, run_id, resume)
+        result = pricing_dag(combined).run({"year_input": input_year, "shard": shard})
+        for name, value in result.artifacts.items():
+            if name.startswith("failed_"):
+                failed += value
+        # A node that raised leaves its groups without checkpoints
+        failed += [f"<{name}>" for name, entry in result.report.items() if entry["status"] == "failed"]
+    finally:
+        shutdown_source_fanout()
+        run.extra["progress"] = {"pricing": PRICING_PROGRESS.close(), "sla": SLA_PROGRESS.close()}
+        run.extra["source_connections"] = close_source_connections()
+        run.extra["result_cache"] = get_result_cache().log_stats()
+        # Closing the writer also commits the last checkpoints
+        run.extra["report_writer"] = REPORT_WRITER.close()
+        run.extra["checkpoints"] = finish_checkpoints()
+        run.extra["failed_groups"] = failed
+        run.extra["reporting_pool"] = REPORTING_POOL.log_stats()
+        REPORTING_POOL.closeall()
+        finish_run()
+        print(f"[INFO] Run manifest written to {manifest_file}")
+    if failed:
+        print(f"[ERROR] {len(failed)} application groups failed; rerun with "
+              f"--resume --run-id {run_id} to retry only those")
+    return not failed
+
+def run_local_pricing_shards(input_year, run_id, shard_count, processes=None, shard_args=()):
+    # Every shard in its own process on this host, then one merged manifest;
+    # shard_args are passed through to every shard's command line
+    def shard_file(index, ext):
+        return os.path.join("logs", f"pricing_run_{run_id}.{shard_label((index, shard_count))}.{ext}")
+
+    print(f"[INFO] Running {shard_count} pricing shards on up to {processes or os.cpu_count()} processes...")
+    exit_codes = run_local_shards(
+        [sys.executable, os.path.abspath(__file__), str(input_year), "--run-id", run_id, *shard_args],
+        shard_count, processes, log_path=lambda index: shard_file(index, "log"),
+    )
+    for index, code in sorted(exit_codes.items()):
+        status = "[SUCCESS]" if code == 0 else "[ERROR]"
+        print(f"{status} Shard {index}/{shard_count} exited with {code} | log: {shard_file(index, 'log')}")
+    manifests = [shard_file(index, "manifest.json") for index in range(shard_count)
+                 if os.path.exists(shard_file(index, "manifest.json"))]
+    manifest_file = os.path.join("logs", f"pricing_run_{run_id}.manifest.json")
+    merged = merge_manifest_files(manifests, manifest_file, "pricing", run_id)
+    print(f"[INFO] Merged {len(manifests)}/{shard_count} shard manifests into {manifest_file} "
+          f"| status: {merged['status']}")
+    return all(code == 0 for code in exit_codes.values()) and len(manifests) == shard_count
 
-    input_year = sys.argv[1]
-    process_pricing_model(input_year)
-    process_sla_model(input_year)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pricing and SLA reporting run")
+    parser.add_argument("year")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="only process application groups hashed to shard i of N (0-based); "
+                             "hosts running different i with the same N split the catalog")
+    parser.add_argument("--local-shards", type=int, metavar="N",
+                        help="run all N shards as local processes and merge their manifests")
+    parser.add_argument("--processes", type=int,
+                        help="shards running at once with --local-shards (default: CPU count)")
+    parser.add_argument("--run-id",
+                        help="shared by every shard of one run so their logs and manifests line up "
+                             "(default: a new timestamp)")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip application groups the --run-id run already finished")
+    parser.add_argument("--combined", action="store_true",
+                        help="single pass: scan the model once and run each distinct source query once "
+                             "for both the pricing and SLA reports")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the stage plan with timings from earlier runs and exit")
+    parser.add_argument("--result-cache", choices=RESULT_CACHE_MODES, default=RESULT_CACHE_MODE,
+                        help="reuse today's cached source query results (use), bypass them (off), "
+                             f"or re-query and overwrite them (refresh); default {RESULT_CACHE_MODE}")
+    parser.add_argument("--invalidate-result-cache", action="store_true",
+                        help="delete every cached source query result before the run")
+    parser.add_argument("--dedupe-report-keys", action="store_true",
+                        help="merge duplicate report rows left by runs before the upsert keys existed "
+                             "(prices summed) so the keys can be created")
+    parser.add_argument("--skip-prepare", action="store_true",
+                        help="do not create the report keys and checkpoint table; set by --local-shards, "
+                             "which prepares them once before starting the shards")
+    args = parser.parse_args()
+    if args.resume and not args.run_id:
+        parser.error("--resume needs the --run-id of the run to resume")
+    args.run_id = args.run_id or datetime.now().strftime('%Y%m%d_%H%M%S')
+    if args.dry_run:
+        pricing_dag(args.combined).dry_run(
+            load_timings(os.path.join("logs", "pricing_run_*.manifest.json"), "pricing"),
+            provided=("year_input", "shard"))
+        sys.exit(0)
+
+    result_cache = configure_result_cache(mode=args.result_cache)
+    if args.invalidate_result_cache:
+        result_cache.invalidate()
+
+    if args.local_shards and args.shard:
+        parser.error("--shard and --local-shards are mutually exclusive")
+    if not args.skip_prepare:
+        try:
+            prepare_report_tables(REPORTING_POOL, dedupe=args.dedupe_report_keys)
+        except ReportKeyError as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+
+    if args.local_shards:
+        REPORTING_POOL.closeall()
+        ok = run_local_pricing_shards(args.year, args.run_id, args.local_shards, args.processes,
+                                      shard_args=["--result-cache", args.result_cache, "--skip-prepare"]
+                                      + (["--combined"] if args.combined else [])
+                                      + (["--resume"] if args.resume else []))
+        sys.exit(0 if ok else 1)
+    sys.exit(0 if run_pricing(args.year, args.run_id, args.shard, args.combined, args.resume) else 1)
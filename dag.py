@@ -0,0 +1,256 @@
+import glob
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from run_metrics import current_run
+
+# ==== DAG CONFIG ====
+# Nodes running at once on the thread pool, and the process pool size for
+# pool="process" nodes (CPU-bound work that must not hold the GIL)
+DAG_MAX_WORKERS = int(os.environ.get("ETL_DAG_MAX_WORKERS", 4))
+DAG_PROCESS_WORKERS = int(os.environ.get("ETL_DAG_PROCESS_WORKERS", os.cpu_count() or 1))
+# Seconds before the first retry of a failed node; doubled on every retry
+DAG_RETRY_DELAY = float(os.environ.get("ETL_DAG_RETRY_DELAY", 1.0))
+# Earlier runs averaged for the dry-run timings
+DAG_HISTORY_RUNS = 5
+
+POOLS = ("thread", "process")
+
+
+class DagError(Exception):
+    pass
+
+
+class Skip(Exception):
+    # Raised by a node to end its branch on purpose: dependents are skipped,
+    # the run still counts as successful
+    pass
+
+
+class Node:
+    def __init__(self, name, fn, inputs=(), outputs=(), pool="thread", retries=0, resources=(), stage=None):
+        if pool not in POOLS:
+            raise ValueError(f"Invalid pool {pool!r} for node {name}, expected one of {POOLS}")
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.pool = pool
+        self.retries = retries
+        # Nodes sharing a resource never run at the same time
+        self.resources = frozenset(resources)
+        # run_metrics stage whose history times this node when it has none of its own
+        self.stage = stage or name
+
+
+def _call(fn, kwargs, delay=0):
+    # Module level so process pools can pickle it
+    if delay:
+        time.sleep(delay)
+    return fn(**kwargs)
+
+
+# ==== PIPELINE DAG ====
+# Stages declare the artifacts they read (inputs) and produce (outputs). A node
+# is started as soon as all its inputs exist, so independent nodes overlap.
+# A node with one output returns it; with several, a tuple in output order.
+class Dag:
+    def __init__(self, name, log=logging.info, log_error=logging.error):
+        self.name = name
+        self.nodes = {}
+        self.log = log
+        self.log_error = log_error
+
+    def add(self, name, fn, inputs=(), outputs=(), **options):
+        if name in self.nodes:
+            raise DagError(f"Duplicate node {name!r} in {self.name}")
+        producers = self.producers()
+        for output in outputs:
+            if output in producers:
+                raise DagError(f"{output!r} is produced by both {producers[output]!r} and {name!r}")
+        node = self.nodes[name] = Node(name, fn, inputs, outputs, **options)
+        return node
+
+    def node(self, name=None, **options):
+        # Decorator form of add(); the function keeps working on its own
+        def decorator(fn):
+            self.add(name or fn.__name__, fn, **options)
+            return fn
+        return decorator
+
+    def producers(self):
+        return {output: node.name for node in self.nodes.values() for output in node.outputs}
+
+    def plan(self, provided=()):
+        # Nodes grouped in levels: each level only needs artifacts from earlier
+        # levels or from `provided`. Raises DagError on missing inputs or cycles.
+        producers = self.producers()
+        for node in self.nodes.values():
+            missing = [name for name in node.inputs if name not in producers and name not in provided]
+            if missing:
+                raise DagError(f"Node {node.name!r} needs {missing}, which no node produces")
+        available, remaining, levels = set(provided), list(self.nodes.values()), []
+        while remaining:
+            level = [node for node in remaining if set(node.inputs) <= available]
+            if not level:
+                raise DagError(f"Cycle between {[node.name for node in remaining]}")
+            levels.append(level)
+            remaining = [node for node in remaining if node not in level]
+            available.update(output for node in level for output in node.outputs)
+        return levels
+
+    # ==== EXECUTION ====
+    def run(self, provided=None, max_workers=DAG_MAX_WORKERS, process_workers=DAG_PROCESS_WORKERS,
+            retry_delay=DAG_RETRY_DELAY):
+        artifacts = dict(provided or {})
+        order = [node for level in self.plan(artifacts) for node in level]
+        producers = self.producers()
+        report = {node.name: {"status": "pending", "attempts": 0, "wall_seconds": None} for node in order}
+        pending, running, held = list(order), {}, set()
+        threads = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"dag-{self.name}")
+        processes = None
+        started_at = time.perf_counter()
+
+        def submit(node, delay=0):
+            nonlocal processes
+            if node.pool == "process" and processes is None:
+                processes = ProcessPoolExecutor(max_workers=process_workers)
+            pool = processes if node.pool == "process" else threads
+            kwargs = {name: artifacts[name] for name in node.inputs}
+            report[node.name]["attempts"] += 1
+            report[node.name]["status"] = "running"
+            held.update(node.resources)
+            # The retry delay is not part of the node's time
+            running[pool.submit(_call, node.fn, kwargs, delay)] = (node, time.perf_counter() + delay)
+
+        try:
+            while pending or running:
+                for node in list(pending):
+                    upstream = [report[producers[name]]["status"] for name in node.inputs if name in producers]
+                    if any(status in ("failed", "upstream_failed") for status in upstream):
+                        report[node.name]["status"] = "upstream_failed"
+                        pending.remove(node)
+                    elif any(status == "skipped" for status in upstream):
+                        report[node.name]["status"] = "skipped"
+                        pending.remove(node)
+                    elif all(name in artifacts for name in node.inputs) and not node.resources & held:
+                        pending.remove(node)
+                        submit(node)
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    node, node_started = running.pop(future)
+                    held.difference_update(node.resources)
+                    entry = report[node.name]
+                    entry["wall_seconds"] = round(time.perf_counter() - node_started, 6)
+                    try:
+                        result = future.result()
+                    except Skip as e:
+                        entry["status"] = "skipped"
+                        self.log(f"DAG {self.name}: {node.name} skipped the rest of its branch: {e}")
+                        continue
+                    except Exception as e:
+                        if entry["attempts"] <= node.retries:
+                            delay = retry_delay * 2 ** (entry["attempts"] - 1)
+                            self.log(f"DAG {self.name}: {node.name} failed ({e!r}); "
+                                     f"retry {entry['attempts']}/{node.retries} in {delay:.1f}s")
+                            submit(node, delay)
+                        else:
+                            entry["status"], entry["error"] = "failed", repr(e)
+                            self.log_error(f"DAG {self.name}: {node.name} failed: {e!r}")
+                        continue
+                    if len(node.outputs) == 1:
+                        result = (result,)
+                    artifacts.update(zip(node.outputs, result if node.outputs else ()))
+                    entry["status"] = "ok"
+        finally:
+            threads.shutdown(wait=True)
+            if processes is not None:
+                processes.shutdown(wait=True)
+
+        failed = [name for name, entry in report.items() if entry["status"] in ("failed", "upstream_failed")]
+        self.log(f"DAG {self.name}: {len(order)} nodes in {time.perf_counter() - started_at:.2f}s"
+                 f"{f', failed: {failed}' if failed else ''}")
+        run = current_run()
+        if run is not None:
+            run.extra["dag"] = report
+        return DagResult(artifacts, report)
+
+    # ==== DRY RUN ====
+    def dry_run(self, timings=None, provided=()):
+        # Prints the plan with per-node times from earlier runs (see
+        # load_timings) and the estimated wall time; runs nothing
+        timings = timings or {}
+        levels = self.plan(provided)
+        estimates = {node.name: timings.get(node.name, timings.get(node.stage))
+                     for level in levels for node in level}
+        finish, path, resource_free = {}, {}, {}
+        producers = self.producers()
+        print(f"[PLAN] {self.name}: {len(self.nodes)} nodes in {len(levels)} levels")
+        for depth, level in enumerate(levels):
+            for node in level:
+                upstream = [producers[name] for name in node.inputs if name in producers]
+                # Waits for its inputs and for earlier nodes holding the same resources
+                waits_for = upstream + [resource_free[resource] for resource in node.resources
+                                        if resource in resource_free]
+                before = max(waits_for, key=lambda name: finish[name], default=None)
+                finish[node.name] = (finish[before] if before else 0.0) + (estimates[node.name] or 0.0)
+                path[node.name] = (path[before] if before else []) + [node.name]
+                resource_free.update((resource, node.name) for resource in node.resources)
+                estimate = f"{estimates[node.name]:.3f}s" if estimates[node.name] is not None else "no history"
+                if node.retries:
+                    estimate += f" (retries {node.retries})"
+                if node.resources:
+                    estimate += f" [exclusive: {', '.join(sorted(node.resources))}]"
+                print(f"[PLAN]   L{depth} {node.name:<22} {node.pool:<7} "
+                      f"in: {', '.join(node.inputs) or '-':<28} out: {', '.join(node.outputs) or '-':<24} "
+                      f"{estimate}")
+        last = max(finish, key=lambda name: (finish[name], len(path[name])), default=None)
+        serial = sum(value or 0.0 for value in estimates.values())
+        if last is not None:
+            print(f"[PLAN] Estimated wall time {finish[last]:.3f}s vs {serial:.3f}s run one after another; "
+                  f"critical path: {' -> '.join(path[last])}")
+        return {"levels": [[node.name for node in level] for level in levels], "estimates": estimates,
+                "wall_seconds": finish[last] if last else 0.0, "serial_seconds": serial}
+
+
+class DagResult:
+    def __init__(self, artifacts, report):
+        self.artifacts = artifacts
+        self.report = report
+
+    @property
+    def ok(self):
+        return all(entry["status"] in ("ok", "skipped") for entry in self.report.values())
+
+    def status(self, name):
+        return self.report[name]["status"]
+
+
+def load_timings(manifest_pattern, pipeline, runs=DAG_HISTORY_RUNS):
+    # Mean seconds per DAG node and per run_metrics stage over the last
+    # `runs` successful manifests of `pipeline`
+    manifests = []
+    for path in sorted(glob.glob(manifest_pattern), key=os.path.getmtime):
+        try:
+            with open(path, encoding="utf-8") as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            continue
+        if manifest.get("pipeline") == pipeline and manifest.get("status") == "ok":
+            manifests.append(manifest)
+    samples = {}
+    for manifest in manifests[-runs:]:
+        for name, total in manifest.get("summary", {}).items():
+            samples.setdefault(name, []).append(total["wall_seconds"])
+        # Node times win over stage times of the same name
+        for name, entry in manifest.get("dag", {}).items():
+            if entry.get("wall_seconds") is not None:
+                samples.setdefault(f"node:{name}", []).append(entry["wall_seconds"])
+    timings = {name: sum(values) / len(values) for name, values in samples.items() if not name.startswith("node:")}
+    timings.update({name[5:]: sum(values) / len(values) for name, values in samples.items() if name.startswith("node:")})
+    return timings
@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+# === Pool Configuration ===
+POOL_MINCONN = int(os.environ.get("ETL_DB_POOL_MIN", 1))
+POOL_MAXCONN = int(os.environ.get("ETL_DB_POOL_MAX", 10))
+POOL_TIMEOUT = float(os.environ.get("ETL_DB_POOL_TIMEOUT", 30))
+# Idle connections older than this are pinged with SELECT 1 before being handed out
+POOL_HEALTHCHECK_AFTER = float(os.environ.get("ETL_DB_POOL_HEALTHCHECK_AFTER", 5))
+
+
+class PoolTimeout(PoolError):
+    pass
+
+
+# === Thread-safe pool of reporting DB connections ===
+class ConnectionPool:
+    def __init__(self, db_config, minconn=POOL_MINCONN, maxconn=POOL_MAXCONN,
+                 timeout=POOL_TIMEOUT, healthcheck_after=POOL_HEALTHCHECK_AFTER):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Invalid pool size: minconn={minconn}, maxconn={maxconn}")
+        self.db_config = dict(db_config)
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self._idle = []  # (conn, returned_at), most recently used last
+        self._size = 0
+        self._warm = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self.stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+            "creations": 0,
+            "healthcheck_failures": 0,
+            "discarded": 0,
+        }
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.db_config)
+        with self._cond:
+            self.stats["creations"] += 1
+        return conn
+
+    def _warm_up(self):
+        # Open minconn connections on first use rather than at import time
+        with self._cond:
+            if self._warm:
+                return
+            self._warm = True
+            missing = max(self.minconn - self._size, 0)
+            self._size += missing
+        for _ in range(missing):
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.healthcheck_after:
+            return True
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            if not conn.closed:
+                conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        self._warm_up()
+        deadline = time.monotonic() + self.timeout
+        wait_started = None
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        conn, returned_at = None, None
+                        break
+                    if wait_started is None:
+                        wait_started = time.monotonic()
+                        self.stats["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["wait_seconds"] += time.monotonic() - wait_started
+                        raise PoolTimeout(
+                            f"No reporting DB connection available after {self.timeout}s "
+                            f"(maxconn={self.maxconn})"
+                        )
+                    self._cond.wait(remaining)
+                if wait_started is not None:
+                    self.stats["wait_seconds"] += time.monotonic() - wait_started
+                    wait_started = None
+
+            if conn is not None:
+                if self._is_healthy(conn, returned_at):
+                    break
+                with self._cond:
+                    self.stats["healthcheck_failures"] += 1
+                    self.stats["discarded"] += 1
+                self._discard(conn)
+
+            # Slot is reserved either way: open a fresh connection in its place
+            try:
+                conn = self._connect()
+                break
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        with self._cond:
+            self.stats["checkouts"] += 1
+        return conn
+
+    def putconn(self, conn, close=False):
+        if not close and not conn.closed:
+            try:
+                # Never hand an open transaction to the next caller
+                if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+        with self._cond:
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                self.stats["discarded"] += 1
+                discard = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                discard = False
+            self._cond.notify()
+        if discard:
+            self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except psycopg2.InterfaceError:
+            broken = True
+            raise
+        finally:
+            self.putconn(conn, close=broken)
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle = []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def log_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            size, idle = self._size, len(self._idle)
+        print(
+            f"[INFO] Reporting DB pool stats | checkouts: {stats['checkouts']} | "
+            f"creations: {stats['creations']} | waits: {stats['waits']} "
+            f"({stats['wait_seconds']:.3f}s) | healthcheck failures: {stats['healthcheck_failures']} | "
+            f"open: {size} (idle {idle}) | min/max: {self.minconn}/{self.maxconn}"
+        )
+        return stats
+
+
+# === Shared pools, one per DB_CONFIG ===
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_config, **pool_options):
+    key = tuple(sorted(db_config.items()))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool._closed:
+            pool = ConnectionPool(db_config, **pool_options)
+            _pools[key] = pool
+        return pool
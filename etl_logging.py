@@ -0,0 +1,133 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+# ==== LOGGING CONFIG ====
+# "text" keeps the usual lines; "json" writes one JSON object per record
+# (JSON lines) to the log files and console
+LOG_FORMAT = os.environ.get("ETL_LOG_FORMAT", "text")
+LOG_FORMATS = ("text", "json")
+# Seconds between progress lines for per-row events
+PROGRESS_INTERVAL = float(os.environ.get("ETL_PROGRESS_INTERVAL", 5))
+
+TEXT_FORMAT = '%(asctime)s [%(levelname)s] %(message)s'
+CONSOLE_FORMAT = '%(message)s'
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_FIELDS)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# ==== BACKGROUND HANDLERS ====
+# The root logger only gets a QueueHandler; file and console writes happen on
+# the QueueListener's thread, so a log call in a hot loop costs a queue put.
+_listener = None
+
+
+def setup_logging(log_files, log_format=LOG_FORMAT, console=True, console_stream=None):
+    global _listener
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Invalid log format {log_format!r}, expected one of {LOG_FORMATS}")
+    stop_logging()
+
+    handlers = []
+    for path in log_files:
+        handler = logging.FileHandler(path)
+        handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+        handlers.append(handler)
+    if console:
+        handler = logging.StreamHandler(console_stream)
+        handler.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(CONSOLE_FORMAT))
+        handlers.append(handler)
+
+    records = queue.SimpleQueue()
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(records))
+    _listener = QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    # Writes out every queued record, then closes the handlers
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(stop_logging)
+
+
+# ==== PROGRESS ====
+def print_progress(message, fields):
+    print(message)
+
+
+def log_progress(message, fields):
+    logging.info(message, extra={"progress": fields})
+
+
+class Progress:
+    # Counts per-row events and reports them as one line every `interval`
+    # seconds instead of one line per row. close() reports the total and
+    # starts the count over.
+    def __init__(self, label, emit=print_progress, interval=PROGRESS_INTERVAL):
+        self.label = label
+        self.emit = emit
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.total = 0
+        self._since_report = 0
+        self._started = self._reported = time.monotonic()
+
+    def add(self, count=1):
+        with self._lock:
+            self.total += count
+            self._since_report += count
+            now = time.monotonic()
+            if now - self._reported < self.interval:
+                return
+            elapsed, self._reported = now - self._reported, now
+            fields = {"label": self.label, "total": self.total, "delta": self._since_report,
+                      "rate": round(self._since_report / elapsed, 1)}
+            self._since_report = 0
+        self.emit(f"[PROGRESS] {self.label}: {fields['total']} "
+                  f"(+{fields['delta']} at {fields['rate']:.0f}/s)", fields)
+
+    def close(self):
+        with self._lock:
+            if not self.total:
+                self._reset()
+                return None
+            elapsed = time.monotonic() - self._started
+            fields = {"label": self.label, "total": self.total, "seconds": round(elapsed, 3)}
+            self._reset()
+        self.emit(f"[SUCCESS] {self.label}: {fields['total']} in {elapsed:.1f}s", fields)
+        return fields
@@ -0,0 +1,95 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from urllib.parse import urlencode
+
+# === HTTP Cache Configuration ===
+HTTP_CACHE_DIR = os.environ.get("ETL_HTTP_CACHE_DIR", os.path.join(".cache", "http"))
+# Seconds a cached response is reused without asking the server; after that
+# it is revalidated with If-None-Match / If-Modified-Since
+HTTP_CACHE_TTL = float(os.environ.get("ETL_HTTP_CACHE_TTL", 300))
+
+
+def request_key(url, params=None):
+    request = f"{url}?{urlencode(sorted((params or {}).items()))}"
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+
+def payload_hash(data):
+    # Stable across key order, so the same records always hash the same
+    content = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+# === On-disk cache of JSON API responses ===
+# One JSON file per (URL, query params) holding the parsed body and the
+# ETag / Last-Modified validators the server sent with it.
+class ResponseCache:
+    def __init__(self, directory=HTTP_CACHE_DIR, ttl=HTTP_CACHE_TTL, refresh=False):
+        # refresh=True ignores what is cached and downloads everything again
+        self.directory = directory
+        self.ttl = ttl
+        self.refresh = refresh
+        self.stats = {"fresh": 0, "not_modified": 0, "fetched": 0}
+
+    def _path(self, url, params):
+        return os.path.join(self.directory, request_key(url, params) + ".json")
+
+    def _write(self, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(entry["url"], entry["params"])
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(entry, file, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    def lookup(self, url, params=None):
+        if self.refresh:
+            return None
+        try:
+            with open(self._path(url, params), encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry):
+        return time.time() - entry["validated_at"] <= self.ttl
+
+    def validators(self, entry):
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def served_fresh(self, entry):
+        self.stats["fresh"] += 1
+        return entry["body"]
+
+    def not_modified(self, entry):
+        # 304: the cached body is still current
+        entry["validated_at"] = time.time()
+        self._write(entry)
+        self.stats["not_modified"] += 1
+        return entry["body"]
+
+    def store(self, url, params, headers, body):
+        self._write({
+            "url": url,
+            "params": dict(params or {}),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "validated_at": time.time(),
+            "body": body,
+        })
+        self.stats["fetched"] += 1
+        return body
+
+    def log_stats(self):
+        stats = dict(self.stats, refresh=self.refresh)
+        logging.info(f"HTTP cache: {stats['fresh']} served fresh, {stats['not_modified']} not modified (304), "
+                     f"{stats['fetched']} downloaded{' (forced refresh)' if self.refresh else ''}.")
+        return stats
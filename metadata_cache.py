@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+
+# === Cache Configuration ===
+# Seconds before the tables are re-read; 0 keeps the startup snapshot for the whole run
+METADATA_TTL = float(os.environ.get("ETL_METADATA_TTL", 0))
+# Matrix year -> pricingmatrix_table column; add a year by adding its column,
+# e.g. ETL_MATRIX_YEAR_COLUMNS="2024:price_year3,2023:price_year1,2022:price_year2"
+MATRIX_YEAR_COLUMNS = os.environ.get("ETL_MATRIX_YEAR_COLUMNS", "2023:price_year1,2022:price_year2")
+
+
+def parse_year_columns(spec):
+    year_columns = {}
+    for item in spec.split(","):
+        year, column = (part.strip() for part in item.split(":"))
+        if not column.isidentifier():
+            raise ValueError(f"Invalid matrix column for {year}: {column!r}")
+        year_columns[int(year)] = column
+    return year_columns
+
+
+# === In-memory snapshot of the pricing / mapping / driver / SLA tables ===
+class MetadataCache:
+    def __init__(self, pool, ttl=METADATA_TTL, year_columns=MATRIX_YEAR_COLUMNS):
+        self.pool = pool
+        self.ttl = ttl
+        self.year_columns = parse_year_columns(year_columns) if isinstance(year_columns, str) else dict(year_columns)
+        self.loaded_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._models = []
+        self._models_by_group = {}
+        self._matrix_by_group = {}
+        self._mappings_by_group = {}
+        self._drivers_by_ref = {}
+        self._sla_by_group = {}
+        self._warned_fetch_size = False
+        self.stats = {"loads": 0, "lookups": 0}
+
+    def _has_column(self, cur, table, column):
+        # Looked up through the search_path, like the unqualified queries below
+        cur.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = ANY(current_schemas(false)) AND table_name = %s AND column_name = %s
+        """, (table, column))
+        return cur.fetchone() is not None
+
+    def load(self):
+        started = time.perf_counter()
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                SELECT application_group_name, pricing_model, purpose
+                FROM pricingmodel_table
+            """)
+            models = cur.fetchall()
+
+            cur.execute(f"""
+                SELECT application_group_name, {', '.join(self.year_columns.values())}
+                FROM pricingmatrix_table
+            """)
+            matrix = cur.fetchall()
+
+            cur.execute("""
+                SELECT application_group_name, APP_grp, app_name, DB_name, Environment,
+                       DB_driver_refernce_number, SQLquery
+                FROM database_table
+            """)
+            mappings = cur.fetchall()
+
+            # fetch_batch_size is optional: without the column every source
+            # uses ETL_SOURCE_FETCH_SIZE
+            fetch_size_column = self._has_column(cur, "database_driver_table", "fetch_batch_size")
+            if not fetch_size_column and not self._warned_fetch_size:
+                self._warned_fetch_size = True
+                print("[WARNING] database_driver_table has no fetch_batch_size column; "
+                      "every source uses ETL_SOURCE_FETCH_SIZE")
+            cur.execute(f"""
+                SELECT DBdriverreferncenumber, db_engine, DB_driverpath, db_driverclass,
+                       db_username, db_pass, {'fetch_batch_size' if fetch_size_column else 'NULL'}
+                FROM database_driver_table
+            """)
+            drivers = cur.fetchall()
+
+            cur.execute("""
+                SELECT application_group_name, slarate, app_grp, app_name, source
+                FROM sla_table
+            """)
+            sla_sources = cur.fetchall()
+            cur.close()
+
+        models_by_group = {}
+        for row in models:
+            models_by_group.setdefault(row[0], row)
+        matrix_by_group = {}
+        for group, *prices in matrix:
+            matrix_by_group.setdefault(group, tuple(prices))
+        mappings_by_group = {}
+        for group, *mapping in mappings:
+            mappings_by_group.setdefault(group, []).append(tuple(mapping))
+        drivers_by_ref = {}
+        for ref, *driver in drivers:
+            drivers_by_ref.setdefault(ref, tuple(driver))
+        sla_by_group = {}
+        for group, *source in sla_sources:
+            sla_by_group.setdefault(group, []).append(tuple(source))
+
+        with self._lock:
+            self._models = models
+            self._models_by_group = models_by_group
+            self._matrix_by_group = matrix_by_group
+            self._mappings_by_group = mappings_by_group
+            self._drivers_by_ref = drivers_by_ref
+            self._sla_by_group = sla_by_group
+            self.loaded_at = time.monotonic()
+            self.stats["loads"] += 1
+        print(f"[INFO] Metadata cache loaded in {time.perf_counter() - started:.3f}s | "
+              f"models: {len(models)} | matrix: {len(matrix)} | "
+              f"mappings: {len(mappings)} | drivers: {len(drivers)} | sla: {len(sla_sources)}")
+
+    def _stale(self):
+        with self._lock:
+            return self.loaded_at is None or (
+                self.ttl and time.monotonic() - self.loaded_at > self.ttl
+            )
+
+    def _fresh(self):
+        if self._stale():
+            # One thread reloads; the others wait for its snapshot instead of
+            # each running the same bulk read
+            with self._load_lock:
+                if self._stale():
+                    self.load()
+        with self._lock:
+            self.stats["lookups"] += 1
+            return self
+
+    # (application_group_name, pricing_model, purpose) rows, in table order
+    def pricing_models(self):
+        return list(self._fresh()._models)
+
+    def pricing_model(self, application_group):
+        return self._fresh()._models_by_group.get(application_group)
+
+    # Prices in matrix_years() order, or None
+    def matrix_prices(self, application_group):
+        return self._fresh()._matrix_by_group.get(application_group)
+
+    def matrix_years(self):
+        return list(self.year_columns)
+
+    # (loaded_at, years, {group: prices}) of the current load, for bulk pricing
+    def matrix_snapshot(self):
+        cache = self._fresh()
+        with self._lock:
+            return cache.loaded_at, list(self.year_columns), cache._matrix_by_group
+
+    # [(APP_grp, app_name, DB_name, Environment, ref_num, SQLquery), ...]
+    def mappings(self, application_group):
+        return list(self._fresh()._mappings_by_group.get(application_group, []))
+
+    # [(slarate, app_grp, app_name, source), ...] from sla_table
+    def sla_sources(self, application_group):
+        return list(self._fresh()._sla_by_group.get(application_group, []))
+
+    # (db_engine, DB_driverpath, db_driverclass, db_username, db_pass, fetch_batch_size) or None
+    def driver(self, ref_number):
+        return self._fresh()._drivers_by_ref.get(ref_number)
+
+
+# === Shared caches, one per pool ===
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_metadata_cache(pool, **cache_options):
+    with _caches_lock:
+        cache = _caches.get(id(pool))
+        if cache is None or cache.pool is not pool:
+            cache = MetadataCache(pool, **cache_options)
+            _caches[id(pool)] = cache
+        return cache
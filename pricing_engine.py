@@ -0,0 +1,118 @@
+import threading
+
+import numpy as np
+
+
+# ==== VECTORIZED MATRIX PRICING ====
+# The whole pricingmatrix_table as one float64 array (groups x years) plus a
+# year -> column index, so a year is priced for every group in one pass.
+DAYS_PER_YEAR = 365
+MONTHS_PER_YEAR = 12
+
+
+class PriceMatrix:
+    def __init__(self, groups, years, prices):
+        self.groups = np.array(groups, dtype=object)
+        self.years = [int(year) for year in years]
+        self.year_index = {year: column for column, year in enumerate(self.years)}
+        self.group_index = {group: row for row, group in enumerate(groups)}
+        # NULL prices become NaN and are skipped when priced
+        self.prices = np.array(
+            [[np.nan if price is None else float(price) for price in row] for row in prices],
+            dtype=np.float64,
+        ).reshape(len(self.groups), len(self.years))
+
+    @classmethod
+    def from_prices(cls, years, prices_by_group):
+        return cls(list(prices_by_group), years, list(prices_by_group.values()))
+
+    def yearly_prices(self, year, application_groups=None):
+        # (groups, yearly prices) for year, limited to application_groups when
+        # given; groups without a matrix row or price for the year are left out
+        column = self.year_index.get(int(year))
+        if column is None:
+            raise KeyError(f"No matrix price column for year {year} (have {self.years})")
+        if application_groups is None:
+            rows = np.arange(len(self.groups))
+        else:
+            rows = np.fromiter(
+                (self.group_index[group] for group in application_groups if group in self.group_index),
+                dtype=np.intp,
+            )
+        prices = self.prices[rows, column]
+        priced = ~np.isnan(prices)
+        return self.groups[rows[priced]], prices[priced]
+
+
+def price_groups(matrix, year, application_groups=None):
+    # (groups, daily prices, monthly prices) as parallel arrays
+    groups, yearly = matrix.yearly_prices(year, application_groups)
+    return groups, yearly / DAYS_PER_YEAR, yearly / MONTHS_PER_YEAR
+
+
+# === One matrix per metadata load ===
+_matrices = {}
+_matrices_lock = threading.Lock()
+
+
+def get_price_matrix(metadata):
+    loaded_at, years, prices_by_group = metadata.matrix_snapshot()
+    with _matrices_lock:
+        cached = _matrices.get(id(metadata))
+        if cached is None or cached[0] != loaded_at:
+            cached = (loaded_at, PriceMatrix.from_prices(years, prices_by_group))
+            _matrices[id(metadata)] = cached
+        return cached[1]
+
+
+# ==== IN-DATABASE MATRIX PRICING ====
+# The same pricing as price_groups, compiled into INSERT ... SELECT so no
+# row passes through Python. Non-PXQ groups are priced from the first-read
+# matrix row per group; groups without a price for the year are skipped.
+_MATRIX_SOURCE = """
+    FROM (
+        SELECT DISTINCT application_group_name FROM pricingmodel_table
+        WHERE pricing_model IS DISTINCT FROM 'PXQ'
+    ) m
+    JOIN (
+        SELECT DISTINCT ON (application_group_name) application_group_name, {column} AS yearly_price
+        FROM pricingmatrix_table
+    ) x ON x.application_group_name = m.application_group_name
+    WHERE x.yearly_price IS NOT NULL
+"""
+_UPSERT_PRICE = "DO UPDATE SET price = EXCLUDED.price"
+
+
+def insert_matrix_prices(cur, column, report_date, monthly=False, application_groups=None):
+    # Returns (daily rows, monthly rows, non-PXQ groups left unpriced);
+    # application_groups limits the run to those groups (e.g. one shard).
+    # Rows are upserted on the report keys (see report_writer.prepare_report_tables),
+    # so reruns replace rather than add.
+    source = _MATRIX_SOURCE.format(column=column)
+    params = ()
+    if application_groups is not None:
+        source += "      AND m.application_group_name = ANY(%s)\n"
+        params = (list(application_groups),)
+    cur.execute(f"""
+        INSERT INTO daily_table (application_group_name, date, price)
+        SELECT m.application_group_name, %s, x.yearly_price / {DAYS_PER_YEAR}.0
+        {source}
+        ON CONFLICT (application_group_name, (COALESCE(platform, '')), date) {_UPSERT_PRICE}
+    """, (report_date, *params))
+    daily = cur.rowcount
+    monthly_rows = 0
+    if monthly:
+        cur.execute(f"""
+            INSERT INTO monthly_table (application_group_name, month, price)
+            SELECT m.application_group_name, %s, x.yearly_price / {MONTHS_PER_YEAR}.0
+            {source}
+            ON CONFLICT (application_group_name, (COALESCE(platform, '')), month) {_UPSERT_PRICE}
+        """, (report_date.strftime("%Y-%m"), *params))
+        monthly_rows = cur.rowcount
+    if application_groups is not None:
+        return daily, monthly_rows, len(set(application_groups)) - daily
+    cur.execute("""
+        SELECT count(DISTINCT application_group_name) FROM pricingmodel_table
+        WHERE pricing_model IS DISTINCT FROM 'PXQ'
+    """)
+    return daily, monthly_rows, cur.fetchone()[0] - daily
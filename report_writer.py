@@ -0,0 +1,274 @@
+import os
+import threading
+import time
+from datetime import date
+from itertools import islice, repeat
+
+from psycopg2.extras import execute_values
+
+from checkpoints import CHECKPOINT_DDL
+from run_metrics import stage
+
+# === Writer Configuration ===
+# Rows buffered before an automatic flush; 0 buffers the whole run until close()
+REPORT_BATCH_SIZE = int(os.environ.get("ETL_REPORT_BATCH_SIZE", 5000))
+
+DAILY_COLUMNS = ("application_group_name", "date", "price")
+DAILY_PLATFORM_COLUMNS = ("application_group_name", "platform", "date", "price")
+MONTHLY_COLUMNS = ("application_group_name", "month", "price")
+MONTHLY_PLATFORM_COLUMNS = ("application_group_name", "platform", "month", "price")
+
+# Report rows are upserted on (group, platform, day/month), so rerunning a group
+# replaces its rows instead of adding to them. Rows without a platform share
+# the '' platform key.
+REPORT_PERIOD_COLUMNS = {"daily_table": "date", "monthly_table": "month"}
+REPORT_KEY_DDL = [
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_report_key "
+    f"ON {table} (application_group_name, (COALESCE(platform, '')), {period})"
+    for table, period in REPORT_PERIOD_COLUMNS.items()
+]
+
+CHECKPOINT_COLUMNS = ("run_id", "phase", "application_group_name")
+
+# Tables filled by the earlier plain INSERTs can hold several rows per report
+# key, and the unique index cannot be built over them. --dedupe-report-keys
+# merges each such key into one row holding the summed price, the same total
+# the writer stores for a key within one run.
+_DUPLICATE_KEYS = """
+    SELECT count(*) FROM (
+        SELECT 1 FROM {table}
+        WHERE application_group_name IS NOT NULL AND {period} IS NOT NULL
+        GROUP BY application_group_name, COALESCE(platform, ''), {period}
+        HAVING count(*) > 1
+    ) duplicates
+"""
+_DEDUPE_KEYS = """
+    CREATE TEMP TABLE report_key_dedupe ON COMMIT DROP AS
+    SELECT application_group_name, MAX(platform) AS platform, {period}, SUM(price) AS price
+    FROM {table}
+    WHERE application_group_name IS NOT NULL AND {period} IS NOT NULL
+    GROUP BY application_group_name, COALESCE(platform, ''), {period}
+    HAVING count(*) > 1;
+    DELETE FROM {table} t USING report_key_dedupe d
+    WHERE t.application_group_name = d.application_group_name
+      AND COALESCE(t.platform, '') = COALESCE(d.platform, '')
+      AND t.{period} = d.{period};
+    INSERT INTO {table} (application_group_name, platform, {period}, price)
+    SELECT application_group_name, platform, {period}, price FROM report_key_dedupe;
+    DROP TABLE report_key_dedupe;
+"""
+
+
+class ReportKeyError(RuntimeError):
+    pass
+
+
+def prepare_report_tables(pool, dedupe=False):
+    # Creates the report keys and the checkpoint table. Run once per run,
+    # before any worker or shard writes: concurrent CREATE ... IF NOT EXISTS
+    # in several processes can still fail with a unique violation.
+    # Raises ReportKeyError when duplicate keys block an index.
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute(CHECKPOINT_DDL)
+        for (table, period), ddl in zip(REPORT_PERIOD_COLUMNS.items(), REPORT_KEY_DDL):
+            cur.execute("SELECT to_regclass(%s)", (f"{table}_report_key",))
+            if cur.fetchone()[0] is not None:
+                continue
+            cur.execute(_DUPLICATE_KEYS.format(table=table, period=period))
+            duplicates = cur.fetchone()[0]
+            if duplicates and not dedupe:
+                conn.rollback()
+                raise ReportKeyError(
+                    f"{table} holds {duplicates} duplicate (application_group_name, platform, {period}) "
+                    f"keys written before report rows were upserted; rerun with --dedupe-report-keys "
+                    f"to merge each into one row with the summed price, or remove them by hand")
+            if duplicates:
+                cur.execute(_DEDUPE_KEYS.format(table=table, period=period))
+                print(f"[INFO] Merged {duplicates} duplicate report keys in {table}")
+            cur.execute(ddl)
+            print(f"[INFO] Created report key index {table}_report_key")
+        conn.commit()
+        cur.close()
+
+
+def _floats(prices):
+    # NumPy arrays -> plain Python floats, which psycopg2 can adapt
+    return prices.tolist() if hasattr(prices, "tolist") else list(prices)
+
+
+# === Buffered bulk writer for daily_table / monthly_table ===
+# Upserts need the report keys: call prepare_report_tables() first.
+class ReportWriter:
+    def __init__(self, pool, batch_size=REPORT_BATCH_SIZE):
+        self.pool = pool
+        self.batch_size = batch_size
+        self._buffers = {}  # (table, columns) -> {key columns: price}
+        self._totals = {}   # (table, columns) -> {key columns: price so far this run}
+        self._checkpoints = []
+        self._buffered = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.stats = {"rows": 0, "batches": 0, "flush_seconds": 0.0, "checkpoints": 0}
+
+    def _add_locked(self, table, columns, row):
+        # Rows for the same key are summed over the run; each flush upserts
+        # the running total, so a key split across batches ends up complete.
+        # Returns True once the buffer is full.
+        *key, price = row
+        key = tuple(key)
+        totals = self._totals.setdefault((table, columns), {})
+        total = totals.get(key, 0) + price
+        totals[key] = total
+        pending = self._buffers.setdefault((table, columns), {})
+        if key not in pending:
+            self._buffered += 1
+        pending[key] = total
+        return self.batch_size and self._buffered >= self.batch_size
+
+    def add(self, table, columns, row):
+        with self._lock:
+            full = self._add_locked(table, columns, row)
+        if full:
+            self.flush()
+
+    def add_many(self, table, columns, rows):
+        # Bulk add() for vectorized callers; still flushes every batch_size rows
+        rows = iter(rows)
+        added = 0
+        while True:
+            batch = list(islice(rows, self.batch_size)) if self.batch_size else list(rows)
+            if not batch:
+                return added
+            with self._lock:
+                full = False
+                for row in batch:
+                    full = self._add_locked(table, columns, row) or full
+            added += len(batch)
+            if full:
+                self.flush()
+
+    def add_checkpoint(self, run_id, phase, application_group):
+        # Committed in the same transaction as every row queued before it, so
+        # a group is only recorded as done once its report rows are stored
+        with self._lock:
+            self._checkpoints.append((run_id, phase, application_group))
+
+    def add_daily(self, application_group, price, platform=None, report_date=None):
+        report_date = report_date or date.today()
+        if platform is None:
+            self.add("daily_table", DAILY_COLUMNS, (application_group, report_date, price))
+        else:
+            self.add("daily_table", DAILY_PLATFORM_COLUMNS,
+                     (application_group, platform, report_date, price))
+
+    def add_monthly(self, application_group, price, platform=None, report_date=None):
+        month = (report_date or date.today()).strftime("%Y-%m")
+        if platform is None:
+            self.add("monthly_table", MONTHLY_COLUMNS, (application_group, month, price))
+        else:
+            self.add("monthly_table", MONTHLY_PLATFORM_COLUMNS,
+                     (application_group, platform, month, price))
+
+    # groups and prices are parallel sequences (lists or NumPy arrays)
+    def add_daily_many(self, application_groups, prices, report_date=None):
+        report_date = report_date or date.today()
+        return self.add_many("daily_table", DAILY_COLUMNS,
+                             zip(list(application_groups), repeat(report_date), _floats(prices)))
+
+    def add_monthly_many(self, application_groups, prices, report_date=None):
+        month = (report_date or date.today()).strftime("%Y-%m")
+        return self.add_many("monthly_table", MONTHLY_COLUMNS,
+                             zip(list(application_groups), repeat(month), _floats(prices)))
+
+    def flush(self):
+        # Serialise flushes so batches commit in the order they were filled
+        with self._flush_lock:
+            with self._lock:
+                buffers, self._buffers = self._buffers, {}
+                checkpoints, self._checkpoints = self._checkpoints, []
+                count, self._buffered = self._buffered, 0
+            if not count and not checkpoints:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self._write(buffers, checkpoints, count)
+            except Exception:
+                # Nothing was committed: put the rows and checkpoints back so a
+                # later flush writes them, and no checkpoint commits without its rows
+                self._restore(buffers, checkpoints)
+                raise
+            elapsed = time.perf_counter() - started
+
+            self.stats["rows"] += count
+            self.stats["batches"] += 1
+            self.stats["flush_seconds"] += elapsed
+            self.stats["checkpoints"] += len(checkpoints)
+            summary = ", ".join(f"{len(rows)} -> {table}" for (table, _), rows in buffers.items())
+            print(f"[SUCCESS] Upserted {count} report rows ({summary or 'none'}) and "
+                  f"{len(checkpoints)} checkpoints in {elapsed:.3f}s "
+                  f"| {count / elapsed if elapsed else float(count):.0f} rows/sec")
+            return count
+
+    def _restore(self, buffers, checkpoints):
+        with self._lock:
+            for table_columns, rows in buffers.items():
+                pending = self._buffers.setdefault(table_columns, {})
+                for key, price in rows.items():
+                    # A key queued again since the swap already holds the newer total
+                    if key not in pending:
+                        pending[key] = price
+                        self._buffered += 1
+            self._checkpoints[:0] = checkpoints
+
+    def _write(self, buffers, checkpoints, count):
+        with stage("report_flush") as record, self.pool.connection() as conn:
+            record.rows_in = count
+            cur = conn.cursor()
+            for (table, columns), rows in buffers.items():
+                execute_values(
+                    cur,
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s "
+                    f"ON CONFLICT (application_group_name, (COALESCE(platform, '')), "
+                    f"{REPORT_PERIOD_COLUMNS[table]}) DO UPDATE SET price = EXCLUDED.price",
+                    [key + (price,) for key, price in rows.items()],
+                    page_size=len(rows),
+                )
+            if checkpoints:
+                execute_values(
+                    cur,
+                    f"INSERT INTO etl_run_checkpoints ({', '.join(CHECKPOINT_COLUMNS)}) VALUES %s "
+                    f"ON CONFLICT DO NOTHING",
+                    checkpoints,
+                    page_size=len(checkpoints),
+                )
+            conn.commit()
+            cur.close()
+            record.rows_out = count
+
+    def close(self):
+        # Ends the run: the next row for a key starts a new running total
+        self.flush()
+        with self._lock:
+            self._totals = {}
+        stats = dict(self.stats)
+        seconds = stats["flush_seconds"]
+        stats["rows_per_sec"] = stats["rows"] / seconds if seconds else 0.0
+        print(f"[INFO] Report writer stats | rows: {stats['rows']} | batches: {stats['batches']} "
+              f"| write time: {seconds:.3f}s | {stats['rows_per_sec']:.0f} rows/sec")
+        return stats
+
+
+# === Shared writers, one per pool ===
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_report_writer(pool, **writer_options):
+    with _writers_lock:
+        writer = _writers.get(id(pool))
+        if writer is None or writer.pool is not pool:
+            writer = ReportWriter(pool, **writer_options)
+            _writers[id(pool)] = writer
+        return writer
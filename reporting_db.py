@@ -0,0 +1,17 @@
+from db_pool import get_pool
+from metadata_cache import get_metadata_cache
+from report_writer import get_report_writer
+
+# === PostgreSQL Reporting DB Configuration ===
+# Shared by combainedcode and sla_reporting, so both report through one pool,
+# one writer and one metadata snapshot
+DB_CONFIG = {
+    "host": "localhost",
+    "dbname": "reporting",
+    "user": "postgres",
+    "password": "admin"
+}
+REPORTING_POOL = get_pool(DB_CONFIG)
+REPORT_WRITER = get_report_writer(REPORTING_POOL)
+# Pricing, matrix, mapping, driver and SLA tables, read once and served from memory
+METADATA = get_metadata_cache(REPORTING_POOL)
@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import os
+import pickle
+import re
+import threading
+import time
+from datetime import date
+
+from run_metrics import stage
+
+# === Result Cache Configuration ===
+# "off" always queries the sources, "use" serves same-day reruns from disk,
+# "refresh" queries the sources and overwrites what is cached
+RESULT_CACHE_MODE = os.environ.get("ETL_RESULT_CACHE", "off")
+RESULT_CACHE_DIR = os.environ.get("ETL_RESULT_CACHE_DIR", os.path.join(".cache", "query_results"))
+# Seconds an entry stays valid; the business date in the key already splits days
+RESULT_CACHE_TTL = float(os.environ.get("ETL_RESULT_CACHE_TTL", 12 * 3600))
+# Least recently used entries are removed once the directory grows past this
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("ETL_RESULT_CACHE_MAX_BYTES", 1024 ** 3))
+
+RESULT_CACHE_MODES = ("off", "use", "refresh")
+_SUFFIX = ".pkl.gz"
+
+
+# A quoted literal or identifier ('' and "" escape the quote), or a whitespace run
+_QUERY_TOKENS = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")|\s+")
+
+
+def normalize_query(query):
+    # Whitespace between tokens and a trailing ';' never change the result;
+    # case and anything inside quotes can, so they are kept
+    collapsed = _QUERY_TOKENS.sub(lambda m: m.group(1) if m.group(1) is not None else " ", query)
+    return collapsed.strip().rstrip(";").strip()
+
+
+def cache_key(engine, driver_path, username, query, business_date):
+    query_hash = hashlib.sha256(normalize_query(query).encode("utf-8")).hexdigest()
+    source = f"{engine.lower()}|{driver_path}|{username}|{business_date.isoformat()}|{query_hash}"
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+# === On-disk cache of source query results ===
+# One gzip file per (source, query, business date) holding the pickled
+# fetchmany() chunks in order, so hits stream back chunk by chunk too.
+class ResultCache:
+    def __init__(self, mode=RESULT_CACHE_MODE, directory=RESULT_CACHE_DIR, ttl=RESULT_CACHE_TTL,
+                 max_bytes=RESULT_CACHE_MAX_BYTES, business_date=None):
+        if mode not in RESULT_CACHE_MODES:
+            raise ValueError(f"Invalid result cache mode {mode!r}, expected one of {RESULT_CACHE_MODES}")
+        self.mode = mode
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.business_date = business_date or date.today()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "writes": 0, "evictions": 0, "bytes_written": 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _read(self, path, engine, driver_path):
+        total = 0
+        with stage("execute_query", engine=engine, driver_path=driver_path, cache="hit") as record:
+            with gzip.open(path, "rb") as file:
+                while True:
+                    try:
+                        rows = pickle.load(file)
+                    except EOFError:
+                        break
+                    total += len(rows)
+                    record.rows_out = total
+                    yield rows
+        print(f"[SUCCESS] Retrieved {total} records from the result cache.")
+
+    def _write_through(self, path, chunks):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        complete = False
+        try:
+            with gzip.open(tmp_path, "wb", compresslevel=3) as file:
+                for rows in chunks:
+                    pickle.dump(rows, file, protocol=pickle.HIGHEST_PROTOCOL)
+                    yield rows
+            complete = True
+        finally:
+            # Only a fully read result is cached; failures and abandoned reads are dropped
+            if complete:
+                os.replace(tmp_path, path)
+                self._count("writes")
+                self._count("bytes_written", os.path.getsize(path))
+                self.evict()
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def rows(self, engine, driver_path, username, query, fetch):
+        # fetch() returns the live chunk iterator; it is only called on a miss
+        if self.mode == "off":
+            return fetch()
+        path = self._path(cache_key(engine, driver_path, username, query, self.business_date))
+        if self.mode == "use":
+            try:
+                age = time.time() - os.path.getmtime(path)
+            except OSError:
+                age = None
+            if age is not None and age <= self.ttl:
+                self._count("hits")
+                os.utime(path)  # mark as recently used for LRU eviction
+                return self._read(path, engine, driver_path)
+            self._count("expired" if age is not None else "misses")
+        return self._write_through(path, fetch())
+
+    def _entries(self):
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if name.endswith(_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, path))
+        return entries
+
+    def evict(self):
+        # Expired entries first, then least recently used until under max_bytes
+        entries = sorted(self._entries())
+        now = time.time()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= self.max_bytes and now - mtime <= self.ttl:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self._count("evictions", removed)
+        return removed
+
+    def invalidate(self):
+        # Drops every cached result; returns the number of entries removed
+        removed = 0
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        print(f"[INFO] Result cache invalidated: {removed} entries removed from {self.directory}")
+        return removed
+
+    def log_stats(self):
+        with self._lock:
+            stats = dict(self.stats, mode=self.mode)
+        if self.mode != "off":
+            print(f"[INFO] Result cache ({self.mode}) | hits: {stats['hits']} | misses: {stats['misses']} "
+                  f"| expired: {stats['expired']} | writes: {stats['writes']} "
+                  f"| evictions: {stats['evictions']}")
+        return stats
+
+
+# === Shared cache for the pricing and SLA runs ===
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def configure_result_cache(**cache_options):
+    global _cache
+    with _cache_lock:
+        _cache = ResultCache(**cache_options)
+        return _cache
@@ -0,0 +1,211 @@
+import functools
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# ==== METRICS CONFIG ====
+# Directory watched by node_exporter's textfile collector; unset disables the .prom output
+PROMETHEUS_TEXTFILE_DIR = os.environ.get("ETL_PROMETHEUS_TEXTFILE_DIR")
+
+
+class StageRecord:
+    def __init__(self, name, labels=None):
+        self.name = name
+        self.labels = labels or {}
+        self.rows_in = None
+        self.rows_out = None
+        self.status = "ok"
+        self.error = None
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+
+    def to_dict(self):
+        rows = self.rows_out if self.rows_out is not None else self.rows_in
+        return {
+            "stage": self.name,
+            "labels": self.labels,
+            "status": self.status,
+            "error": self.error,
+            "started_at": self.started_at,
+            "wall_seconds": round(self.wall_seconds, 6),
+            # CPU time of the thread that ran the stage
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_sec": round(rows / self.wall_seconds, 2) if rows and self.wall_seconds else None,
+        }
+
+
+# ==== RUN METRICS ====
+class RunMetrics:
+    def __init__(self, pipeline, run_id, manifest_path, prometheus_dir=PROMETHEUS_TEXTFILE_DIR):
+        self.pipeline = pipeline
+        self.run_id = run_id
+        self.manifest_path = manifest_path
+        self.prometheus_dir = prometheus_dir
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self._cpu_started = time.process_time()
+        self.stages = []
+        self.extra = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, **labels):
+        record = StageRecord(name, labels)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield record
+        except BaseException as e:
+            record.status = "failed"
+            record.error = repr(e)
+            raise
+        finally:
+            record.wall_seconds = time.perf_counter() - wall
+            record.cpu_seconds = time.thread_time() - cpu
+            with self._lock:
+                self.stages.append(record)
+
+    def summary(self):
+        # Per stage name totals, e.g. every execute_query call folded into one line
+        totals = {}
+        with self._lock:
+            records = list(self.stages)
+        for record in records:
+            total = totals.setdefault(record.name, {
+                "calls": 0, "failures": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                "rows_in": 0, "rows_out": 0,
+            })
+            total["calls"] += 1
+            total["failures"] += record.status != "ok"
+            total["wall_seconds"] += record.wall_seconds
+            total["cpu_seconds"] += record.cpu_seconds
+            total["rows_in"] += record.rows_in or 0
+            total["rows_out"] += record.rows_out or 0
+        for total in totals.values():
+            rows = total["rows_out"] or total["rows_in"]
+            total["rows_per_sec"] = round(rows / total["wall_seconds"], 2) if rows and total["wall_seconds"] else None
+        return totals
+
+    def manifest(self):
+        with self._lock:
+            stages = [record.to_dict() for record in self.stages]
+        failed = any(stage["status"] != "ok" for stage in stages)
+        return {
+            "pipeline": self.pipeline,
+            "run_id": self.run_id,
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "started_at": self.started_at.isoformat(timespec="milliseconds"),
+            "finished_at": datetime.now().isoformat(timespec="milliseconds"),
+            "wall_seconds": round(time.perf_counter() - self._started, 6),
+            "cpu_seconds": round(time.process_time() - self._cpu_started, 6),
+            "status": "failed" if failed else "ok",
+            "stages": stages,
+            "summary": self.summary(),
+            **self.extra,
+        }
+
+    def write(self):
+        manifest = self.manifest()
+        os.makedirs(os.path.dirname(self.manifest_path) or ".", exist_ok=True)
+        with open(self.manifest_path, "w", encoding="utf-8") as file:
+            json.dump(manifest, file, indent=2, default=str)
+        if self.prometheus_dir:
+            self.write_prometheus(manifest)
+        return manifest
+
+    def write_prometheus(self, manifest):
+        pipeline = self.pipeline
+        lines = []
+        for metric, help_text, key in (
+            ("etl_stage_wall_seconds", "Wall time spent in the stage during the last run", "wall_seconds"),
+            ("etl_stage_cpu_seconds", "CPU time spent in the stage during the last run", "cpu_seconds"),
+            ("etl_stage_rows_in", "Rows handed to the stage during the last run", "rows_in"),
+            ("etl_stage_rows_out", "Rows produced by the stage during the last run", "rows_out"),
+            ("etl_stage_calls", "Times the stage ran during the last run", "calls"),
+            ("etl_stage_failures", "Failed stage calls during the last run", "failures"),
+        ):
+            lines.append(f"# HELP {metric} {help_text}")
+            lines.append(f"# TYPE {metric} gauge")
+            for stage, total in manifest["summary"].items():
+                lines.append(f'{metric}{{pipeline="{pipeline}",stage="{stage}"}} {total[key]}')
+        lines.append("# HELP etl_run_wall_seconds Wall time of the last run")
+        lines.append("# TYPE etl_run_wall_seconds gauge")
+        lines.append(f'etl_run_wall_seconds{{pipeline="{pipeline}"}} {manifest["wall_seconds"]}')
+        lines.append("# HELP etl_run_success Whether the last run finished without failed stages")
+        lines.append("# TYPE etl_run_success gauge")
+        lines.append(f'etl_run_success{{pipeline="{pipeline}"}} {int(manifest["status"] == "ok")}')
+        lines.append("# HELP etl_run_finished_timestamp_seconds Unix time the last run finished")
+        lines.append("# TYPE etl_run_finished_timestamp_seconds gauge")
+        lines.append(f'etl_run_finished_timestamp_seconds{{pipeline="{pipeline}"}} {time.time():.3f}')
+
+        os.makedirs(self.prometheus_dir, exist_ok=True)
+        path = os.path.join(self.prometheus_dir, f"etl_{pipeline}.prom")
+        # Write then rename so the collector never reads a half-written file
+        with open(f"{path}.{os.getpid()}.tmp", "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+
+# ==== CURRENT RUN ====
+_current = None
+
+
+def start_run(pipeline, run_id, manifest_path, **options):
+    global _current
+    _current = RunMetrics(pipeline, run_id, manifest_path, **options)
+    return _current
+
+
+def current_run():
+    return _current
+
+
+def finish_run():
+    global _current
+    run, _current = _current, None
+    return run.write() if run is not None else None
+
+
+@contextmanager
+def stage(name, **labels):
+    # No-op when no run was started, so the pipelines still work as plain imports
+    run = _current
+    if run is None:
+        yield StageRecord(name, labels)
+    else:
+        with run.stage(name, **labels) as record:
+            yield record
+
+
+def _sized(value):
+    return len(value) if hasattr(value, "__len__") else None
+
+
+def timed_stage(name, rows_in=lambda args: _sized(args[0]) if args else None,
+                rows_out=lambda result, args: _sized(result), succeeded=None, count_rows=True):
+    # Decorator recording a call as one stage; rows_in/rows_out pick the row
+    # counts from the call arguments and the return value, and succeeded
+    # flags functions that report failure through their return value.
+    # count_rows=False only times the call, for stages that do not take or
+    # return rows
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name) as record:
+                if count_rows:
+                    record.rows_in = rows_in(args)
+                result = fn(*args, **kwargs)
+                if count_rows:
+                    record.rows_out = rows_out(result, args)
+                if succeeded is not None and not succeeded(result):
+                    record.status = "failed"
+                return result
+        return wrapper
+    return decorator
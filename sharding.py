@@ -0,0 +1,119 @@
+import json
+import os
+import subprocess
+import sys
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# ==== SHARDING ====
+# Application groups are split by a stable hash of application_group_name, so
+# every process and host agrees on which shard owns a group without
+# coordinating. Python's hash() is salted per process, hence crc32.
+
+
+def parse_shard(spec):
+    # "i/N" -> (i, N), i counted from 0
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard {spec!r}, expected i/N such as 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard {spec!r}: need 0 <= i < N")
+    return index, count
+
+
+def shard_of(application_group, shard_count):
+    return zlib.crc32(str(application_group).encode("utf-8")) % shard_count
+
+
+def in_shard(application_group, shard):
+    # shard is (i, N) or None for an unsharded run
+    return shard is None or shard_of(application_group, shard[1]) == shard[0]
+
+
+def shard_label(shard):
+    return f"shard{shard[0]}of{shard[1]}"
+
+
+# ==== LOCAL SHARD POOL ====
+def run_local_shards(command, shard_count, processes=None, log_path=None):
+    # Runs `command + ["--shard", "i/N"]` for every shard, at most `processes`
+    # at a time. Each shard is its own interpreter, so shards use separate
+    # cores and keep their own pools and caches. log_path(i) names the file
+    # receiving that shard's output. Returns {shard index: exit code}.
+    processes = processes or os.cpu_count() or 1
+
+    def run(index):
+        args = command + ["--shard", f"{index}/{shard_count}"]
+        if log_path is None:
+            return index, subprocess.run(args).returncode
+        os.makedirs(os.path.dirname(log_path(index)) or ".", exist_ok=True)
+        with open(log_path(index), "w", encoding="utf-8") as log:
+            return index, subprocess.run(args, stdout=log, stderr=subprocess.STDOUT).returncode
+
+    with ThreadPoolExecutor(max_workers=min(processes, shard_count)) as pool:
+        return dict(pool.map(run, range(shard_count)))
+
+
+# ==== MERGE ====
+def merge_manifests(manifests, pipeline, run_id):
+    # One run summary from per-shard manifests (see run_metrics.RunMetrics);
+    # stage totals are summed, wall time spans the earliest start to the
+    # latest finish across shards
+    summary = {}
+    for manifest in manifests:
+        for name, total in manifest["summary"].items():
+            merged = summary.setdefault(name, {
+                "calls": 0, "failures": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                "rows_in": 0, "rows_out": 0,
+            })
+            for key in merged:
+                merged[key] += total[key]
+    started = min((manifest["started_at"] for manifest in manifests), default=None)
+    finished = max((manifest["finished_at"] for manifest in manifests), default=None)
+    wall = (datetime.fromisoformat(finished) - datetime.fromisoformat(started)).total_seconds() \
+        if manifests else 0.0
+    for total in summary.values():
+        rows = total["rows_out"] or total["rows_in"]
+        # Shards run side by side, so throughput is over the run's wall time
+        total["rows_per_sec"] = round(rows / wall, 2) if rows and wall else None
+    return {
+        "pipeline": pipeline,
+        "run_id": run_id,
+        "started_at": started,
+        "finished_at": finished,
+        "wall_seconds": round(wall, 6),
+        "cpu_seconds": round(sum(manifest["cpu_seconds"] for manifest in manifests), 6),
+        "status": "ok" if manifests and all(m["status"] == "ok" for m in manifests) else "failed",
+        "shards": [
+            {key: manifest.get(key) for key in
+             ("shard", "pipeline", "host", "pid", "status", "wall_seconds", "cpu_seconds")}
+            for manifest in manifests
+        ],
+        "summary": summary,
+    }
+
+
+def merge_manifest_files(paths, output, pipeline, run_id):
+    manifests = []
+    for path in paths:
+        with open(path, encoding="utf-8") as file:
+            manifests.append(json.load(file))
+    merged = merge_manifests(manifests, pipeline, run_id)
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(merged, file, indent=2, default=str)
+    return merged
+
+
+# Multi-host runs: copy each host's shard manifests together, then
+#   python sharding.py <pipeline> <run_id> <merged.json> <shard manifests...>
+if __name__ == "__main__":
+    if len(sys.argv) < 5:
+        print("Usage: python sharding.py <pipeline> <run_id> <merged.json> <shard manifests...>")
+        sys.exit(1)
+    merged = merge_manifest_files(sys.argv[4:], sys.argv[3], sys.argv[1], sys.argv[2])
+    print(f"[INFO] Merged {len(merged['shards'])} shard manifests into {sys.argv[3]} | "
+          f"status: {merged['status']} | wall: {merged['wall_seconds']:.3f}s")
+    sys.exit(0 if merged["status"] == "ok" else 1)
@@ -1,145 +1,132 @@
+from datetime import datetime
+from checkpoints import current_checkpoints
+from etl_logging import Progress
+from reporting_db import METADATA, REPORT_WRITER
+from result_cache import get_result_cache
+from run_metrics import timed_stage
+from sharding import in_shard
+from source_connections import query_source_rows
+from source_fanout import get_source_fanout
+
+SLA_PROGRESS = Progress("Queued SLA rows")
 
 # === Insert Daily and Monthly Prices ===
 def sla_reporting(application_group, platform, sla_measured):
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-    daily_price = sla_measured / 365
-    cur.execute("""
-        INSERT INTO daily_table (application_group_name, platform, date, price)
-        VALUES (%s, CURRENT_DATE, %s)
-    """, (application_group,platform, daily_price))
+    # Rows are buffered and written in bulk by REPORT_WRITER
+    REPORT_WRITER.add_daily(application_group, sla_measured / 365, platform=platform)
 
     if datetime.now().day == 1:
-        monthly_price = sla_measured / 12
-        cur.execute("""
-            INSERT INTO monthly_table (application_group_name, platform,month, price)
-            VALUES (%s, TO_CHAR(CURRENT_DATE, 'YYYY-MM'), %s)
-        """, (application_group,platform, monthly_price))
+        REPORT_WRITER.add_monthly(application_group, sla_measured / 12, platform=platform)
 
-    conn.commit()
-    cur.close()
-    conn.close()
+    # One progress line every few seconds rather than one line per row
+    SLA_PROGRESS.add()
 
-    print(f"[SUCCESS] Inserted daily{' and monthly' if datetime.now().day == 1 else ''} pricing for {application_group}")
 
-
-def fetch_driver_details_sla(cursor, ref_number):
-    cursor.execute("""
-        SELECT db_engine, DB_driverpath, db_driverclass, db_username, db_pass
-        FROM database_driver_table
-        WHERE DBdriverreferncenumber = %s
-    """, (ref_number,))
-    return cursor.fetchone()
+def fetch_driver_details_sla(ref_number):
+    return METADATA.driver(ref_number)
 
 # === Execute External SQL Query ===
-def execute_query_sla(engine, driver_path, username, password, query, purpose):
+def iter_source_rows_sla(engine, driver_path, username, password, query, fetch_size=None):
+    # Chunks of the query result, served from the on-disk result cache when
+    # it is enabled and holds today's answer
+    return get_result_cache().rows(
+        engine, driver_path, username, query,
+        lambda: query_source_rows(engine, driver_path, username, password, query, fetch_size),
+    )
+
+def report_source_rows_sla(rows, purpose):
+    for row in rows:
+        app_group, platform, sla_measured = row
+        if purpose == 'sla':
+            sla_reporting(app_group, platform, sla_measured)
+
+def execute_query_sla(engine, driver_path, username, password, query, purpose, fetch_size=None):
     try:
-        if engine.lower() == "postgresql":
-            host, port, dbname = driver_path.split(":")
-            conn = psycopg2.connect(
-                host=host,
-                port=port,
-                dbname=dbname,
-                user=username,
-                password=password
-            )
-        elif engine.lower() == "oracle":
-            host, port, service = driver_path.split(":")
-            dsn = oracledb.makedsn(host, port, service_name=service)
-            conn = oracledb.connect(user=username, password=password, dsn=dsn)
-        else:
-            print(f"[ERROR] Unsupported database engine: {engine}")
-            return
-
-        cur = conn.cursor()
-        print(f"[INFO] Executing query:\n{query}")
-        cur.execute(query)
-        rows = cur.fetchall()
-        print(f"[SUCCESS] Retrieved {len(rows)} records.")
-
-        for row in rows:
-            app_group, platform, sla_measured = row
-            if purpose == 'sla':
-                sla_reporting(app_group, platform, sla_measured)
-
-        cur.close()
-        conn.close()
-
+        for rows in iter_source_rows_sla(engine, driver_path, username, password, query, fetch_size):
+            report_source_rows_sla(rows, purpose)
     except Exception as e:
         print(f"[ERROR] Failed to execute query on {engine}: {e}")
 
+def sla_db_sources(application_group):
+    # The group's sla_table rows that have a reader. Only database sources
+    # do; every other source is reported as skipped instead of failing the
+    # group on each run
+    rows = METADATA.sla_sources(application_group)
+    if not rows:
+        print(f"[WARNING] No SLA data for: {application_group}")
+        return []
+    for slarate, app_grp, app_name, source in rows:
+        if source != "DB":
+            print(f"[WARNING] SLA source {source!r} of {application_group} has no reader, skipped")
+    return [row for row in rows if row[3] == "DB"]
+
 def sla_pricing(application_group, year_input,purpose):
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT * from sla_table
-        WHERE application_group_name = %s
-    """, (application_group,))
-    row = cur.fetchall()
-    if not row:
-        print(f"[WARNING] No matrix data for: {application_group}")
-        return
-    slameasure,slaunit,slarate,slaname,app_grp,app_name,source=row
-    if source=="DB":
-        Databasemapping_sla(slarate,app_grp,app_name,source,purpose)
-    else:
-        filelog_sla(slarate,app_grp,app_name,source,purpose)
-
-    
-
-    cur.close()
-    conn.close()
+    # Returns False when the group's SLA rows could not be reported
+    db_rows = sla_db_sources(application_group)
+    if not db_rows:
+        return True
+    # The group's mappings are queried once, however many DB rows it has
+    slarate, app_grp, app_name, source = db_rows[0]
+    return Databasemapping_sla(application_group, slarate, app_grp, app_name, source, purpose)
 
 # === Mapping driver logic ===
 def Databasemapping_sla(application_group,slarate,app_grp,app_name,source,purpose):
+    # Returns False when a mapping could not be reported
+    ok = True
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT APP_grp, app_name, DB_name, Environment, DB_driver_refernce_number, SQLquery
-            FROM database_table
-            WHERE application_group_name = %s
-        """, (application_group,))
-        rows = cur.fetchall()
-
+        rows = METADATA.mappings(application_group)
         if not rows:
             print(f"[WARN] No mappings found for application group: {application_group}")
-            return
+            return True
 
+        # Source queries run concurrently; results are reported in mapping order
+        jobs = []
         for row in rows:
             APP_grp, app_name, DB_name, Environment, ref_num, SQLquery = row
-            print(f"\n[INFO] Processing app: {app_name} ({Environment})")
-
-            driver_details = fetch_driver_details_sla(cur, ref_num,source)
+            driver_details = fetch_driver_details_sla(ref_num)
             if not driver_details:
                 print(f"[ERROR] No DB driver found for reference: {ref_num}")
+                ok = False
                 continue
+            engine, path, driver_class, user, pwd, fetch_size = driver_details
+            jobs.append(((app_name, Environment, engine), path, iter_source_rows_sla,
+                         (engine, path, user, pwd, SQLquery, fetch_size)))
 
-            engine, path, user, pwd,SQLquery = driver_details
-            execute_query_sla(engine, path, user, pwd, SQLquery,source,purpose)
-
-        cur.close()
-        conn.close()
+        for (app_name, Environment, engine), chunks in get_source_fanout().stream_ordered(jobs):
+            print(f"\n[INFO] Processing app: {app_name} ({Environment})")
+            try:
+                for rows in chunks:
+                    report_source_rows_sla(rows, purpose)
+            except Exception as e:
+                chunks.close()
+                print(f"[ERROR] Failed to execute query on {engine}: {e}")
+                ok = False
+        return ok
 
     except Exception as e:
         print(f"[ERROR] {e}")
-        sys.exit(1)
+        return False
 
 # === Main Controller ===
-def process_sla_model(year_input):
-    conn = psycopg2.connect(**DB_CONFIG)
-    cur = conn.cursor()
-
-    cur.execute("SELECT application_group_name, pricing_model, purpose FROM pricingmodel_table")
-    rows = cur.fetchall()
-
-    for application_group, pricing_model, purpose in rows:
+@timed_stage("process_sla_model", count_rows=False)
+def process_sla_model(year_input, shard=None):
+    # Groups already checkpointed in the current run are skipped; returns the
+    # groups that failed so a --resume run retries only those
+    checkpoints = current_checkpoints()
+    rows = [row for row in METADATA.pricing_models() if in_shard(row[0], shard)]
+
+    failed = []
+    for application_group, pricing_model, purpose in checkpoints.pending("sla", rows):
         print(f"[PROCESSING] {application_group} | Model: {pricing_model} | Purpose: {purpose}")
-        sla_pricing(application_group, year_input,purpose)
-
-    cur.close()
-    conn.close()
+        try:
+            ok = sla_pricing(application_group, year_input,purpose)
+        except Exception as e:
+            print(f"[ERROR] SLA pricing failed for {application_group}: {e}")
+            ok = False
+        if ok is False:
+            failed.append(application_group)
+        else:
+            checkpoints.mark_done("sla", application_group)
+    return failed
 
 
@@ -0,0 +1,229 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from run_metrics import stage
+from source_drivers import get_driver, parse_driver_path
+from source_fanout import SOURCE_FETCH_SIZE, SOURCE_MAX_PER_PATH
+
+# === Source Connection Cache Configuration ===
+# Open connections kept per (engine, driver path, user); matches the fan-out's
+# per-path concurrency so parallel queries never wait on the cache
+SOURCE_CONN_MAX_PER_SOURCE = int(os.environ.get("ETL_SOURCE_CONN_MAX_PER_SOURCE", SOURCE_MAX_PER_PATH))
+# Seconds a connection may sit idle before it is closed
+SOURCE_CONN_IDLE_TIMEOUT = float(os.environ.get("ETL_SOURCE_CONN_IDLE_TIMEOUT", 300))
+# Seconds to wait for a free connection to a source before giving up
+SOURCE_CONN_TIMEOUT = float(os.environ.get("ETL_SOURCE_CONN_TIMEOUT", 60))
+# Connections idle for longer than this are pinged before reuse
+SOURCE_CONN_HEALTHCHECK_AFTER = float(os.environ.get("ETL_SOURCE_CONN_HEALTHCHECK_AFTER", 5))
+
+
+class SourceConnectionTimeout(Exception):
+    pass
+
+
+def connect_source(engine, driver_path, username, password):
+    driver = get_driver(engine)
+    return driver.connect(parse_driver_path(engine, driver_path), username, password)
+
+
+def _is_alive(engine, conn):
+    driver = get_driver(engine)
+    try:
+        driver.ping(conn)
+        return True
+    except driver.errors:
+        return False
+
+
+def _close(engine, conn):
+    driver = get_driver(engine)
+    try:
+        conn.close()
+    except driver.errors:
+        pass
+
+
+# === Warm source connections shared by every mapping of a run ===
+class SourceConnectionCache:
+    def __init__(self, max_per_source=SOURCE_CONN_MAX_PER_SOURCE, idle_timeout=SOURCE_CONN_IDLE_TIMEOUT,
+                 timeout=SOURCE_CONN_TIMEOUT, healthcheck_after=SOURCE_CONN_HEALTHCHECK_AFTER):
+        self.max_per_source = max_per_source
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.healthcheck_after = healthcheck_after
+        self._idle = {}   # key -> [(conn, returned_at), ...], most recently used last
+        self._open = {}   # key -> connections open (idle or checked out)
+        self._cond = threading.Condition()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "waits": 0,
+            "idle_evictions": 0,
+            "healthcheck_failures": 0,
+            "discarded": 0,
+        }
+
+    def _evict_idle(self):
+        # Caller holds self._cond; returns the connections to close outside the lock
+        cutoff = time.monotonic() - self.idle_timeout
+        expired = []
+        for key, idle in self._idle.items():
+            keep = [(conn, returned_at) for conn, returned_at in idle if returned_at >= cutoff]
+            expired += [(key, conn) for conn, returned_at in idle if returned_at < cutoff]
+            self._open[key] -= len(idle) - len(keep)
+            idle[:] = keep
+        self.stats["idle_evictions"] += len(expired)
+        if expired:
+            self._cond.notify_all()
+        return expired
+
+    def getconn(self, engine, driver_path, username, password):
+        key = (engine.lower(), driver_path, username)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                expired = self._evict_idle()
+                waited = False
+                while True:
+                    idle = self._idle.get(key)
+                    if idle:
+                        conn, returned_at = idle.pop()
+                        break
+                    if self._open.get(key, 0) < self.max_per_source:
+                        self._open[key] = self._open.get(key, 0) + 1
+                        conn = returned_at = None
+                        break
+                    if not waited:
+                        self.stats["waits"] += 1
+                        waited = True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise SourceConnectionTimeout(
+                            f"No connection to {key[0]} {driver_path} free after {self.timeout}s "
+                            f"(max_per_source={self.max_per_source})"
+                        )
+                    self._cond.wait(remaining)
+            for stale_key, stale in expired:
+                _close(stale_key[0], stale)
+
+            if conn is None:
+                break
+            if time.monotonic() - returned_at < self.healthcheck_after or _is_alive(key[0], conn):
+                with self._cond:
+                    self.stats["hits"] += 1
+                return key, conn
+            with self._cond:
+                self.stats["healthcheck_failures"] += 1
+                self.stats["discarded"] += 1
+                self._open[key] -= 1
+                self._cond.notify_all()
+            _close(key[0], conn)
+
+        # Slot reserved above: open a new connection in it
+        try:
+            conn = connect_source(engine, driver_path, username, password)
+        except Exception:
+            with self._cond:
+                self._open[key] -= 1
+                self._cond.notify_all()
+            raise
+        with self._cond:
+            self.stats["misses"] += 1
+        return key, conn
+
+    def putconn(self, key, conn, close=False):
+        if not close:
+            try:
+                # End the read transaction so the next query sees fresh data
+                conn.rollback()
+            except get_driver(key[0]).errors:
+                close = True
+        with self._cond:
+            if close:
+                self._open[key] -= 1
+                self.stats["discarded"] += 1
+            else:
+                self._idle.setdefault(key, []).append((conn, time.monotonic()))
+            self._cond.notify_all()
+        if close:
+            _close(key[0], conn)
+
+    @contextmanager
+    def connection(self, engine, driver_path, username, password):
+        key, conn = self.getconn(engine, driver_path, username, password)
+        broken = False
+        try:
+            yield conn
+        except get_driver(engine).broken_errors:
+            broken = True
+            raise
+        finally:
+            self.putconn(key, conn, close=broken)
+
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, {}
+            for key, connections in idle.items():
+                self._open[key] -= len(connections)
+        for key, connections in idle.items():
+            for conn, _ in connections:
+                _close(key[0], conn)
+
+    def log_stats(self):
+        with self._cond:
+            stats = dict(self.stats, sources=len([key for key, count in self._open.items() if count]))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+        print(f"[INFO] Source connection cache | hits: {stats['hits']} | misses: {stats['misses']} "
+              f"| waits: {stats['waits']} | idle evictions: {stats['idle_evictions']} "
+              f"| failed health checks: {stats['healthcheck_failures']}")
+        return stats
+
+
+# === Shared cache for the pricing and SLA runs ===
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_source_connections():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SourceConnectionCache()
+        return _cache
+
+
+def close_source_connections():
+    # Returns the cache stats, or None when no source was queried
+    global _cache
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache is None:
+        return None
+    stats = cache.log_stats()
+    cache.closeall()
+    return stats
+
+
+def query_source_rows(engine, driver_path, username, password, query, fetch_size=None):
+    # Yields the result in chunks of fetch_size rows so large sources are never
+    # held in memory all at once; connections are reused across mappings
+    fetch_size = fetch_size or SOURCE_FETCH_SIZE
+    driver = get_driver(engine)
+    total = 0
+    with stage("execute_query", engine=engine, driver_path=driver_path) as record:
+        print(f"[INFO] Executing query (fetch size {fetch_size}):\n{query}")
+        if driver.pooled:
+            with get_source_connections().connection(engine, driver_path, username, password) as conn:
+                for rows in driver.fetch(conn, query, fetch_size):
+                    total += len(rows)
+                    record.rows_out = total
+                    yield rows
+        else:
+            for rows in driver.fetch(parse_driver_path(engine, driver_path), query, fetch_size):
+                total += len(rows)
+                record.rows_out = total
+                yield rows
+    print(f"[SUCCESS] Retrieved {total} records.")
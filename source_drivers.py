@@ -0,0 +1,249 @@
+import csv
+import importlib
+import os
+import threading
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from itertools import islice
+
+# ==== SOURCE DRIVER REGISTRY ====
+# database_driver_table.DB_engine -> driver. A driver imports its client
+# library the first time a connection is opened, so a run only pays the
+# import time and memory of the engines its mappings actually query.
+# Extra engines are plugged in with register_driver() or, without code
+# changes, via ETL_SOURCE_DRIVERS="engine=module:Class,...".
+SOURCE_DRIVER_PLUGINS = os.environ.get("ETL_SOURCE_DRIVERS", "")
+
+# Rows kept in memory while a file source is read; the query's fetch size wins
+FILE_SOURCE_CHUNK_SIZE = 10000
+
+
+class SourceDriver(ABC):
+    engine = None
+    module = None  # client library, imported on first use
+    # False for sources without connections (files): queries open the path
+    pooled = True
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = importlib.import_module(self.module)
+        return self._client
+
+    @property
+    def errors(self):
+        # Every error the client raises; used to discard bad connections
+        return (self.client.Error,)
+
+    @property
+    def broken_errors(self):
+        # Errors after which a connection must not go back into the cache
+        return (self.client.InterfaceError, self.client.OperationalError)
+
+    def parse_path(self, driver_path):
+        # DB_driverpath -> connect arguments; cached per path by parse_driver_path()
+        host, port, name = driver_path.split(":")
+        return host, port, name
+
+    @abstractmethod
+    def connect(self, target, username, password):
+        pass
+
+    def ping(self, conn):
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.close()
+        conn.rollback()
+
+    def cursor(self, conn, fetch_size):
+        cur = conn.cursor()
+        cur.arraysize = fetch_size
+        return cur
+
+    def fetch(self, conn, query, fetch_size):
+        # Chunks of at most fetch_size rows
+        cur = self.cursor(conn, fetch_size)
+        try:
+            cur.execute(query)
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+
+class PostgresDriver(SourceDriver):
+    engine = "postgresql"
+    module = "psycopg2"
+
+    def connect(self, target, username, password):
+        host, port, dbname = target
+        return self.client.connect(host=host, port=port, dbname=dbname, user=username, password=password)
+
+    def cursor(self, conn, fetch_size):
+        # Named cursor = server-side cursor, rows stay on the server until fetched
+        cur = conn.cursor(name="etl_source_stream")
+        cur.itersize = fetch_size
+        return cur
+
+
+class OracleDriver(SourceDriver):
+    engine = "oracle"
+    module = "oracledb"
+
+    def parse_path(self, driver_path):
+        host, port, service = driver_path.split(":")
+        return self.client.makedsn(host, port, service_name=service)
+
+    def connect(self, target, username, password):
+        return self.client.connect(user=username, password=password, dsn=target)
+
+    def ping(self, conn):
+        conn.ping()
+
+    def cursor(self, conn, fetch_size):
+        cur = conn.cursor()
+        cur.arraysize = fetch_size
+        cur.prefetchrows = fetch_size + 1
+        return cur
+
+
+class SqliteDriver(SourceDriver):
+    # DB_driverpath is the database file; user and password are ignored
+    engine = "sqlite"
+    module = "sqlite3"
+
+    def parse_path(self, driver_path):
+        return os.path.abspath(driver_path)
+
+    def connect(self, target, username, password):
+        # Cached connections move between fan-out threads, one at a time
+        return self.client.connect(target, check_same_thread=False)
+
+
+def _file_columns(query):
+    # For file sources the mapping's query names the columns to read, in
+    # order ("app_group, platform, ru_measured"); "*" or empty reads them all
+    columns = [column.strip() for column in (query or "").strip().rstrip(";").split(",")]
+    return None if columns in ([""], ["*"]) else columns
+
+
+def _csv_value(value):
+    # Numbers come back as numbers, like the database engines return them
+    if value == "":
+        return None
+    for parse in (int, float):
+        try:
+            return parse(value)
+        except ValueError:
+            pass
+    return value
+
+
+class FileSourceDriver(SourceDriver):
+    # Sources without connections: fetch() gets the resolved path directly
+    pooled = False
+
+    def parse_path(self, driver_path):
+        return os.path.abspath(driver_path)
+
+    def connect(self, target, username, password):
+        # Nothing to open; the path is the whole "connection"
+        return target
+
+
+class CsvDriver(FileSourceDriver):
+    # DB_driverpath is a CSV file with a header row
+    engine = "csv"
+    module = "csv"
+
+    def fetch(self, target, query, fetch_size):
+        with open(target, newline="", encoding="utf-8") as file:
+            reader = csv.reader(file)
+            header = next(reader, [])
+            columns = _file_columns(query)
+            try:
+                positions = [header.index(column) for column in columns] if columns else range(len(header))
+            except ValueError as e:
+                raise ValueError(f"{target}: {e} (columns: {header})")
+            while True:
+                rows = [tuple(_csv_value(row[i]) for i in positions)
+                        for row in islice(reader, fetch_size or FILE_SOURCE_CHUNK_SIZE)]
+                if not rows:
+                    break
+                yield rows
+
+
+class ParquetDriver(FileSourceDriver):
+    # DB_driverpath is a Parquet file or a directory of them
+    engine = "parquet"
+    module = "pyarrow.parquet"
+
+    def fetch(self, target, query, fetch_size):
+        paths = sorted(os.path.join(target, name) for name in os.listdir(target)
+                       if name.endswith(".parquet")) if os.path.isdir(target) else [target]
+        for path in paths:
+            parquet = self.client.ParquetFile(path)
+            for batch in parquet.iter_batches(batch_size=fetch_size or FILE_SOURCE_CHUNK_SIZE,
+                                              columns=_file_columns(query)):
+                yield list(zip(*(column.to_pylist() for column in batch.columns)))
+
+
+# ==== REGISTRY ====
+_drivers = {}
+_plugins_loaded = False
+_registry_lock = threading.Lock()
+
+
+def register_driver(driver):
+    # driver: a SourceDriver instance; replaces any driver for the same engine
+    with _registry_lock:
+        _drivers[driver.engine.lower()] = driver
+    _parse_driver_path.cache_clear()
+    return driver
+
+
+def _load_plugins():
+    global _plugins_loaded
+    _plugins_loaded = True
+    for spec in filter(None, (part.strip() for part in SOURCE_DRIVER_PLUGINS.split(","))):
+        try:
+            engine, target = spec.split("=")
+            module, cls = target.split(":")
+        except ValueError:
+            raise ValueError(f"Invalid source driver plugin {spec!r}, expected engine=module:Class")
+        driver = getattr(importlib.import_module(module), cls)()
+        driver.engine = engine.strip()
+        register_driver(driver)
+
+
+def get_driver(engine):
+    driver = _drivers.get(engine.lower())
+    if driver is None and not _plugins_loaded:
+        _load_plugins()
+        driver = _drivers.get(engine.lower())
+    if driver is None:
+        raise ValueError(f"Unsupported database engine: {engine} (registered: {', '.join(sorted(_drivers))})")
+    return driver
+
+
+@lru_cache(maxsize=1024)
+def _parse_driver_path(engine, driver_path):
+    return get_driver(engine).parse_path(driver_path)
+
+
+def parse_driver_path(engine, driver_path):
+    # Parsed once per source; every mapping and connection of it shares the result
+    return _parse_driver_path(engine.lower(), driver_path)
+
+
+for _driver in (PostgresDriver(), OracleDriver(), SqliteDriver(), CsvDriver(), ParquetDriver()):
+    register_driver(_driver)
@@ -0,0 +1,201 @@
+import os
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# === Fan-out Configuration ===
+SOURCE_MAX_WORKERS = int(os.environ.get("ETL_SOURCE_MAX_WORKERS", 8))
+# Concurrent queries allowed against a single DB_driverpath
+SOURCE_MAX_PER_PATH = int(os.environ.get("ETL_SOURCE_MAX_PER_PATH", 2))
+# Fetched chunks a source may run ahead of the reporting step
+SOURCE_MAX_BUFFERED_CHUNKS = int(os.environ.get("ETL_SOURCE_MAX_BUFFERED_CHUNKS", 4))
+
+# Rows per fetchmany() when database_driver_table.fetch_batch_size is NULL
+SOURCE_FETCH_SIZE = int(os.environ.get("ETL_SOURCE_FETCH_SIZE", 10000))
+
+_DONE = object()
+
+
+class _Stream:
+    def __init__(self, max_chunks):
+        self.chunks = queue.Queue(maxsize=max_chunks)
+        self.cancelled = threading.Event()
+
+    def put(self, item):
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def close(self):
+        # Called when the consumer abandons the stream: the job stops at its
+        # next chunk and gives its slot back; buffered chunks are dropped
+        self.cancelled.set()
+        while True:
+            try:
+                self.chunks.get_nowait()
+            except queue.Empty:
+                return
+
+    def __iter__(self):
+        while True:
+            item = self.chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class _Job:
+    def __init__(self, driver_path, fn, args, stream):
+        self.driver_path = driver_path
+        self.fn = fn
+        self.args = args
+        self.stream = stream
+        self.started = False
+        self.finished = False
+        # True once a consumer is reading (or waiting on) this job's stream
+        self.current = False
+
+
+# === Bounded concurrent runner for source queries ===
+# Jobs a consumer is reading ("current") always progress, so they may use any
+# free worker or per-path slot. Jobs started ahead of their consumer may sit
+# on a full chunk queue indefinitely, so they are kept one worker and one
+# per-path slot short of the limits; that spare capacity is what lets several
+# stream_ordered consumers share the fan-out without deadlocking each other.
+class SourceFanout:
+    def __init__(self, max_workers=SOURCE_MAX_WORKERS, max_per_path=SOURCE_MAX_PER_PATH,
+                 max_buffered_chunks=SOURCE_MAX_BUFFERED_CHUNKS):
+        if max_workers < 1 or max_per_path < 1 or max_buffered_chunks < 1:
+            raise ValueError(f"Invalid fan-out limits: max_workers={max_workers}, "
+                             f"max_per_path={max_per_path}, "
+                             f"max_buffered_chunks={max_buffered_chunks}")
+        self.max_workers = max_workers
+        self.max_per_path = max_per_path
+        self.max_buffered_chunks = max_buffered_chunks
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix="source-query")
+        self._lock = threading.Lock()
+        self._pending = []
+        self._running = 0
+        self._running_ahead = 0
+        self._path_running = Counter()
+        self._path_ahead = Counter()
+
+    def _can_start(self, job):
+        path = job.driver_path
+        if self._running >= self.max_workers or self._path_running[path] >= self.max_per_path:
+            return False
+        if job.current:
+            return True
+        return (self._running_ahead < self.max_workers - 1
+                and self._path_ahead[path] < self.max_per_path - 1)
+
+    def _schedule(self):
+        # Called with self._lock held; starts jobs in submission order
+        for job in list(self._pending):
+            if job.stream.cancelled.is_set():
+                self._pending.remove(job)
+            elif self._can_start(job):
+                self._pending.remove(job)
+                job.started = True
+                self._running += 1
+                self._path_running[job.driver_path] += 1
+                if not job.current:
+                    self._running_ahead += 1
+                    self._path_ahead[job.driver_path] += 1
+                self._executor.submit(self._run, job)
+
+    def _make_current(self, job):
+        with self._lock:
+            job.current = True
+            if job.started and not job.finished:
+                self._running_ahead -= 1
+                self._path_ahead[job.driver_path] -= 1
+            self._schedule()
+
+    def _finished(self, job):
+        with self._lock:
+            job.finished = True
+            self._running -= 1
+            self._path_running[job.driver_path] -= 1
+            if not job.current:
+                self._running_ahead -= 1
+                self._path_ahead[job.driver_path] -= 1
+            self._schedule()
+
+    def _run(self, job):
+        stream = job.stream
+        try:
+            if stream.cancelled.is_set():
+                return
+            chunks = job.fn(*job.args)
+            try:
+                for chunk in chunks:
+                    if not stream.put(chunk):
+                        return
+            finally:
+                # Closes the source cursor straight away when cancelled
+                close = getattr(chunks, "close", None)
+                if close is not None:
+                    close()
+            stream.put(_DONE)
+        except Exception as e:
+            stream.put(e)
+        finally:
+            self._finished(job)
+
+    def stream_ordered(self, jobs):
+        # jobs: [(tag, driver_path, chunk_generator_fn, args), ...]
+        # Yields (tag, chunks) in the order the jobs were given. Iterating
+        # chunks yields the job's row chunks as they arrive and re-raises the
+        # job's error, if any. Only max_buffered_chunks chunks per job are held
+        # in memory while the consumer is busy with an earlier job. Moving on
+        # to the next job closes the previous stream, so a consumer that stops
+        # reading a stream part way never leaves its job holding a slot.
+        tagged = []
+        with self._lock:
+            for tag, driver_path, fn, args in jobs:
+                job = _Job(driver_path, fn, args, _Stream(self.max_buffered_chunks))
+                self._pending.append(job)
+                tagged.append((tag, job))
+            self._schedule()
+        try:
+            for tag, job in tagged:
+                self._make_current(job)
+                yield tag, job.stream
+                job.stream.close()
+        finally:
+            for _, job in tagged:
+                job.stream.close()
+            with self._lock:
+                self._schedule()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_fanout = None
+_fanout_lock = threading.Lock()
+
+
+def get_source_fanout(**fanout_options):
+    global _fanout
+    with _fanout_lock:
+        if _fanout is None:
+            _fanout = SourceFanout(**fanout_options)
+        return _fanout
+
+
+def shutdown_source_fanout():
+    global _fanout
+    with _fanout_lock:
+        if _fanout is not None:
+            _fanout.shutdown()
+            _fanout = None
@@ -0,0 +1,207 @@
+import csv
+import logging
+import queue
+import threading
+import time
+from itertools import islice
+
+import psycopg2
+
+from run_metrics import stage
+from task_loader import TASK_COLUMNS, TODO_METRICS_DDL, create_stage, delete_tasks, merge_stage, stage_tasks
+
+# ==== STREAMING CONFIG ====
+CHUNK_SIZE = 10000
+# Chunks each stage may hold ahead of the next one; bounds memory to roughly
+# (QUEUE_SIZE + 1) * CHUNK_SIZE rows per sink
+QUEUE_SIZE = 4
+
+_END = object()
+
+
+def chunked(iterable, size=CHUNK_SIZE):
+    rows = iter(iterable)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ==== SINKS ====
+# A sink is opened once, receives every chunk in order and is closed with
+# ok=False when any other stage failed, so it can discard partial output.
+class CsvSink:
+    name = "csv"
+    stage = "load_to_csv"
+
+    def __init__(self, path, fieldnames=TASK_COLUMNS, deletions=None):
+        # deletions() returns the rows to append once every chunk was written
+        self.path = path
+        self.fieldnames = fieldnames
+        self.deletions = deletions
+        self.rows = 0
+
+    def open(self):
+        logging.info(f"Saving filtered tasks to CSV at {self.path}...")
+        self.file = open(self.path, mode='w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames)
+        self.writer.writeheader()
+
+    def write(self, chunk):
+        self.writer.writerows(chunk)
+        self.rows += len(chunk)
+
+    def close(self, ok=True):
+        if ok and self.deletions:
+            deleted = self.deletions()
+            self.writer.writerows(deleted)
+            self.rows += len(deleted)
+        self.file.close()
+        logging.info(f"CSV write completed ({self.rows} rows).")
+
+
+class PostgresSink:
+    name = "postgres"
+    stage = "load_to_postgres"
+
+    def __init__(self, db_config, deletions=None):
+        # deletions() returns the task_ids to delete in the same transaction
+        self.db_config = db_config
+        self.deletions = deletions
+        self.rows = 0
+
+    def open(self):
+        logging.info("Streaming data into PostgreSQL table `todo_metrics`...")
+        self.conn = psycopg2.connect(**self.db_config)
+        self.cur = self.conn.cursor()
+        self.cur.execute(TODO_METRICS_DDL)
+        create_stage(self.cur)
+
+    def write(self, chunk):
+        self.rows += stage_tasks(self.cur, chunk)
+
+    def close(self, ok=True):
+        try:
+            if ok:
+                inserted, updated = merge_stage(self.cur)
+                deleted = delete_tasks(self.cur, self.deletions()) if self.deletions else 0
+                self.conn.commit()
+                logging.info(f"Merged {self.rows} streamed rows: {inserted} inserted, {updated} updated"
+                             f"{f', {deleted} deleted' if self.deletions else ''}.")
+            else:
+                self.conn.rollback()
+                logging.warning("PostgreSQL load rolled back because the pipeline failed.")
+        finally:
+            self.cur.close()
+            self.conn.close()
+
+
+def _drain(sink, chunks, errors):
+    with stage(sink.stage, mode="streaming") as record:
+        record.rows_in = 0
+        opened = failed = False
+        try:
+            sink.open()
+            opened = True
+        except Exception as e:
+            errors[sink.name] = e
+            failed = True
+        while True:
+            chunk = chunks.get()
+            if chunk is _END:
+                break
+            record.rows_in += len(chunk)
+            if failed:
+                continue  # keep draining so upstream never blocks on a dead sink
+            try:
+                sink.write(chunk)
+            except Exception as e:
+                errors[sink.name] = e
+                failed = True
+        if opened:
+            # Upstream failures are recorded before _END is queued
+            upstream_ok = "extract" not in errors and "transform" not in errors
+            try:
+                sink.close(ok=upstream_ok and not failed)
+            except Exception as e:
+                errors.setdefault(sink.name, e)
+        record.rows_out = 0 if sink.name in errors else record.rows_in
+        if sink.name in errors:
+            record.status, record.error = "failed", repr(errors[sink.name])
+
+
+# ==== PIPELINE ====
+def run_streaming(extract_chunks, transform, sinks, queue_size=QUEUE_SIZE,
+                  extract_stage="extract", transform_stage="transform_tasks"):
+    # extract_chunks yields lists of raw records; transform maps one raw chunk
+    # to one output chunk. Extraction runs in its own thread, transform in the
+    # caller's, and every sink in its own thread with a bounded queue, so the
+    # stages overlap and the slowest one sets the pace.
+    # Returns {sink name: error} for the stages that failed (empty on success).
+    started = time.perf_counter()
+    errors = {}
+    raw_chunks = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def extract():
+        with stage(extract_stage, mode="streaming") as record:
+            record.rows_out = 0
+            try:
+                for chunk in extract_chunks:
+                    record.rows_out += len(chunk)
+                    while not stop.is_set():
+                        try:
+                            raw_chunks.put(chunk, timeout=0.5)
+                            break
+                        except queue.Full:
+                            continue
+                    if stop.is_set():
+                        return
+            except Exception as e:
+                errors["extract"] = e
+                record.status, record.error = "failed", repr(e)
+            finally:
+                raw_chunks.put(_END)
+
+    sink_queues = [queue.Queue(maxsize=queue_size) for _ in sinks]
+    threads = [threading.Thread(target=extract, name="etl-extract", daemon=True)]
+    threads += [
+        threading.Thread(target=_drain, args=(sink, chunks, errors), name=f"etl-{sink.name}", daemon=True)
+        for sink, chunks in zip(sinks, sink_queues)
+    ]
+    for thread in threads:
+        thread.start()
+
+    rows_in = rows_out = 0
+    # Stage wall time includes time blocked on the neighbouring queues
+    with stage(transform_stage, mode="streaming") as record:
+        try:
+            while True:
+                chunk = raw_chunks.get()
+                if chunk is _END:
+                    break
+                rows_in += len(chunk)
+                output = transform(chunk)
+                rows_out += len(output)
+                for chunks in sink_queues:
+                    chunks.put(output)
+        except Exception as e:
+            errors["transform"] = e
+            record.status, record.error = "failed", repr(e)
+            stop.set()
+            # Unblock the extractor if it is waiting on a full queue
+            while raw_chunks.get() is not _END:
+                pass
+        finally:
+            record.rows_in, record.rows_out = rows_in, rows_out
+            for chunks in sink_queues:
+                chunks.put(_END)
+            for thread in threads:
+                thread.join()
+
+    for failed_stage, error in errors.items():
+        logging.error(f"Streaming stage `{failed_stage}` failed: {error}")
+    logging.info(f"Streamed {rows_in} rows in, {rows_out} rows out in "
+                 f"{time.perf_counter() - started:.2f}s.")
+    return errors
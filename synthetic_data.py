@@ -0,0 +1,161 @@
+import io
+import random
+
+# ==== SYNTHETIC BENCHMARK DATA ====
+# Every table the pricing, SLA and task pipelines read, generated
+# deterministically from (scale, seed) into one throwaway schema.
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+
+PLATFORMS = ["linux", "windows", "mainframe", "k8s"]
+DRIVER_COUNT = 10
+SOURCE_ROWS_PER_GROUP = 10
+MATRIX_YEARS = (2023, 2022)
+
+SCHEMA_DDL = """
+    CREATE TABLE {schema}.pricingmodel_table (
+        application_group_name TEXT,
+        pricing_model TEXT,
+        purpose TEXT
+    );
+    CREATE TABLE {schema}.pricingmatrix_table (
+        application_group_name TEXT,
+        price_year1 DOUBLE PRECISION,
+        price_year2 DOUBLE PRECISION
+    );
+    CREATE TABLE {schema}.database_table (
+        application_group_name TEXT,
+        APP_grp TEXT,
+        app_name TEXT,
+        DB_name TEXT,
+        Environment TEXT,
+        DB_driver_refernce_number INTEGER,
+        SQLquery TEXT
+    );
+    CREATE TABLE {schema}.database_driver_table (
+        DBdriverreferncenumber INTEGER PRIMARY KEY,
+        db_engine TEXT,
+        DB_driverpath TEXT,
+        db_driverclass TEXT,
+        db_username TEXT,
+        db_pass TEXT,
+        fetch_batch_size INTEGER
+    );
+    CREATE TABLE {schema}.sla_table (
+        slameasure TEXT,
+        slaunit TEXT,
+        slarate DOUBLE PRECISION,
+        slaname TEXT,
+        app_grp TEXT,
+        app_name TEXT,
+        source TEXT,
+        application_group_name TEXT
+    );
+    CREATE TABLE {schema}.source_usage (
+        application_group_name TEXT,
+        platform TEXT,
+        measured DOUBLE PRECISION
+    );
+    CREATE INDEX ON {schema}.source_usage (application_group_name);
+    CREATE TABLE {schema}.source_tasks (
+        id INTEGER PRIMARY KEY,
+        title TEXT,
+        user_Id INTEGER,
+        completed BOOLEAN
+    );
+    CREATE TABLE {schema}.daily_table (
+        application_group_name TEXT,
+        platform TEXT,
+        date DATE,
+        price DOUBLE PRECISION
+    );
+    CREATE TABLE {schema}.monthly_table (
+        application_group_name TEXT,
+        platform TEXT,
+        month TEXT,
+        price DOUBLE PRECISION
+    );
+"""
+
+# Tables the pipelines write to; emptied between benchmark repeats
+OUTPUT_TABLES = ("daily_table", "monthly_table", "todo_metrics")
+
+
+def _copy(cur, table, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join("\\N" if value is None else str(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} FROM STDIN", buffer)
+
+
+def group_count(scale):
+    return max(scale // 10, 10)
+
+
+def generate(conn, schema, scale, source_path, source_user, source_password, seed=42):
+    # source_path/user/password: how the pipelines' source connections reach
+    # this same database (DB_driverpath is host:port:dbname)
+    rng = random.Random(seed)
+    groups = [f"APPGRP_{i:07d}" for i in range(group_count(scale))]
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(SCHEMA_DDL.format(schema=schema))
+
+    # Half the groups are PXQ (priced from source usage), half matrix priced;
+    # a quarter of each have purpose "sla"
+    models = [(group, "PXQ" if i % 2 == 0 else "MATRIX", "pricing" if i % 8 < 6 else "sla")
+              for i, group in enumerate(groups)]
+    _copy(cur, f"{schema}.pricingmodel_table", models)
+    _copy(cur, f"{schema}.pricingmatrix_table",
+          ((group, round(rng.uniform(1_000, 50_000), 2), round(rng.uniform(1_000, 50_000), 2))
+           for group, model, _ in models if model != "PXQ"))
+
+    _copy(cur, f"{schema}.database_driver_table",
+          ((ref, "postgresql", source_path, "org.postgresql.Driver", source_user, source_password, None)
+           for ref in range(DRIVER_COUNT)))
+    _copy(cur, f"{schema}.database_table",
+          ((group, group, f"app_{i}", "bench", "bench", i % DRIVER_COUNT,
+            f"SELECT application_group_name, platform, measured FROM {schema}.source_usage "
+            f"WHERE application_group_name = '{group}'")
+           for i, (group, model, _) in enumerate(models) if model == "PXQ"))
+    _copy(cur, f"{schema}.source_usage",
+          ((group, rng.choice(PLATFORMS), round(rng.uniform(10, 10_000), 3))
+           for group, model, _ in models if model == "PXQ"
+           for _ in range(SOURCE_ROWS_PER_GROUP)))
+
+    _copy(cur, f"{schema}.source_tasks",
+          ((i, f"task {i} {rng.getrandbits(32):08x}", rng.randint(1, 1_000), rng.random() < 0.5)
+           for i in range(1, scale + 1)))
+
+    # PXQ groups with purpose "sla" report their source usage through sla_table;
+    # generated last so the other tables keep their values for a given seed
+    _copy(cur, f"{schema}.sla_table",
+          (("usage", "hours", round(rng.uniform(0.5, 5), 2), f"sla_{i}", group, f"app_{i}", "DB", group)
+           for i, (group, model, purpose) in enumerate(models) if model == "PXQ" and purpose == "sla"))
+
+    cur.execute("ANALYZE")
+    conn.commit()
+    cur.close()
+    return {"groups": len(groups), "source_tasks": scale,
+            "sla_table": sum(model == "PXQ" and purpose == "sla" for _, model, purpose in models),
+            "source_usage": sum(model == "PXQ" for _, model, _ in models) * SOURCE_ROWS_PER_GROUP}
+
+
+def reset_outputs(conn, schema):
+    cur = conn.cursor()
+    for table in OUTPUT_TABLES:
+        cur.execute(f"SELECT to_regclass('{schema}.{table}')")
+        if cur.fetchone()[0] is not None:
+            cur.execute(f"TRUNCATE {schema}.{table}")
+    conn.commit()
+    cur.close()
+
+
+def drop(conn, schema):
+    cur = conn.cursor()
+    cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+    conn.commit()
+    cur.close()
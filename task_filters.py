@@ -0,0 +1,71 @@
+import operator
+
+# ==== DECLARATIVE TRANSFORM FILTERS ====
+# A transform declares its row filters as (field, op, value) tuples and its
+# output columns as {output_field: source_field}. SQL extractors compile them
+# into the source query; other sources run the same filters in Python.
+
+_PY_OPERATORS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda left, right: left in right,
+}
+
+
+def _check(filters):
+    for field, op, value in filters:
+        if op not in _PY_OPERATORS:
+            raise ValueError(f"Unsupported filter operator {op!r} on {field}")
+
+
+def compile_select(table, projection, filters, extra_columns=(), extra_where=()):
+    # Returns (sql, params) selecting the projected source columns of rows that
+    # pass every filter. Filter fields are output fields, mapped via projection;
+    # extra_where takes raw (clause, params) pairs from the extractor itself.
+    _check(filters)
+    columns = list(dict.fromkeys(projection.values())) + list(extra_columns)
+    clauses, params = [], []
+    for field, op, value in filters:
+        column = projection.get(field, field)
+        if value is None and op in ("=", "!="):
+            clauses.append(f"{column} IS {'NOT ' if op == '!=' else ''}NULL")
+        elif op == "!=":
+            # Match Python, where None != value is True
+            clauses.append(f"{column} IS DISTINCT FROM %s")
+            params.append(value)
+        elif op == "in":
+            clauses.append(f"{column} = ANY(%s)")
+            params.append(list(value))
+        else:
+            clauses.append(f"{column} {op} %s")
+            params.append(value)
+    for clause, clause_params in extra_where:
+        clauses.append(clause)
+        params.extend(clause_params)
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    return sql, params
+
+
+def matches(record, projection, filters):
+    for field, op, value in filters:
+        actual = record.get(projection.get(field, field))
+        if actual is None and op not in ("=", "!="):
+            return False
+        if not _PY_OPERATORS[op](actual, value):
+            return False
+    return True
+
+
+def apply_filters(records, projection, filters):
+    _check(filters)
+    return (record for record in records if matches(record, projection, filters))
+
+
+def project(record, projection):
+    return {output: record[source] for output, source in projection.items()}
@@ -0,0 +1,98 @@
+import io
+import logging
+from itertools import islice
+
+# Rows per COPY call; bounds the size of the in-memory COPY buffer
+COPY_CHUNK_SIZE = 50000
+
+TASK_COLUMNS = ["task_id", "title", "user_id", "completed"]
+
+TODO_METRICS_DDL = """
+    CREATE TABLE IF NOT EXISTS todo_metrics (
+        task_id INTEGER PRIMARY KEY,
+        title TEXT,
+        user_id INTEGER,
+        completed BOOLEAN
+    )
+"""
+
+
+# ==== BULK UPSERT INTO todo_metrics ====
+def _copy_value(value):
+    # COPY text format: \N is NULL, backslash escapes for the delimiters
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def _copy_chunk(cur, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row[column]) for column in TASK_COLUMNS))
+        buffer.write("\n")
+    buffer.seek(0)
+    cur.copy_expert(f"COPY todo_metrics_stage ({', '.join(TASK_COLUMNS)}) FROM STDIN", buffer)
+
+
+def create_stage(cur):
+    cur.execute("""
+        CREATE TEMP TABLE todo_metrics_stage (
+            seq BIGSERIAL,
+            task_id INTEGER,
+            title TEXT,
+            user_id INTEGER,
+            completed BOOLEAN
+        ) ON COMMIT DROP
+    """)
+
+
+def stage_tasks(cur, data, chunk_size=COPY_CHUNK_SIZE):
+    staged = 0
+    rows = iter(data)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        _copy_chunk(cur, chunk)
+        staged += len(chunk)
+    return staged
+
+
+def merge_stage(cur):
+    # Last occurrence of a task_id wins, same as the per-row upsert
+    cur.execute("""
+        WITH upserted AS (
+            INSERT INTO todo_metrics (task_id, title, user_id, completed)
+            SELECT DISTINCT ON (task_id) task_id, title, user_id, completed
+            FROM todo_metrics_stage
+            ORDER BY task_id, seq DESC
+            ON CONFLICT (task_id) DO UPDATE SET
+                title = EXCLUDED.title,
+                user_id = EXCLUDED.user_id,
+                completed = EXCLUDED.completed
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted)
+        FROM upserted
+    """)
+    inserted, updated = cur.fetchone()
+    return inserted, updated
+
+
+def copy_upsert_tasks(cur, data, chunk_size=COPY_CHUNK_SIZE):
+    # Stage every row with COPY, then merge with one set-based upsert.
+    # Returns (staged, inserted, updated); the caller owns the transaction.
+    create_stage(cur)
+    staged = stage_tasks(cur, data, chunk_size)
+    logging.info(f"Staged {staged} rows with COPY.")
+    inserted, updated = merge_stage(cur)
+    return staged, inserted, updated
+
+
+def delete_tasks(cur, task_ids):
+    # Returns the number of rows removed; the caller owns the transaction
+    if not task_ids:
+        return 0
+    cur.execute("DELETE FROM todo_metrics WHERE task_id = ANY(%s)", (list(task_ids),))
+    return cur.rowcount
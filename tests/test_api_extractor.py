@@ -0,0 +1,136 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import api_extractor
+from http_cache import ResponseCache
+
+TASKS = [{"id": i, "title": f"task {i}", "userId": i % 3, "completed": i % 2 == 0} for i in range(1, 24)]
+
+
+# ==== STUB SERVER ====
+# Serves TASKS as jsonplaceholder does (_page/_limit), with ETags. Every
+# request path first answers `fail_first` 503s; paging=False ignores the
+# paging parameters and always returns every task.
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        with server.lock:
+            server.requests.append(self.path)
+            attempts = server.attempts[self.path] = server.attempts.get(self.path, 0) + 1
+        if attempts <= server.fail_first:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+
+        query = parse_qs(url.query)
+        items = server.tasks
+        if server.paging and "_page" in query:
+            page, limit = int(query["_page"][0]), int(query["_limit"][0])
+            items = items[(page - 1) * limit:page * limit]
+        body = json.dumps(items).encode("utf-8")
+        etag = f'"{hash(body) & 0xFFFFFFFF:x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests, server.attempts = [], {}
+    server.tasks, server.fail_first, server.paging = TASKS, 0, True
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/todos"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(api_extractor, "BACKOFF_BASE", 0.001)
+
+
+# ==== TESTS ====
+def test_pages_are_joined_in_order(stub):
+    assert api_extractor.extract_json(stub.url, page_size=5) == TASKS
+
+
+def test_single_request_without_page_size(stub):
+    assert api_extractor.extract_json(stub.url) == TASKS
+    assert stub.requests == ["/todos"]
+
+
+def test_503_is_retried(stub):
+    stub.fail_first = 2
+    assert api_extractor.extract_json(stub.url, page_size=10) == TASKS
+    assert all(attempts == 3 for attempts in stub.attempts.values())
+
+
+def test_503_beyond_retries_raises(stub):
+    stub.fail_first = 5
+
+    async def fetch():
+        async with api_extractor._session(1) as session:
+            return await api_extractor.fetch_json(session, stub.url, retries=1)
+
+    with pytest.raises(api_extractor.RetryableStatus) as error:
+        asyncio.run(fetch())
+    assert error.value.status == 503
+    assert stub.attempts == {"/todos": 2}
+
+
+def test_304_serves_the_cached_body(stub, tmp_path):
+    first = ResponseCache(str(tmp_path), ttl=0)
+    assert api_extractor.extract_json(stub.url, page_size=10, cache=first) == TASKS
+    # Three pages plus the speculative ones fetched before the short page arrived
+    fetched = first.stats["fetched"]
+    assert fetched >= 3
+
+    second = ResponseCache(str(tmp_path), ttl=0)
+    assert api_extractor.extract_json(stub.url, page_size=10, cache=second) == TASKS
+    assert second.stats == {"fresh": 0, "not_modified": fetched, "fetched": 0}
+
+
+def test_fresh_cache_entries_skip_the_request(stub, tmp_path):
+    api_extractor.extract_json(stub.url, cache=ResponseCache(str(tmp_path), ttl=300))
+    cache = ResponseCache(str(tmp_path), ttl=300)
+    assert api_extractor.extract_json(stub.url, cache=cache) == TASKS
+    assert cache.stats["fresh"] == 1
+    assert len(stub.requests) == 1
+
+
+def test_endpoint_ignoring_paging_stops_at_the_repeated_page(stub):
+    stub.paging = False
+    assert api_extractor.extract_json(stub.url, page_size=5) == TASKS
+
+
+def test_max_pages_guard(stub):
+    # Every page is full and different, so no page is short or repeated
+    stub.tasks = TASKS * 100
+
+    async def walk():
+        return await api_extractor.fetch_pages(stub.url, page_size=1, max_pages=5)
+
+    with pytest.raises(RuntimeError, match="no short page within 5 pages"):
+        asyncio.run(walk())
+    assert len(stub.requests) == 5
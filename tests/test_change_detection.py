@@ -0,0 +1,55 @@
+import json
+
+from change_detection import CHANGE_COLUMN, ChangeIndex
+
+
+def task(task_id, title="t", completed=False):
+    return {"task_id": task_id, "title": title, "user_id": 1, "completed": completed}
+
+
+def first_load(path, rows):
+    index = ChangeIndex(str(path)).load()
+    index.changes(rows)
+    index.save()
+
+
+def test_only_inserted_and_updated_rows_are_returned(tmp_path):
+    path = tmp_path / "index.json"
+    first_load(path, [task(1), task(2), task(3)])
+
+    index = ChangeIndex(str(path)).load()
+    changed = index.changes([task(1), task(2, completed=True), task(4)])
+    assert [(row["task_id"], row[CHANGE_COLUMN]) for row in changed] == [(2, "update"), (4, "insert")]
+    assert index.deleted() == [3]
+    assert index.stats == {"inserted": 1, "updated": 1, "unchanged": 1, "deleted": 1}
+
+
+def test_rows_not_deleted_stay_in_the_index(tmp_path):
+    path = tmp_path / "index.json"
+    first_load(path, [task(1), task(2)])
+
+    index = ChangeIndex(str(path)).load()
+    index.changes([task(1)])
+    index.save(deletions_applied=False)
+    # Task 2 is still in the target table, so it must not come back as an insert
+    assert [key for key, _ in json.loads(path.read_text())["rows"]] == [1, 2]
+    assert ChangeIndex(str(path)).load().changes([task(1), task(2)]) == []
+
+
+def test_applied_deletions_are_dropped_from_the_index(tmp_path):
+    path = tmp_path / "index.json"
+    first_load(path, [task(1), task(2)])
+
+    index = ChangeIndex(str(path)).load()
+    index.changes([task(1)])
+    index.save(deletions_applied=True)
+    assert [key for key, _ in json.loads(path.read_text())["rows"]] == [1]
+    changed = ChangeIndex(str(path)).load().changes([task(1), task(2)])
+    assert [(row["task_id"], row[CHANGE_COLUMN]) for row in changed] == [(2, "insert")]
+
+
+def test_index_for_other_columns_is_ignored(tmp_path):
+    path = tmp_path / "index.json"
+    first_load(path, [task(1)])
+    index = ChangeIndex(str(path), columns=["task_id", "title"]).load()
+    assert index.previous == {}
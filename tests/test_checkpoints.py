@@ -0,0 +1,73 @@
+from contextlib import contextmanager
+
+from checkpoints import RunCheckpoints
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+
+    def execute(self, sql, params=None):
+        self.queries.append(params)
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class FakePool:
+    def __init__(self, rows=()):
+        self.cursor = FakeCursor(list(rows))
+
+    @contextmanager
+    def connection(self):
+        pool = self
+
+        class Conn:
+            def cursor(self):
+                return pool.cursor
+
+            def commit(self):
+                pass
+        yield Conn()
+
+
+class FakeWriter:
+    def __init__(self):
+        self.checkpoints = []
+
+    def add_checkpoint(self, run_id, phase, application_group):
+        self.checkpoints.append((run_id, phase, application_group))
+
+
+ROWS = [("g1", "PXQ", "pricing"), ("g2", "PXQ", "sla"), ("g3", "MATRIX", "pricing")]
+
+
+def test_a_new_run_does_not_read_checkpoints():
+    pool = FakePool([("pricing", "g1")])
+    checkpoints = RunCheckpoints(pool, FakeWriter(), "run").load()
+    assert pool.cursor.queries == []
+    assert checkpoints.pending("pricing", ROWS) == ROWS
+
+
+def test_resume_skips_groups_done_in_the_same_phase():
+    pool = FakePool([("pricing", "g1"), ("sla", "g2")])
+    checkpoints = RunCheckpoints(pool, FakeWriter(), "run", resume=True).load()
+    assert pool.cursor.queries == [("run",)]
+    assert checkpoints.pending("pricing", ROWS) == ROWS[1:]
+    assert checkpoints.pending("sla", ROWS) == [ROWS[0], ROWS[2]]
+    assert checkpoints.stats == {"resumed": 2, "skipped": 2, "completed": 0}
+
+
+def test_mark_done_queues_one_checkpoint_per_group_and_phase():
+    writer = FakeWriter()
+    checkpoints = RunCheckpoints(FakePool(), writer, "run").load()
+    checkpoints.mark_done("pricing", "g1")
+    checkpoints.mark_done("pricing", "g1")
+    checkpoints.mark_done("sla", "g1")
+    assert writer.checkpoints == [("run", "pricing", "g1"), ("run", "sla", "g1")]
+    assert checkpoints.pending("pricing", ROWS) == ROWS[1:]
+    assert checkpoints.stats["completed"] == 2
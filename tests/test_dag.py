@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from dag import Dag, DagError, Skip
+
+
+def quiet_dag(name="test"):
+    return Dag(name, log=lambda message: None, log_error=lambda message: None)
+
+
+# ==== TESTS ====
+def test_artifacts_flow_between_nodes():
+    dag = quiet_dag()
+    dag.add("split", lambda text: (text.upper(), len(text)), inputs=("text",), outputs=("upper", "length"))
+    dag.add("join", lambda upper, length: f"{upper}:{length}", inputs=("upper", "length"), outputs=("joined",))
+    result = dag.run({"text": "abc"})
+    assert result.ok
+    assert result.artifacts["joined"] == "ABC:3"
+
+
+def test_plan_groups_independent_nodes_in_one_level():
+    dag = quiet_dag()
+    dag.add("a", lambda: 1, outputs=("a",))
+    dag.add("b", lambda: 2, outputs=("b",))
+    dag.add("c", lambda a, b: a + b, inputs=("a", "b"), outputs=("c",))
+    assert [[node.name for node in level] for level in dag.plan()] == [["a", "b"], ["c"]]
+
+
+def test_missing_inputs_and_cycles_are_rejected():
+    dag = quiet_dag()
+    dag.add("a", lambda missing: missing, inputs=("missing",))
+    with pytest.raises(DagError, match="no node produces"):
+        dag.plan()
+
+    dag = quiet_dag()
+    dag.add("a", lambda b: b, inputs=("b",), outputs=("a",))
+    dag.add("b", lambda a: a, inputs=("a",), outputs=("b",))
+    with pytest.raises(DagError, match="Cycle"):
+        dag.plan()
+
+
+def test_failed_node_is_retried():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RuntimeError("transient")
+        return "done"
+
+    dag = quiet_dag()
+    dag.add("flaky", flaky, outputs=("value",), retries=2)
+    result = dag.run(retry_delay=0)
+    assert result.ok and result.artifacts["value"] == "done"
+    assert result.report["flaky"]["attempts"] == 3
+
+
+def test_failure_marks_dependents_upstream_failed():
+    def broken():
+        raise RuntimeError("boom")
+
+    dag = quiet_dag()
+    dag.add("broken", broken, outputs=("a",), retries=1)
+    dag.add("middle", lambda a: a, inputs=("a",), outputs=("b",))
+    dag.add("last", lambda b: b, inputs=("b",))
+    dag.add("other", lambda: "fine", outputs=("c",))
+    result = dag.run(retry_delay=0)
+    assert not result.ok
+    assert result.report["broken"]["status"] == "failed"
+    assert result.report["broken"]["attempts"] == 2
+    assert "boom" in result.report["broken"]["error"]
+    assert result.status("middle") == result.status("last") == "upstream_failed"
+    assert result.status("other") == "ok"
+
+
+def test_skip_ends_the_branch_without_failing_the_run():
+    def unchanged():
+        raise Skip("payload unchanged")
+
+    dag = quiet_dag()
+    dag.add("check", unchanged, outputs=("payload",))
+    dag.add("load", lambda payload: payload, inputs=("payload",))
+    result = dag.run()
+    assert result.ok
+    assert result.status("check") == result.status("load") == "skipped"
+
+
+def test_nodes_sharing_a_resource_never_overlap():
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def work():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+
+    dag = quiet_dag()
+    for name in "abc":
+        dag.add(name, work, resources=("source",))
+    assert dag.run(max_workers=3).ok
+    assert peak[0] == 1
+
+
+def test_nodes_without_shared_resources_overlap():
+    barrier = threading.Barrier(2, timeout=5)
+    dag = quiet_dag()
+    dag.add("a", barrier.wait)
+    dag.add("b", barrier.wait)
+    assert dag.run(max_workers=2).ok
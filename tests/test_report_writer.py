@@ -0,0 +1,73 @@
+import pytest
+
+from report_writer import DAILY_COLUMNS, ReportWriter
+
+
+class RecordingWriter(ReportWriter):
+    # Keeps what each flush would upsert instead of writing it; fail_next
+    # makes the next write raise as a lost connection would
+    def __init__(self, batch_size=0):
+        super().__init__(pool=None, batch_size=batch_size)
+        self.writes = []
+        self.fail_next = False
+
+    def _write(self, buffers, checkpoints, count):
+        if self.fail_next:
+            self.fail_next = False
+            raise RuntimeError("connection lost")
+        self.writes.append(({table: dict(rows) for (table, _), rows in buffers.items()}, list(checkpoints)))
+
+
+def test_rows_for_the_same_key_are_summed():
+    writer = RecordingWriter()
+    writer.add("daily_table", DAILY_COLUMNS, ("g1", "2024-01-01", 1.5))
+    writer.add("daily_table", DAILY_COLUMNS, ("g1", "2024-01-01", 2.0))
+    writer.add("daily_table", DAILY_COLUMNS, ("g2", "2024-01-01", 4.0))
+    assert writer.flush() == 2
+    assert writer.writes == [({"daily_table": {("g1", "2024-01-01"): 3.5, ("g2", "2024-01-01"): 4.0}}, [])]
+
+
+def test_a_key_split_across_batches_is_upserted_with_its_running_total():
+    writer = RecordingWriter(batch_size=1)
+    writer.add("daily_table", DAILY_COLUMNS, ("g1", "2024-01-01", 1.0))
+    writer.add("daily_table", DAILY_COLUMNS, ("g1", "2024-01-01", 2.0))
+    assert [rows["daily_table"] for rows, _ in writer.writes] == [
+        {("g1", "2024-01-01"): 1.0},
+        {("g1", "2024-01-01"): 3.0},
+    ]
+
+
+def test_close_starts_new_running_totals():
+    writer = RecordingWriter()
+    writer.add("daily_table", DAILY_COLUMNS, ("g1", "2024-01-01", 1.0))
+    writer.close()
+    writer.add("daily_table", DAILY_COLUMNS, ("g1", "2024-01-01", 1.0))
+    writer.flush()
+    assert writer.writes[-1][0] == {"daily_table": {("g1", "2024-01-01"): 1.0}}
+
+
+def test_failed_flush_restores_rows_and_checkpoints():
+    writer = RecordingWriter()
+    writer.add("daily_table", DAILY_COLUMNS, ("g1", "2024-01-01", 1.0))
+    writer.add_checkpoint("run", "pricing", "g1")
+    writer.fail_next = True
+    with pytest.raises(RuntimeError, match="connection lost"):
+        writer.flush()
+    assert writer.stats["rows"] == 0
+
+    assert writer.flush() == 1
+    assert writer.writes == [({"daily_table": {("g1", "2024-01-01"): 1.0}}, [("run", "pricing", "g1")])]
+    assert writer.stats["checkpoints"] == 1
+
+
+def test_restore_keeps_the_newer_total_of_a_key_queued_since():
+    writer = RecordingWriter()
+    writer.add("daily_table", DAILY_COLUMNS, ("g1", "2024-01-01", 1.0))
+    buffers, checkpoints = writer._buffers, writer._checkpoints
+    writer._buffers, writer._checkpoints, writer._buffered = {}, [], 0
+    # Queued while the failed batch was being written
+    writer.add("daily_table", DAILY_COLUMNS, ("g1", "2024-01-01", 2.0))
+    writer._restore(buffers, checkpoints)
+
+    assert writer.flush() == 1
+    assert writer.writes[-1][0] == {"daily_table": {("g1", "2024-01-01"): 3.0}}
@@ -0,0 +1,15 @@
+from result_cache import normalize_query
+
+
+def test_whitespace_and_trailing_semicolon_are_ignored():
+    assert normalize_query("  SELECT a,\n\tb  FROM t ;\n") == "SELECT a, b FROM t"
+
+
+def test_whitespace_inside_quotes_is_kept():
+    assert normalize_query("SELECT * FROM t WHERE name = 'a  b'") != \
+        normalize_query("SELECT * FROM t WHERE name = 'a b'")
+    assert normalize_query('SELECT "my  col" FROM t') == 'SELECT "my  col" FROM t'
+
+
+def test_escaped_quotes_stay_inside_the_literal():
+    assert normalize_query("SELECT 'it''s  here'   FROM t") == "SELECT 'it''s  here' FROM t"
@@ -0,0 +1,31 @@
+import pytest
+
+from sharding import in_shard, parse_shard, shard_of
+
+GROUPS = [f"group_{i}" for i in range(200)]
+
+
+def test_shard_of_is_stable():
+    # crc32, unlike hash(), is the same in every interpreter and on every
+    # host; pinned values catch a change that would move groups between shards
+    assert [shard_of(group, 4) for group in ("app_a", "app_b", "app_c")] == [1, 3, 1]
+    assert shard_of("app_a", 1) == 0
+    assert shard_of(42, 4) == shard_of("42", 4)
+
+
+def test_every_group_is_in_exactly_one_shard():
+    for group in GROUPS:
+        assert sum(in_shard(group, (i, 4)) for i in range(4)) == 1
+    assert all(in_shard(group, None) for group in GROUPS)
+
+
+def test_groups_spread_over_the_shards():
+    counts = [sum(shard_of(group, 4) == i for group in GROUPS) for i in range(4)]
+    assert min(counts) > 25
+
+
+def test_parse_shard():
+    assert parse_shard("1/4") == (1, 4)
+    for spec in ("4/4", "-1/4", "1/0", "1-4"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
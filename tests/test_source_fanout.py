@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+
+from source_fanout import SourceFanout
+
+
+def chunks_of(name, count):
+    for i in range(count):
+        yield [(name, i)]
+
+
+def failing(name):
+    yield [(name, 0)]
+    raise RuntimeError(f"{name} failed")
+
+
+@pytest.fixture
+def fanout():
+    fanout = SourceFanout(max_workers=4, max_per_path=2, max_buffered_chunks=1)
+    yield fanout
+    fanout.shutdown()
+
+
+def run_within(target, timeout=10):
+    # Runs target in a thread and fails instead of hanging on a deadlock
+    errors = []
+
+    def run():
+        try:
+            target()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "fan-out deadlocked"
+    if errors:
+        raise errors[0]
+
+
+# ==== TESTS ====
+def test_streams_are_yielded_in_job_order(fanout):
+    jobs = [(name, f"path{i % 2}", chunks_of, (name, 3)) for i, name in enumerate("abcde")]
+    seen = [(tag, [row for chunk in chunks for row in chunk]) for tag, chunks in fanout.stream_ordered(jobs)]
+    assert seen == [(name, [(name, i) for i in range(3)]) for name in "abcde"]
+
+
+def test_job_errors_are_raised_to_the_consumer(fanout):
+    jobs = [("bad", "path", failing, ("bad",)), ("good", "path", chunks_of, ("good", 2))]
+    results = {}
+    for tag, chunks in fanout.stream_ordered(jobs):
+        try:
+            results[tag] = [row for chunk in chunks for row in chunk]
+        except RuntimeError as e:
+            results[tag] = str(e)
+    assert results == {"bad": "bad failed", "good": [("good", 0), ("good", 1)]}
+
+
+def test_abandoned_stream_gives_its_slot_back():
+    # Regression: the consumer fails on the first chunk of every job, so each
+    # job is left with chunks it will never read. With one slot per path the
+    # next job on the same path used to wait on that slot forever.
+    fanout = SourceFanout(max_workers=2, max_per_path=1, max_buffered_chunks=1)
+    jobs = [(i, "path", chunks_of, (i, 50)) for i in range(4)]
+    failed = []
+
+    def consume():
+        for tag, chunks in fanout.stream_ordered(jobs):
+            try:
+                for chunk in chunks:
+                    raise ValueError("report failed")
+            except ValueError:
+                chunks.close()
+                failed.append(tag)
+
+    try:
+        run_within(consume)
+    finally:
+        fanout.shutdown()
+    assert failed == [0, 1, 2, 3]
+
+
+def test_moving_on_without_close_cancels_the_stream():
+    fanout = SourceFanout(max_workers=2, max_per_path=1, max_buffered_chunks=1)
+    jobs = [(i, "path", chunks_of, (i, 50)) for i in range(3)]
+    firsts = []
+
+    def consume():
+        for tag, chunks in fanout.stream_ordered(jobs):
+            firsts.append(next(iter(chunks)))
+
+    try:
+        run_within(consume)
+    finally:
+        fanout.shutdown()
+    assert firsts == [[(0, 0)], [(1, 0)], [(2, 0)]]
+
+
+def test_concurrent_consumers_share_paths_without_deadlock(fanout):
+    # Two consumers with interleaved jobs on the same paths, each slow enough
+    # that jobs started ahead fill their chunk queues
+    def consumer(prefix, results):
+        def consume():
+            jobs = [(f"{prefix}{i}", f"path{i % 2}", chunks_of, (f"{prefix}{i}", 5)) for i in range(6)]
+            for tag, chunks in fanout.stream_ordered(jobs):
+                for chunk in chunks:
+                    time.sleep(0.001)
+                    results.append(chunk[0])
+        return consume
+
+    pxq, sla = [], []
+    threads = [threading.Thread(target=consumer(prefix, results), daemon=True)
+               for prefix, results in (("p", pxq), ("s", sla))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert not any(thread.is_alive() for thread in threads), "fan-out deadlocked"
+    assert pxq == [(f"p{i}", n) for i in range(6) for n in range(5)]
+    assert sla == [(f"s{i}", n) for i in range(6) for n in range(5)]
+
+
+def test_per_path_limit_is_respected():
+    fanout = SourceFanout(max_workers=6, max_per_path=2, max_buffered_chunks=1)
+    lock = threading.Lock()
+    active, peak = [0], [0]
+
+    def tracked(name):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            for i in range(3):
+                time.sleep(0.005)
+                yield [(name, i)]
+        finally:
+            with lock:
+                active[0] -= 1
+
+    jobs = [(i, "path", tracked, (i,)) for i in range(6)]
+
+    def consume():
+        for _, chunks in fanout.stream_ordered(jobs):
+            list(chunks)
+
+    try:
+        run_within(consume)
+    finally:
+        fanout.shutdown()
+    assert 1 <= peak[0] <= 2
@@ -0,0 +1,40 @@
+import pytest
+
+from task_filters import apply_filters, compile_select
+
+PROJECTION = {"task_id": "id", "title": "title", "done": "completed"}
+
+
+def test_projection_without_filters():
+    assert compile_select("source_tasks", PROJECTION, []) == ("SELECT id, title, completed FROM source_tasks", [])
+
+
+def test_filters_use_source_columns_and_parameters():
+    sql, params = compile_select("source_tasks", PROJECTION, [("done", "=", True), ("task_id", ">=", 10)])
+    assert sql == "SELECT id, title, completed FROM source_tasks WHERE completed = %s AND id >= %s"
+    assert params == [True, 10]
+
+
+def test_null_not_equal_and_in_filters():
+    sql, params = compile_select("t", {"a": "a"}, [("a", "=", None), ("a", "!=", 3), ("a", "in", (1, 2))])
+    assert sql == "SELECT a FROM t WHERE a IS NULL AND a IS DISTINCT FROM %s AND a = ANY(%s)"
+    assert params == [3, [1, 2]]
+
+
+def test_extra_columns_and_where_clauses_come_last():
+    sql, params = compile_select("t", {"a": "a"}, [("a", ">", 1)], extra_columns=("id",),
+                                 extra_where=[("id > %s", [5])])
+    assert sql == "SELECT a, id FROM t WHERE a > %s AND id > %s"
+    assert params == [1, 5]
+
+
+def test_unsupported_operator_is_rejected():
+    with pytest.raises(ValueError, match="Unsupported filter operator 'like'"):
+        compile_select("t", {"a": "a"}, [("a", "like", "x%")])
+
+
+def test_python_filters_agree_with_sql_on_nulls():
+    # SQL drops NULLs for comparisons but keeps them for IS DISTINCT FROM
+    records = [{"a": None}, {"a": 1}, {"a": 3}]
+    assert list(apply_filters(records, {"a": "a"}, [("a", ">", 0)])) == [{"a": 1}, {"a": 3}]
+    assert list(apply_filters(records, {"a": "a"}, [("a", "!=", 3)])) == [{"a": None}, {"a": 1}]
@@ -1,13 +1,43 @@
-import requests
+import argparse
 import csv
-import psycopg2r
+import json
+import psycopg2
 import logging
 import os
+import sys
+import time
 from datetime import datetime
+from task_filters import apply_filters, project
+from api_extractor import extract_json
+from streaming import CHUNK_SIZE, CsvSink, PostgresSink, chunked, run_streaming
+from run_metrics import current_run, finish_run, start_run, timed_stage
+from task_loader import TASK_COLUMNS, copy_upsert_tasks, delete_tasks
+from columnar_output import ParquetSink, partition_path, write_parquet
+from etl_logging import LOG_FORMAT, LOG_FORMATS, Progress, log_progress, setup_logging
+from change_detection import DELTA_COLUMNS, ChangeIndex, deletion_rows
+from http_cache import ResponseCache, payload_hash
+from dag import Dag, Skip, load_timings
 
 # ==== CONFIG ====
 API_URL = "https://jsonplaceholder.typicode.com/todos"
+API_PAGE_SIZE = 50  # rows per page fetched concurrently; None for a single request
 COMPLETION_THRESHOLD = False  # Change as needed
+LOAD_METHOD = "copy"  # "copy" for the bulk staged upsert, "row" for the per-row fallback
+# Extra attempts for a failed API extract / PostgreSQL load, with growing delays
+EXTRACT_RETRIES = 1
+LOAD_RETRIES = 1
+OUTPUT_FORMAT = "csv"  # file output: "csv", "parquet" (needs pyarrow) or "both"
+# The API has no timestamps: compare row hashes with the last load and send
+# only inserted and changed rows (--full-refresh reloads everything)
+CHANGE_DETECTION = True
+# Keep API responses on disk and revalidate them with ETag / Last-Modified
+# (see http_cache); an unchanged payload skips transform and load entirely
+HTTP_CACHE = True
+
+# Transform spec: output field -> API field, plus the row filters.
+# The API cannot filter server-side, so these always run in Python.
+TASK_PROJECTION = {"task_id": "id", "title": "title", "user_id": "userId", "completed": "completed"}
+TASK_FILTERS = [("completed", "=", COMPLETION_THRESHOLD)]
 
 DB_CONFIG = {
     "host": "localhost",
@@ -19,82 +49,114 @@ DB_CONFIG = {
 # Create output directory if it doesn't exist
 OUTPUT_DIR = "output"
 LOG_DIR = "logs"
+STATE_DIR = "state"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(LOG_DIR, exist_ok=True)
 
 # Generate timestamp
 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 CSV_FILE = os.path.join(OUTPUT_DIR, f"filtered_tasks_{timestamp}.csv")
+DELTA_CSV_FILE = os.path.join(OUTPUT_DIR, f"filtered_tasks_delta_{timestamp}.csv")
+CHANGE_INDEX_FILE = os.path.join(STATE_DIR, "testwithapi_task_hashes.json")
+PAYLOAD_STATE_FILE = os.path.join(STATE_DIR, "testwithapi_payload.json")
+PARQUET_FILE = partition_path(os.path.join(OUTPUT_DIR, "filtered_tasks"),
+                              f"filtered_tasks_{timestamp}.parquet")
+# Delta files get their own dataset so snapshot readers never pick them up
+DELTA_PARQUET_FILE = partition_path(os.path.join(OUTPUT_DIR, "filtered_tasks_delta"),
+                                    f"filtered_tasks_delta_{timestamp}.parquet")
 RUN_LOG_FILE = os.path.join(LOG_DIR, f"etl_run_{timestamp}.log")
+RUN_MANIFEST_FILE = os.path.join(LOG_DIR, f"etl_run_{timestamp}.manifest.json")
 GENERAL_LOG_FILE = os.path.join(LOG_DIR, "etl_pipeline.log")
 
 # ==== SETUP LOGGING ====
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-# Clear existing handlers if rerunning
-if logger.hasHandlers():
-    logger.handlers.clear()
-
-# File handler for per-run logs
-run_handler = logging.FileHandler(RUN_LOG_FILE)
-run_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
-logger.addHandler(run_handler)
-
-# File handler for general log
-general_handler = logging.FileHandler(GENERAL_LOG_FILE)
-general_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
-logger.addHandler(general_handler)
-
-# Console output (optional)
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter('%(message)s'))
-logger.addHandler(console_handler)
+# Per-run log, shared etl_pipeline.log and console, written from a background
+# thread (see etl_logging); ETL_LOG_FORMAT=json or --log-format json for JSON lines
+LOG_FILES = [RUN_LOG_FILE, GENERAL_LOG_FILE]
+setup_logging(LOG_FILES)
 
 # ==== EXTRACT ====
-def extract_tasks():
+@timed_stage("extract_tasks", rows_in=lambda args: None)
+def extract_tasks(cache=None):
     logging.info("Extracting tasks from API...")
     try:
-        response = requests.get(API_URL)
-        response.raise_for_status()
-        tasks = response.json()
+        tasks = extract_json(API_URL, page_size=API_PAGE_SIZE, cache=cache)
         logging.info(f"Extracted {len(tasks)} tasks.")
         return tasks
     except Exception as e:
-        logging.error(f"Extraction failed: {e}")
-        return []
+        logging.error(f"Extraction failed: {e!r}")
+        raise
+
+# ==== PAYLOAD STATE ====
+# Hash of the last API payload that was loaded successfully
+def read_loaded_payload():
+    try:
+        with open(PAYLOAD_STATE_FILE, encoding="utf-8") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return state.get("payload_hash") if state.get("url") == API_URL else None
+
+def save_loaded_payload(digest):
+    os.makedirs(os.path.dirname(PAYLOAD_STATE_FILE), exist_ok=True)
+    with open(PAYLOAD_STATE_FILE, "w", encoding="utf-8") as file:
+        json.dump({"url": API_URL, "payload_hash": digest,
+                   "loaded_at": datetime.now().isoformat(timespec="seconds")}, file)
 
 # ==== TRANSFORM ====
-def transform_tasks(tasks):
+def transform_chunk(tasks, filters_pushed_down=False):
+    if not filters_pushed_down:
+        tasks = apply_filters(tasks, TASK_PROJECTION, TASK_FILTERS)
+    return [project(task, TASK_PROJECTION) for task in tasks]
+
+@timed_stage("transform_tasks")
+def transform_tasks(tasks, filters_pushed_down=False):
     logging.info("Transforming tasks with completion threshold...")
-    filtered = []
-    for task in tasks:
-        if task["completed"] == COMPLETION_THRESHOLD:
-            transformed_task = {
-                "task_id": task["id"],
-                "title": task["title"],
-                "user_id": task["userId"],
-                "completed": task["completed"]
-            }
-            filtered.append(transformed_task)
+    filtered = transform_chunk(tasks, filters_pushed_down)
     logging.info(f"{len(filtered)} tasks passed the threshold filter.")
     return filtered
 
 # ==== LOAD TO CSV ====
-def load_to_csv(data):
-    logging.info(f"Saving filtered tasks to CSV at {CSV_FILE}...")
+@timed_stage("load_to_csv", rows_out=lambda ok, args: len(args[0]) if ok else 0, succeeded=bool)
+def load_to_csv(data, path=None, fieldnames=TASK_COLUMNS):
+    path = path or CSV_FILE
+    logging.info(f"Saving filtered tasks to CSV at {path}...")
     try:
-        with open(CSV_FILE, mode='w', newline='', encoding='utf-8') as file:
-            writer = csv.DictWriter(file, fieldnames=["task_id", "title", "user_id", "completed"])
+        with open(path, mode='w', newline='', encoding='utf-8') as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
             writer.writeheader()
             for row in data:
                 writer.writerow(row)
         logging.info("CSV write completed.")
+        return True
     except Exception as e:
         logging.error(f"Failed to write CSV: {e}")
+        return False
+
+# ==== LOAD TO PARQUET ====
+@timed_stage("load_to_parquet", rows_out=lambda ok, args: len(args[0]) if ok else 0, succeeded=bool)
+def load_to_parquet(data, path=None, columns=TASK_COLUMNS):
+    try:
+        write_parquet(data, path or PARQUET_FILE, columns=columns)
+        return True
+    except Exception as e:
+        logging.error(f"Failed to write Parquet: {e}")
+        return False
+
+def file_sinks(output_format, changes=None, deletions=None):
+    # With change detection the files are deltas: changed rows plus a change column
+    sinks = []
+    delta_deletions = deletions and (lambda: deletion_rows(deletions()))
+    if output_format in ("csv", "both"):
+        sinks.append(CsvSink(CSV_FILE) if changes is None else
+                     CsvSink(DELTA_CSV_FILE, DELTA_COLUMNS, deletions=delta_deletions))
+    if output_format in ("parquet", "both"):
+        sinks.append(ParquetSink(PARQUET_FILE) if changes is None else
+                     ParquetSink(DELTA_PARQUET_FILE, DELTA_COLUMNS, deletions=delta_deletions))
+    return sinks
 
 # ==== LOAD TO POSTGRESQL ====
-def load_to_postgres(data):
+@timed_stage("load_to_postgres", rows_out=lambda ok, args: len(args[0]) if ok else 0, succeeded=bool)
+def load_to_postgres(data, method=LOAD_METHOD, deleted=()):
     logging.info("Loading data into PostgreSQL...")
     try:
         conn = psycopg2.connect(**DB_CONFIG)
@@ -109,30 +171,164 @@ def load_to_postgres(data):
             )
         """)
 
-        for row in data:
-            cur.execute("""
-        INSERT INTO todo_metrics (task_id, title, user_id, completed)
-        VALUES (%s, %s, %s, %s)
-        ON CONFLICT (task_id) DO UPDATE SET
-            title = EXCLUDED.title,
-            user_id = EXCLUDED.user_id,
-            completed = EXCLUDED.completed
-    """, (row["task_id"], row["title"], row["user_id"], row["completed"]))
-            
+        started = time.perf_counter()
+        if method == "copy":
+            staged, inserted, updated = copy_upsert_tasks(cur, data)
+            logging.info(f"Merged {staged} staged rows: {inserted} inserted, {updated} updated.")
+        else:
+            # The per-row upsert can run for minutes; report progress periodically
+            progress = Progress("Upserted rows", emit=log_progress)
+            for row in data:
+                progress.add()
+                cur.execute("""
+            INSERT INTO todo_metrics (task_id, title, user_id, completed)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (task_id) DO UPDATE SET
+                title = EXCLUDED.title,
+                user_id = EXCLUDED.user_id,
+                completed = EXCLUDED.completed
+        """, (row["task_id"], row["title"], row["user_id"], row["completed"]))
+            progress.close()
+        if deleted:
+            logging.info(f"Deleted {delete_tasks(cur, deleted)} tasks no longer returned by the API.")
 
         conn.commit()
         cur.close()
         conn.close()
-        logging.info("Data loaded into PostgreSQL successfully.")
+        logging.info(f"Data loaded into PostgreSQL successfully ({method} load, "
+                     f"{time.perf_counter() - started:.2f}s).")
+        return True
     except Exception as e:
         logging.error(f"PostgreSQL load failed: {e}")
+        return False
+
+# ==== PIPELINE DAG ====
+# extract -> payload check -> transform -> CSV / Parquet / PostgreSQL loads in
+# parallel -> save state. An unchanged payload ends the run after the check.
+def etl_dag(args, http_cache=None, changes=None):
+    dag = Dag("testwithapi")
+    deletions = changes.deleted if changes and args.deletions else None
+
+    def check_payload(raw_tasks):
+        # The transform spec and --deletions are part of the hash: changing
+        # either must reload, or a first --deletions run would be skipped
+        digest = payload_hash([TASK_PROJECTION, TASK_FILTERS, bool(args.deletions), raw_tasks])
+        if not args.full_refresh and digest == read_loaded_payload():
+            current_run().extra["payload_unchanged"] = True
+            raise Skip("API payload unchanged since the last successful load; transform and load skipped.")
+        return digest
+
+    def record_changes():
+        if changes:
+            current_run().extra["changes"] = changes.log_stats()
+
+    def stream_load(raw_tasks, digest):
+        transform = transform_chunk if changes is None else \
+            (lambda chunk: changes.changes(transform_chunk(chunk)))
+        errors = run_streaming(chunked(raw_tasks, args.chunk_size), transform,
+                               file_sinks(args.format, changes, deletions)
+                               + [PostgresSink(DB_CONFIG, deletions=deletions)],
+                               extract_stage="extract_tasks")
+        record_changes()
+        if errors:
+            raise RuntimeError(f"Streaming load failed: {errors}")
+        return True
+
+    def transform(raw_tasks, digest):
+        tasks, deleted = transform_tasks(raw_tasks), []
+        if changes:
+            tasks = changes.changes(tasks)
+            deleted = deletions() if deletions else []
+            record_changes()
+        return tasks, deleted
+
+    def write_csv(tasks, deleted):
+        if changes:
+            return load_to_csv(tasks + deletion_rows(deleted), DELTA_CSV_FILE, DELTA_COLUMNS)
+        return load_to_csv(tasks)
+
+    def write_parquet_file(tasks, deleted):
+        if changes:
+            return load_to_parquet(tasks + deletion_rows(deleted), DELTA_PARQUET_FILE, DELTA_COLUMNS)
+        return load_to_parquet(tasks)
+
+    def load_postgres(tasks, deleted):
+        # Raising lets the DAG retry the load
+        if not load_to_postgres(tasks, LOAD_METHOD, deleted):
+            raise RuntimeError("PostgreSQL load failed")
+        return True
+
+    def save_state(loaded, digest):
+        # The index and payload hash only move forward once todo_metrics holds the rows
+        if changes:
+            changes.save(deletions_applied=bool(deletions))
+        save_loaded_payload(digest)
+
+    dag.add("extract_tasks", lambda: extract_tasks(http_cache), outputs=("raw_tasks",), retries=EXTRACT_RETRIES)
+    dag.add("check_payload", check_payload, inputs=("raw_tasks",), outputs=("digest",))
+    if args.streaming:
+        dag.add("stream_load", stream_load, inputs=("raw_tasks", "digest"), outputs=("loaded",))
+    else:
+        dag.add("transform_tasks", transform, inputs=("raw_tasks", "digest"), outputs=("tasks", "deleted"))
+        # A failed file write is logged but does not fail the run, as before
+        if args.format in ("csv", "both"):
+            dag.add("load_to_csv", write_csv, inputs=("tasks", "deleted"))
+        if args.format in ("parquet", "both"):
+            dag.add("load_to_parquet", write_parquet_file, inputs=("tasks", "deleted"))
+        dag.add("load_to_postgres", load_postgres, inputs=("tasks", "deleted"), outputs=("loaded",),
+                retries=LOAD_RETRIES)
+    dag.add("save_state", save_state, inputs=("loaded", "digest"))
+    return dag
 
 # ==== RUN ETL ====
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API -> todo_metrics ETL")
+    parser.add_argument("--streaming", action="store_true",
+                        help="pass fixed-size chunks through transform and both loads concurrently")
+    parser.add_argument("--format", choices=["csv", "parquet", "both"], default=OUTPUT_FORMAT,
+                        help=f"file output written next to the PostgreSQL load (default {OUTPUT_FORMAT})")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help=f"rows per chunk in streaming mode (default {CHUNK_SIZE})")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="ignore the change index: load every row and rebuild the index")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="ignore cached API responses and download everything again")
+    parser.add_argument("--deletions", action="store_true",
+                        help="delete tasks from todo_metrics that the API no longer returns")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default=LOG_FORMAT,
+                        help=f"log record format, json for JSON lines (default {LOG_FORMAT})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the stage plan with timings from earlier runs and exit")
+    args = parser.parse_args()
+    if args.log_format != LOG_FORMAT:
+        setup_logging(LOG_FILES, args.log_format)
+    if args.dry_run:
+        etl_dag(args).dry_run(
+            load_timings(os.path.join(LOG_DIR, "etl_run_*.manifest.json"), "testwithapi"))
+        sys.exit(0)
+
     logging.info(f"===== ETL Run Started at {timestamp} =====")
-    raw_tasks = extract_tasks()
-    transformed_tasks = transform_tasks(raw_tasks)
-    load_to_csv(transformed_tasks)
-    load_to_postgres(transformed_tasks)
-    logging.info("ETL pipeline completed successfully.")
+    run = start_run("testwithapi", timestamp, RUN_MANIFEST_FILE)
+    http_cache = ResponseCache(refresh=args.refresh_cache) if HTTP_CACHE else None
+    changes = None
+    if CHANGE_DETECTION:
+        changes = ChangeIndex(CHANGE_INDEX_FILE)
+        if not args.full_refresh:
+            changes.load()
+    try:
+        result = etl_dag(args, http_cache, changes).run()
+        if http_cache:
+            run.extra["http_cache"] = http_cache.log_stats()
+        if result.status("extract_tasks") != "ok":
+            # Loading an empty extract would only produce an empty CSV and hide the failure
+            logging.error("ETL pipeline aborted: extraction failed, transform and load skipped.")
+            sys.exit(1)
+        if not result.ok:
+            failed = [name for name, entry in result.report.items() if entry["status"] == "failed"]
+            logging.error(f"ETL pipeline failed at {', '.join(failed)}.")
+            sys.exit(1)
+        logging.info("ETL pipeline completed successfully.")
+    finally:
+        finish_run()
+        logging.info(f"Run manifest written to {RUN_MANIFEST_FILE}")
     logging.info("=============================================")
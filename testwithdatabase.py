@@ -1,11 +1,37 @@
+import argparse
 import csv
 import psycopg2
 import logging
 import os
+import sys
+import time
 from datetime import datetime
+from task_filters import apply_filters, compile_select, project
+from streaming import CHUNK_SIZE, CsvSink, PostgresSink, run_streaming
+from run_metrics import finish_run, start_run, timed_stage
+from task_loader import copy_upsert_tasks
+from columnar_output import ParquetSink, partition_path, write_parquet
+from etl_logging import LOG_FORMAT, LOG_FORMATS, Progress, log_progress, setup_logging
+from dag import Dag, load_timings
 
 # ==== CONFIG ====
 COMPLETION_THRESHOLD = True  # Change to True if you want only completed tasks
+LOAD_METHOD = "copy"  # "copy" for the bulk staged upsert, "row" for the per-row fallback
+# Extra attempts for a failed watermark read / PostgreSQL load, with growing delays
+READ_RETRIES = 1
+LOAD_RETRIES = 1
+OUTPUT_FORMAT = "csv"  # file output: "csv", "parquet" (needs pyarrow) or "both"
+
+# Incremental extraction: only rows past the stored high-water mark are read.
+# "id" only sees new rows; set an update timestamp column or "xmin" to also pick up updates.
+WATERMARK_SOURCE = "source_tasks"
+WATERMARK_COLUMN = "id"
+
+# Transform spec: output field -> source_tasks column, plus the row filters.
+# extract_tasks_from_db compiles both into its SELECT so rejected rows and
+# unused columns never leave the database.
+TASK_PROJECTION = {"task_id": "id", "title": "title", "user_id": "user_Id", "completed": "completed"}
+TASK_FILTERS = [("completed", "=", COMPLETION_THRESHOLD)]
 
 DB_CONFIG = {
     "host": "localhost",
@@ -23,71 +49,139 @@ os.makedirs(LOG_DIR, exist_ok=True)
 # Generate timestamp
 timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 CSV_FILE = os.path.join(OUTPUT_DIR, f"filtered_tasks_{timestamp}.csv")
+PARQUET_FILE = partition_path(os.path.join(OUTPUT_DIR, "filtered_tasks"),
+                              f"filtered_tasks_{timestamp}.parquet")
 RUN_LOG_FILE = os.path.join(LOG_DIR, f"etl_run_{timestamp}.log")
+RUN_MANIFEST_FILE = os.path.join(LOG_DIR, f"etl_run_{timestamp}.manifest.json")
 GENERAL_LOG_FILE = os.path.join(LOG_DIR, "etl_pipeline.log")
 
 # ==== SETUP LOGGING ====
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# Per-run log, shared etl_pipeline.log and console, written from a background
+# thread (see etl_logging); ETL_LOG_FORMAT=json or --log-format json for JSON lines
+LOG_FILES = [RUN_LOG_FILE, GENERAL_LOG_FILE]
+setup_logging(LOG_FILES)
 
-# Clear existing handlers
-if logger.hasHandlers():
-    logger.handlers.clear()
+# ==== WATERMARK STATE ====
+def watermark_expression(column):
+    # xmin is a system column of type xid; cast it so it can be compared and stored
+    return "xmin::text::bigint" if column == "xmin" else column
 
-# Add log handlers
-run_handler = logging.FileHandler(RUN_LOG_FILE)
-run_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
-logger.addHandler(run_handler)
+def read_watermark(source=WATERMARK_SOURCE, column=WATERMARK_COLUMN):
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS etl_watermarks (
+            source_name TEXT PRIMARY KEY,
+            watermark_column TEXT NOT NULL,
+            watermark_value TEXT,
+            updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+        )
+    """)
+    cur.execute("""
+        SELECT watermark_column, watermark_value FROM etl_watermarks
+        WHERE source_name = %s
+    """, (source,))
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    conn.close()
 
-general_handler = logging.FileHandler(GENERAL_LOG_FILE)
-general_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
-logger.addHandler(general_handler)
+    if not row:
+        return None
+    stored_column, value = row
+    if stored_column != column:
+        logging.warning(f"Stored watermark for {source} is on `{stored_column}`, not `{column}`; "
+                        f"ignoring it and running a full extract.")
+        return None
+    return value
 
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(logging.Formatter('%(message)s'))
-logger.addHandler(console_handler)
+def save_watermark(value, source=WATERMARK_SOURCE, column=WATERMARK_COLUMN):
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO etl_watermarks (source_name, watermark_column, watermark_value, updated_at)
+        VALUES (%s, %s, %s, NOW())
+        ON CONFLICT (source_name) DO UPDATE SET
+            watermark_column = EXCLUDED.watermark_column,
+            watermark_value = EXCLUDED.watermark_value,
+            updated_at = EXCLUDED.updated_at
+    """, (source, column, str(value)))
+    conn.commit()
+    cur.close()
+    conn.close()
+    logging.info(f"Saved watermark for {source}: {column} = {value}")
 
 # ==== EXTRACT from PostgreSQL ====
-def extract_tasks_from_db():
-    logging.info("Extracting tasks from PostgreSQL table `source_tasks`...")
+def iter_tasks_from_db(since=None, watermark_column=WATERMARK_COLUMN, pushdown=True,
+                       chunk_size=CHUNK_SIZE, state=None):
+    # Yields chunks of task dicts through a server-side cursor. The highest
+    # watermark value seen so far is kept in state["high_water_mark"].
+    # With pushdown the tasks already satisfy TASK_FILTERS.
+    state = {} if state is None else state
+    expression = watermark_expression(watermark_column)
+    if since is None:
+        logging.info("Extracting tasks from PostgreSQL table `source_tasks` (full)...")
+    else:
+        logging.info(f"Extracting tasks from PostgreSQL table `source_tasks` "
+                     f"where {watermark_column} > {since}...")
+    conn = psycopg2.connect(**DB_CONFIG)
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
-        cur = conn.cursor()
-        cur.execute("SELECT id, title, user_Id, completed FROM source_tasks")
-        rows = cur.fetchall()
-        tasks = [
-            {
-                "id": row[0],
-                "title": row[1],
-                "user_Id": row[2],
-                "completed": row[3]
-            }
-            for row in rows
-        ]
+        cur = conn.cursor(name="source_tasks_stream")
+        cur.itersize = chunk_size
+        query, params = compile_select(
+            "source_tasks", TASK_PROJECTION, TASK_FILTERS if pushdown else [],
+            extra_columns=[expression],
+            extra_where=[] if since is None else [(f"{expression} > %s", [since])],
+        )
+        cur.execute(query, params)
+        columns = list(dict.fromkeys(TASK_PROJECTION.values()))
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            marks = [row[-1] for row in rows if row[-1] is not None]
+            if marks:
+                current = state.get("high_water_mark")
+                state["high_water_mark"] = max(marks) if current is None else max(current, *marks)
+            yield [dict(zip(columns, row)) for row in rows]
         cur.close()
+    finally:
         conn.close()
+
+@timed_stage("extract_tasks_from_db", rows_in=lambda args: None,
+             rows_out=lambda result, args: len(result[0]))
+def extract_tasks_from_db(since=None, watermark_column=WATERMARK_COLUMN, pushdown=True):
+    # Returns (tasks, high_water_mark); high_water_mark is None when nothing was read.
+    # Errors are raised so the DAG retries the read and the run fails instead
+    # of loading an empty batch.
+    try:
+        state = {}
+        tasks = [
+            task
+            for chunk in iter_tasks_from_db(since, watermark_column, pushdown, state=state)
+            for task in chunk
+        ]
         logging.info(f"Extracted {len(tasks)} tasks from source_tasks.")
-        return tasks
+        return tasks, state.get("high_water_mark")
     except Exception as e:
         logging.error(f"Failed to extract from database: {e}")
-        return []
+        raise
 
 # ==== TRANSFORM ====
-def transform_tasks(tasks):
+def transform_chunk(tasks, filters_pushed_down=False):
+    if not filters_pushed_down:
+        tasks = apply_filters(tasks, TASK_PROJECTION, TASK_FILTERS)
+    return [project(task, TASK_PROJECTION) for task in tasks]
+
+@timed_stage("transform_tasks")
+def transform_tasks(tasks, filters_pushed_down=False):
     logging.info("Transforming tasks with completion threshold...")
-    filtered = []
-    for task in tasks:
-        if task["completed"] == COMPLETION_THRESHOLD:
-            filtered.append({
-                "task_id": task["id"],
-                "title": task["title"],
-                "user_id": task["user_Id"],
-                "completed": task["completed"]
-            })
+    filtered = transform_chunk(tasks, filters_pushed_down)
     logging.info(f"{len(filtered)} tasks passed the threshold filter.")
     return filtered
 
 # ==== LOAD TO CSV ====
+@timed_stage("load_to_csv", rows_out=lambda ok, args: len(args[0]) if ok else 0, succeeded=bool)
 def load_to_csv(data):
     logging.info(f"Saving filtered tasks to CSV at {CSV_FILE}...")
     try:
@@ -96,11 +190,32 @@ def load_to_csv(data):
             writer.writeheader()
             writer.writerows(data)
         logging.info("CSV write completed.")
+        return True
     except Exception as e:
         logging.error(f"Failed to write CSV: {e}")
+        return False
+
+# ==== LOAD TO PARQUET ====
+@timed_stage("load_to_parquet", rows_out=lambda ok, args: len(args[0]) if ok else 0, succeeded=bool)
+def load_to_parquet(data):
+    try:
+        write_parquet(data, PARQUET_FILE)
+        return True
+    except Exception as e:
+        logging.error(f"Failed to write Parquet: {e}")
+        return False
+
+def file_sinks(output_format):
+    sinks = []
+    if output_format in ("csv", "both"):
+        sinks.append(CsvSink(CSV_FILE))
+    if output_format in ("parquet", "both"):
+        sinks.append(ParquetSink(PARQUET_FILE))
+    return sinks
 
 # ==== LOAD TO POSTGRESQL ====
-def load_to_postgres(data):
+@timed_stage("load_to_postgres", rows_out=lambda ok, args: len(args[0]) if ok else 0, succeeded=bool)
+def load_to_postgres(data, method=LOAD_METHOD):
     logging.info("Loading data into PostgreSQL table `todo_metrics`...")
     try:
         conn = psycopg2.connect(**DB_CONFIG)
@@ -113,28 +228,118 @@ def load_to_postgres(data):
                 completed BOOLEAN
             )
         """)
-        for row in data:
-            cur.execute("""
-                INSERT INTO todo_metrics (task_id, title, user_id, completed)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (task_id) DO UPDATE SET
-                    title = EXCLUDED.title,
-                    user_id = EXCLUDED.user_id,
-                    completed = EXCLUDED.completed
-            """, (row["task_id"], row["title"], row["user_id"], row["completed"]))
+        started = time.perf_counter()
+        if method == "copy":
+            staged, inserted, updated = copy_upsert_tasks(cur, data)
+            logging.info(f"Merged {staged} staged rows: {inserted} inserted, {updated} updated.")
+        else:
+            # The per-row upsert can run for minutes; report progress periodically
+            progress = Progress("Upserted rows", emit=log_progress)
+            for row in data:
+                progress.add()
+                cur.execute("""
+                    INSERT INTO todo_metrics (task_id, title, user_id, completed)
+                    VALUES (%s, %s, %s, %s)
+                    ON CONFLICT (task_id) DO UPDATE SET
+                        title = EXCLUDED.title,
+                        user_id = EXCLUDED.user_id,
+                        completed = EXCLUDED.completed
+                """, (row["task_id"], row["title"], row["user_id"], row["completed"]))
+            progress.close()
         conn.commit()
         cur.close()
         conn.close()
-        logging.info("Data loaded into `todo_metrics` successfully.")
+        logging.info(f"Data loaded into `todo_metrics` successfully ({method} load, "
+                     f"{time.perf_counter() - started:.2f}s).")
+        return True
     except Exception as e:
         logging.error(f"PostgreSQL load failed: {e}")
+        return False
+
+# ==== PIPELINE DAG ====
+# watermark -> extract -> transform -> CSV / Parquet / PostgreSQL loads in
+# parallel -> save watermark. Streaming mode runs extract through load as one node.
+def etl_dag(args):
+    dag = Dag("testwithdatabase")
+
+    def watermark():
+        return None if args.full_refresh else read_watermark(column=args.watermark_column)
+
+    def stream_load(since):
+        state = {}
+        errors = run_streaming(
+            iter_tasks_from_db(since, args.watermark_column, chunk_size=args.chunk_size, state=state),
+            lambda chunk: transform_chunk(chunk, filters_pushed_down=True),
+            file_sinks(args.format) + [PostgresSink(DB_CONFIG)],
+            extract_stage="extract_tasks_from_db",
+        )
+        if errors:
+            raise RuntimeError(f"Streaming load failed: {errors}")
+        return True, state.get("high_water_mark")
+
+    def load_postgres(tasks):
+        # Raising lets the DAG retry the load
+        if not load_to_postgres(tasks, LOAD_METHOD):
+            raise RuntimeError("PostgreSQL load failed")
+        return True
+
+    def advance_watermark(loaded, high_water_mark):
+        # Only advance the mark once the rows behind it are safely loaded
+        if high_water_mark is not None:
+            save_watermark(high_water_mark, column=args.watermark_column)
+
+    dag.add("read_watermark", watermark, outputs=("since",), retries=READ_RETRIES)
+    if args.streaming:
+        dag.add("stream_load", stream_load, inputs=("since",), outputs=("loaded", "high_water_mark"),
+                stage="extract_tasks_from_db")
+    else:
+        dag.add("extract_tasks_from_db", lambda since: extract_tasks_from_db(since, args.watermark_column),
+                inputs=("since",), outputs=("raw_tasks", "high_water_mark"), retries=READ_RETRIES)
+        dag.add("transform_tasks", lambda raw_tasks: transform_tasks(raw_tasks, filters_pushed_down=True),
+                inputs=("raw_tasks",), outputs=("tasks",))
+        # A failed file write is logged but does not fail the run, as before
+        if args.format in ("csv", "both"):
+            dag.add("load_to_csv", lambda tasks: load_to_csv(tasks), inputs=("tasks",))
+        if args.format in ("parquet", "both"):
+            dag.add("load_to_parquet", lambda tasks: load_to_parquet(tasks), inputs=("tasks",))
+        dag.add("load_to_postgres", load_postgres, inputs=("tasks",), outputs=("loaded",), retries=LOAD_RETRIES)
+    dag.add("save_watermark", advance_watermark, inputs=("loaded", "high_water_mark"))
+    return dag
 
 # ==== RUN ETL ====
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental source_tasks -> todo_metrics ETL")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="ignore the stored watermark and re-read the whole table")
+    parser.add_argument("--watermark-column", default=WATERMARK_COLUMN,
+                        help="monotonic column to track: id (default), an update timestamp, or xmin")
+    parser.add_argument("--streaming", action="store_true",
+                        help="pass fixed-size chunks through extract, transform and both loads concurrently")
+    parser.add_argument("--format", choices=["csv", "parquet", "both"], default=OUTPUT_FORMAT,
+                        help=f"file output written next to the PostgreSQL load (default {OUTPUT_FORMAT})")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help=f"rows per chunk in streaming mode (default {CHUNK_SIZE})")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default=LOG_FORMAT,
+                        help=f"log record format, json for JSON lines (default {LOG_FORMAT})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="print the stage plan with timings from earlier runs and exit")
+    args = parser.parse_args()
+    if args.log_format != LOG_FORMAT:
+        setup_logging(LOG_FILES, args.log_format)
+    if args.dry_run:
+        etl_dag(args).dry_run(load_timings(os.path.join(LOG_DIR, "etl_run_*.manifest.json"), "testwithdatabase"))
+        sys.exit(0)
+
     logging.info(f"===== ETL Run Started at {timestamp} =====")
-    raw_tasks = extract_tasks_from_db()
-    transformed_tasks = transform_tasks(raw_tasks)
-    load_to_csv(transformed_tasks)
-    load_to_postgres(transformed_tasks)
-    logging.info("ETL pipeline completed successfully.")
+    start_run("testwithdatabase", timestamp, RUN_MANIFEST_FILE)
+    try:
+        result = etl_dag(args).run()
+        if not result.ok:
+            failed = [name for name, entry in result.report.items() if entry["status"] == "failed"]
+            logging.error(f"ETL pipeline failed at {', '.join(failed)}.")
+            sys.exit(1)
+        logging.info("ETL pipeline completed successfully.")
+    finally:
+        finish_run()
+        logging.info(f"Run manifest written to {RUN_MANIFEST_FILE}")
     logging.info("=============================================")